@@ -0,0 +1,78 @@
+"""
+Latenza di una GET autenticata banale con AuthMiddleware ASGI rispetto alla
+stessa logica implementata come BaseHTTPMiddleware (la versione precedente).
+
+    python -m benchmarks.auth_middleware [--requests 5000]
+
+Le richieste passano da httpx.ASGITransport, senza rete. Il principal viene
+ricavato dai claim del token (AUTH_MODE "stateless"), quindi nessuna delle due
+varianti accede al database: la differenza misurata è quella del middleware.
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+import src.auth.security as security
+from src.auth.config import PUBLIC_ROUTES
+from src.auth.security import create_access_token, resolve_principal
+from src.middleware.auth import AuthMiddleware
+from benchmarks.common import print_stats
+
+class BaseHTTPAuthMiddleware(BaseHTTPMiddleware):
+    """Stessa logica di AuthMiddleware sulla struttura BaseHTTPMiddleware precedente"""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path in PUBLIC_ROUTES:
+            return await call_next(request)
+
+        auth_header = request.headers.get("Authorization")
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return JSONResponse(status_code=401, content={"detail": "Token mancante"})
+        try:
+            request.state.user = resolve_principal(auth_header.split(" ")[1], lambda email: None)
+            return await call_next(request)
+        except HTTPException as he:
+            return JSONResponse(status_code=he.status_code, content={"detail": he.detail})
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+
+    @app.get("/ping")
+    async def ping(request: Request):
+        return {"user": request.state.user.email}
+
+    return app
+
+async def measure(app: FastAPI, headers: dict, requests: int, warmup: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for _ in range(warmup):
+            assert (await client.get("/ping", headers=headers)).status_code == 200
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = await client.get("/ping", headers=headers)
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del middleware di autenticazione")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500)
+    args = parser.parse_args()
+
+    security.AUTH_MODE = "stateless"
+    token = create_access_token({"sub": "bench@example.com", "uid": 1, "role": "ADMIN"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for label, middleware in (("BaseHTTPMiddleware", BaseHTTPAuthMiddleware), ("AuthMiddleware (ASGI)", AuthMiddleware)):
+        samples = asyncio.run(measure(build_app(middleware), headers, args.requests, args.warmup))
+        print_stats(label, samples)
+
+if __name__ == "__main__":
+    main()
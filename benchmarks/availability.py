@@ -0,0 +1,102 @@
+"""
+Curva di allocazione di un consulente molto allocato su 1, 5 e 10 anni.
+
+    python -m benchmarks.availability [--allocations-per-year 100] [--repeat 5]
+
+Per ogni orizzonte confronta:
+- il ciclo giorno per giorno della vecchia check_availability (senza print),
+  che riscandisce tutte le allocazioni per ogni giorno: O(giorni × allocazioni)
+- allocation_curve (sweep-line NumPy sui delta di inizio/fine)
+- check_availability completa, query compresa, su SQLite temporaneo
+Le allocazioni sono generate con seed fisso; le due curve vengono confrontate
+prima di misurare.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import insert
+from src.database.database import SessionLocal
+from src.models.models import (
+    BillingType, Project, ProjectStatus, ResourceAllocation,
+    ResourceAllocationStatus, User, UserRole
+)
+from src.services.availability import allocation_curve
+from src.services.resource_allocation import ResourceAllocationService
+from benchmarks.common import print_stats, temporary_database
+
+START = date(2020, 1, 1)
+HORIZONS = (1, 5, 10)
+
+def day_by_day_curve(intervals, start_date: date, end_date: date) -> list:
+    """Allocazione giornaliera calcolata come nella vecchia check_availability"""
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        days.append(sum(p for s, e, p in intervals if s <= current_date <= e))
+        current_date += timedelta(days=1)
+    return days
+
+def generate_intervals(years: int, per_year: int, rng: random.Random):
+    n_days = (START.replace(year=START.year + years) - START).days
+    intervals = []
+    for _ in range(years * per_year):
+        start = START + timedelta(days=rng.randrange(n_days))
+        end = start + timedelta(days=rng.randrange(5, 90))
+        intervals.append((start, end, rng.choice((0.1, 0.2, 0.25, 0.5))))
+    return intervals
+
+def timed(function, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Curva di allocazione su più anni")
+    parser.add_argument("--allocations-per-year", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    service = ResourceAllocationService()
+    with temporary_database():
+        with SessionLocal() as db:
+            db.add(Project(id=1, name="Benchmark", status=ProjectStatus.ACTIVE,
+                           billing_type=BillingType.TIME_AND_MATERIALS))
+            for years in HORIZONS:
+                db.add(User(id=years, email=f"user{years}@example.com", name=f"User {years}",
+                            password_hash="-", role=UserRole.CONSULTANT))
+            db.flush()
+            intervals_by_horizon = {}
+            for years in HORIZONS:
+                intervals = generate_intervals(years, args.allocations_per_year, rng)
+                intervals_by_horizon[years] = intervals
+                db.execute(insert(ResourceAllocation), [
+                    {"user_id": years, "project_id": 1, "start_date": s, "end_date": e,
+                     "allocation_percentage": p, "status": ResourceAllocationStatus.ACTIVE}
+                    for s, e, p in intervals
+                ])
+            db.commit()
+
+        for years in HORIZONS:
+            intervals = intervals_by_horizon[years]
+            end_date = START.replace(year=START.year + years) - timedelta(days=1)
+            assert np.allclose(
+                day_by_day_curve(intervals, START, end_date),
+                allocation_curve(intervals, START, end_date)
+            )
+            print(f"{years} anni: {len(intervals)} allocazioni, {(end_date - START).days + 1} giorni")
+            print_stats("  ciclo giorno per giorno",
+                        timed(lambda: day_by_day_curve(intervals, START, end_date), args.repeat))
+            print_stats("  allocation_curve",
+                        timed(lambda: allocation_curve(intervals, START, end_date), args.repeat))
+            with SessionLocal() as db:
+                print_stats("  check_availability (query)",
+                            timed(lambda: service.check_availability(db, years, START, end_date), args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Utilità comuni dei benchmark.
+
+I benchmark si lanciano come moduli, es. `python -m benchmarks.auth_middleware`
+(o `make benchmark name=auth_middleware`), e usano un database SQLite
+temporaneo su file, creato e rimosso a ogni esecuzione.
+"""
+import statistics
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Sequence
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+import src.database.database as database
+from src.models.models import Base
+
+def latency_stats(samples: Sequence[float]) -> Dict[str, float]:
+    """p50, p99 e media in millisecondi di una serie di durate in secondi"""
+    ordered = sorted(samples)
+    return {
+        "p50": ordered[len(ordered) // 2] * 1000,
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        "mean": statistics.fmean(ordered) * 1000,
+    }
+
+def print_stats(label: str, samples: Sequence[float]) -> None:
+    stats = latency_stats(samples)
+    print(
+        f"{label:<32} n={len(samples):<6} p50={stats['p50']:8.3f} ms  "
+        f"p99={stats['p99']:8.3f} ms  media={stats['mean']:8.3f} ms"
+    )
+
+@contextmanager
+def temporary_database() -> Iterator[Engine]:
+    """Crea lo schema su un database SQLite temporaneo e lo collega a SessionLocal"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'benchmark.db'}")
+        Base.metadata.create_all(engine)
+        original_engine = database.engine
+        database.engine = engine
+        database.SessionLocal.configure(bind=engine)
+        try:
+            yield engine
+        finally:
+            database.SessionLocal.configure(bind=original_engine)
+            database.engine = original_engine
+            engine.dispose()
@@ -0,0 +1,103 @@
+"""
+Latenza delle altre richieste API mentre 50 login vengono eseguiti insieme.
+
+    python -m benchmarks.login_burst [--logins 50]
+
+Una sonda invia in continuo una GET autenticata banale (principal dai claim,
+senza database) mentre parte la raffica di login, e ne misura la latenza (e
+l'attesa massima tra due risposte) in tre scenari:
+- senza login, come riferimento
+- login con verifica della password nel pool di thread (implementazione attuale)
+- login con verifica sull'event loop (comportamento precedente)
+Il costo bcrypt è quello configurato (BCRYPT_ROUNDS, default 12).
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from sqlalchemy import insert
+import src.api.endpoints.auth as auth_endpoints
+import src.auth.security as security
+from src.api.api import app
+from src.auth.security import create_access_token, get_password_hash, pwd_context
+from src.database.database import SessionLocal
+from src.models.models import User, UserRole
+from benchmarks.common import print_stats, temporary_database
+
+PASSWORD = "password-benchmark"
+
+async def verify_on_event_loop(plain_password, hashed_password):
+    """Verifica sincrona, come prima dell'introduzione del pool di thread"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def run_scenario(logins: int, probe_interval: float):
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": "probe@example.com", "uid": 0, "role": "ADMIN"})}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+        done = asyncio.Event()
+        samples = []
+        completed = []
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                assert (await client.get("/", headers=headers)).status_code == 200
+                completed.append(time.perf_counter())
+                samples.append(completed[-1] - started)
+                await asyncio.sleep(probe_interval)
+
+        async def login(index: int):
+            response = await client.post(
+                "/api/v1/auth/token",
+                json={"email": f"user{index}@example.com", "password": PASSWORD}
+            )
+            assert response.status_code == 200, response.text
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        try:
+            if logins:
+                await asyncio.gather(*(login(index) for index in range(logins)))
+            else:
+                await asyncio.sleep(1)
+        finally:
+            elapsed = time.perf_counter() - started
+            done.set()
+            await probe_task
+    # Attesa più lunga tra due risposte della sonda: con l'event loop bloccato
+    # le richieste non partono proprio, e la sola latenza non lo mostra
+    max_gap = max((b - a for a, b in zip(completed, completed[1:])), default=0.0)
+    return samples, elapsed, max_gap
+
+def main():
+    parser = argparse.ArgumentParser(description="Latenza API durante una raffica di login")
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--probe-interval", type=float, default=0.005, help="Secondi tra due richieste della sonda")
+    args = parser.parse_args()
+
+    security.AUTH_MODE = "stateless"
+    with temporary_database():
+        password_hash = get_password_hash(PASSWORD)
+        with SessionLocal() as db:
+            db.execute(insert(User), [
+                {"email": f"user{index}@example.com", "name": f"User {index}",
+                 "password_hash": password_hash, "role": UserRole.CONSULTANT}
+                for index in range(args.logins)
+            ])
+            db.commit()
+
+        scenarios = (
+            ("nessun login", 0, auth_endpoints.verify_and_update_password),
+            (f"{args.logins} login, pool di thread", args.logins, auth_endpoints.verify_and_update_password),
+            (f"{args.logins} login, event loop", args.logins, verify_on_event_loop),
+        )
+        for label, logins, verify in scenarios:
+            auth_endpoints.verify_and_update_password = verify
+            samples, elapsed, max_gap = asyncio.run(run_scenario(logins, args.probe_interval))
+            print_stats(label, samples)
+            print(f"{'':<32} attesa massima tra risposte {max_gap * 1000:.1f} ms")
+            if logins:
+                print(f"{'':<32} login completati in {elapsed:.2f} s")
+
+if __name__ == "__main__":
+    main()
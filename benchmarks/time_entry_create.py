@@ -0,0 +1,112 @@
+"""
+Latenza di TimeEntryService.create con 100k time entry dello stesso utente.
+
+    python -m benchmarks.time_entry_create [--entries 100000] [--creates 200]
+
+Misura, sullo stesso database:
+- create completa (lock della settimana sul rollup, controllo dei limiti,
+  inserimento e commit), ogni volta in una settimana diversa
+- i soli controlli di ore giornaliere e settimanali nelle tre versioni:
+  func.date(date) su time_entries (prima della colonna entry_day),
+  intervallo semiaperto su entry_day, rollup user_daily_hours (attuale)
+Le entry esistenti sono 4 al giorno da mezz'ora, inserite in blocco; il
+rollup viene poi ricostruito con rebuild_daily_hours.
+"""
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert
+from src.database.database import SessionLocal
+from src.models.models import BillingType, Project, ProjectStatus, TimeEntry, User, UserRole
+from src.schemas.time_entry import TimeEntryCreate
+from src.services.time_entry import TimeEntryService, week_start
+from benchmarks.common import print_stats, temporary_database
+
+START = date(2000, 1, 3)  # lunedì
+ENTRIES_PER_DAY = 4
+USER_ID = 1
+
+def hours_with_date_function(db, day: date) -> float:
+    """Controlli come prima di entry_day: func.date() non usa l'indice"""
+    daily = db.query(func.sum(TimeEntry.hours)).filter(
+        TimeEntry.user_id == USER_ID, func.date(TimeEntry.date) == day
+    ).scalar()
+    monday = week_start(day)
+    weekly = db.query(func.sum(TimeEntry.hours)).filter(
+        TimeEntry.user_id == USER_ID,
+        TimeEntry.date >= monday,
+        TimeEntry.date <= monday + timedelta(days=6)
+    ).scalar()
+    return (daily or 0) + (weekly or 0)
+
+def hours_with_entry_day(db, day: date) -> float:
+    """Intervalli semiaperti su entry_day (indice user_id, entry_day)"""
+    def between(start: date, end: date):
+        return db.query(func.sum(TimeEntry.hours)).filter(
+            TimeEntry.user_id == USER_ID, TimeEntry.entry_day >= start, TimeEntry.entry_day < end
+        ).scalar() or 0
+    monday = week_start(day)
+    return between(day, day + timedelta(days=1)) + between(monday, monday + timedelta(days=7))
+
+def hours_with_rollup(db, day: date) -> float:
+    service = TimeEntryService()
+    monday = week_start(day)
+    return service.get_daily_hours(db, USER_ID, day) + \
+        service.get_weekly_hours(db, USER_ID, monday, monday + timedelta(days=6))
+
+def main():
+    parser = argparse.ArgumentParser(description="Latenza di create con molte time entry per utente")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--creates", type=int, default=200)
+    args = parser.parse_args()
+
+    n_days = args.entries // ENTRIES_PER_DAY
+    service = TimeEntryService()
+    with temporary_database():
+        with SessionLocal() as db:
+            db.add(User(id=USER_ID, email="user@example.com", name="User",
+                        password_hash="-", role=UserRole.CONSULTANT))
+            db.add(Project(id=1, name="Benchmark", status=ProjectStatus.ACTIVE,
+                           billing_type=BillingType.TIME_AND_MATERIALS))
+            db.flush()
+            db.execute(insert(TimeEntry), [
+                {"user_id": USER_ID, "project_id": 1, "hours": 0.5,
+                 "date": datetime.combine(START + timedelta(days=day), datetime.min.time()) + timedelta(hours=9 + slot)}
+                for day in range(n_days)
+                for slot in range(ENTRIES_PER_DAY)
+            ])
+            db.commit()
+            service.rebuild_daily_hours(db, user_ids=[USER_ID])
+            print(f"{db.query(TimeEntry).count()} time entry su {n_days} giorni")
+
+        # Un giorno per settimana, distribuiti su tutto lo storico
+        step = max(1, n_days // 7 // args.creates) * 7
+        days = [START + timedelta(days=offset + 2) for offset in range(0, n_days, step)][:args.creates]
+
+        with SessionLocal() as db:
+            # La versione con func.date non conta le ore della domenica dopo
+            # mezzanotte: solo le altre due devono coincidere
+            assert hours_with_entry_day(db, days[0]) == hours_with_rollup(db, days[0])
+            for label, check in (
+                ("controlli func.date", hours_with_date_function),
+                ("controlli entry_day", hours_with_entry_day),
+                ("controlli rollup", hours_with_rollup),
+            ):
+                samples = []
+                for day in days:
+                    started = time.perf_counter()
+                    check(db, day)
+                    samples.append(time.perf_counter() - started)
+                print_stats(label, samples)
+
+            samples = []
+            for day in days:
+                entry = TimeEntryCreate(user_id=USER_ID, project_id=1, hours=1,
+                                        date=datetime.combine(day, datetime.min.time()) + timedelta(hours=17))
+                started = time.perf_counter()
+                service.create(db, entry)
+                samples.append(time.perf_counter() - started)
+            print_stats("create", samples)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""add_entry_day_to_time_entries
+
+Revision ID: 8d41c07e5b2a
+Revises: 35fb47a6aad3
+Create Date: 2026-10-18 10:12:37.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41c07e5b2a'
+down_revision: Union[str, None] = '35fb47a6aad3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Colonna generata: PostgreSQL riscrive la tabella per popolarla
+    op.add_column(
+        'time_entries',
+        sa.Column('entry_day', sa.Date(), sa.Computed('date(date)', persisted=True), nullable=True)
+    )
+    op.create_index(
+        'idx_time_entries_user_day',
+        'time_entries',
+        ['user_id', 'entry_day'],
+        unique=False,
+        postgresql_include=['hours']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_time_entries_user_day', table_name='time_entries')
+    op.drop_column('time_entries', 'entry_day')
@@ -0,0 +1,57 @@
+"""add_invoice_batch_jobs
+
+Revision ID: a2c94e7b5d18
+Revises: f41b8e2c6a93
+Create Date: 2026-10-18 18:12:44.916305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2c94e7b5d18'
+down_revision: Union[str, None] = 'f41b8e2c6a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    invoicebatchstatus = sa.Enum("PENDING", "RUNNING", "COMPLETED", "FAILED", name='invoicebatchstatus')
+    invoicebatchitemstatus = sa.Enum("PENDING", "INVOICED", "SKIPPED", "FAILED", name='invoicebatchitemstatus')
+
+    op.create_table(
+        'invoice_batch_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('period_end', sa.Date(), nullable=False),
+        sa.Column('invoice_date', sa.Date(), nullable=False),
+        sa.Column('due_date', sa.Date(), nullable=False),
+        sa.Column('status', invoicebatchstatus, nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'invoice_batch_items',
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('status', invoicebatchitemstatus, nullable=False),
+        sa.Column('invoice_id', sa.Integer(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['invoice_batch_jobs.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id']),
+        sa.ForeignKeyConstraint(['invoice_id'], ['invoices.id']),
+        sa.PrimaryKeyConstraint('job_id', 'project_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('invoice_batch_items')
+    op.drop_table('invoice_batch_jobs')
+    op.execute("DROP TYPE IF EXISTS invoicebatchitemstatus")
+    op.execute("DROP TYPE IF EXISTS invoicebatchstatus")
@@ -0,0 +1,41 @@
+"""add_user_daily_hours
+
+Revision ID: b6f2d9a41c07
+Revises: 8d41c07e5b2a
+Create Date: 2026-10-18 11:03:52.907114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f2d9a41c07'
+down_revision: Union[str, None] = '8d41c07e5b2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_daily_hours',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('hours', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+    # Popola il rollup con le ore già registrate
+    op.execute("""
+        INSERT INTO user_daily_hours (user_id, day, hours)
+        SELECT user_id, entry_day, SUM(hours)
+        FROM time_entries
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id, entry_day
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_daily_hours')
@@ -0,0 +1,61 @@
+"""add_invoice_number_counters
+
+Revision ID: c7d3e91f0a46
+Revises: a2c94e7b5d18
+Create Date: 2026-10-18 19:05:12.408117
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.services.invoice_numbering import InvoiceNumberingService
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d3e91f0a46'
+down_revision: Union[str, None] = 'a2c94e7b5d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'invoice_number_counters',
+        sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('last_number', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('year')
+    )
+    # I contatori partono dall'ultimo numero già usato nel formato della
+    # numerazione (INVOICE_NUMBER_FORMAT), riconosciuto con lo stesso parse
+    # del servizio; i numeri in altri formati restano fuori numerazione
+    numbering = InvoiceNumberingService()
+    invoices = sa.table('invoices', sa.column('invoice_number', sa.String), sa.column('invoice_date', sa.Date))
+    last_numbers = {}
+    skipped = 0
+    for invoice_number, invoice_date in op.get_bind().execute(
+        sa.select(invoices.c.invoice_number, invoices.c.invoice_date)
+    ):
+        parsed = numbering.parse(invoice_number, invoice_date)
+        if parsed is None:
+            skipped += 1
+            continue
+        year, number = parsed
+        last_numbers[year] = max(number, last_numbers.get(year, 0))
+    if skipped:
+        logger.warning(
+            "%d fatture con numero fuori dal formato %r: non contano per i contatori",
+            skipped, numbering.number_format
+        )
+    counters = sa.table('invoice_number_counters', sa.column('year', sa.Integer), sa.column('last_number', sa.Integer))
+    if last_numbers:
+        op.bulk_insert(counters, [
+            {'year': year, 'last_number': number} for year, number in sorted(last_numbers.items())
+        ])
+
+def downgrade() -> None:
+    op.drop_table('invoice_number_counters')
@@ -0,0 +1,41 @@
+"""add_invoice_totals
+
+Revision ID: e3a7c5d19f24
+Revises: b6f2d9a41c07
+Create Date: 2026-10-18 15:21:07.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a7c5d19f24'
+down_revision: Union[str, None] = 'b6f2d9a41c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('invoices', sa.Column('line_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('invoices', sa.Column('hours', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+    # Popola i totali dai line items esistenti (l'importo resta quello salvato)
+    op.execute("""
+        UPDATE invoices
+        SET line_count = totals.line_count,
+            hours = totals.hours
+        FROM (
+            SELECT invoice_id, COUNT(*) AS line_count, COALESCE(SUM(quantity), 0) AS hours
+            FROM invoice_line_items
+            WHERE invoice_id IS NOT NULL
+            GROUP BY invoice_id
+        ) AS totals
+        WHERE invoices.id = totals.invoice_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('invoices', 'hours')
+    op.drop_column('invoices', 'line_count')
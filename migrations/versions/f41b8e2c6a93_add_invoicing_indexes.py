@@ -0,0 +1,28 @@
+"""add_invoicing_indexes
+
+Revision ID: f41b8e2c6a93
+Revises: e3a7c5d19f24
+Create Date: 2026-10-18 16:48:31.205746
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41b8e2c6a93'
+down_revision: Union[str, None] = 'e3a7c5d19f24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_time_entries_project_day', 'time_entries', ['project_id', 'entry_day'], unique=False)
+    op.create_index('idx_line_item_time_entries_time_entry', 'line_item_time_entries', ['time_entry_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_line_item_time_entries_time_entry', table_name='line_item_time_entries')
+    op.drop_index('idx_time_entries_project_day', table_name='time_entries')
@@ -13,6 +13,7 @@ from src.api.endpoints.line_items import router as line_items_router
 from src.api.endpoints.clients import router as clients_router
 from src.api.endpoints.auth import router as auth_router
 from src.api.endpoints.utils import router as utils_router
+from src.api.endpoints.imports import router as imports_router
 
 # Importa tutti gli schemi necessari
 from src.schemas.auth import Token, LoginRequest
@@ -85,6 +86,7 @@ app.include_router(line_items_router, prefix="/api/v1/line-items", tags=["Invoic
 app.include_router(clients_router, prefix="/api/v1/clients", tags=["Clients"])
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(utils_router, prefix="/api/v1/utils", tags=["Utilities"])
+app.include_router(imports_router, prefix="/api/v1/import", tags=["Import"])
 
 @app.get("/")
 async def root():
@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from src.database.database import get_db
 from src.auth.security import (
-    verify_password,
+    verify_and_update_password,
     create_access_token,
     create_refresh_token,
     create_token_pair,
     verify_refresh_token,
-    get_password_hash
+    get_password_hash_async,
+    build_token_claims
 )
 from src.schemas.user import UserBase, UserCreate
 from src.schemas.auth import Token, LoginRequest
 from src.models.models import User
+from src.services.capacity_index import capacity_index
 from datetime import timedelta
 
 router = APIRouter()
@@ -39,17 +42,36 @@ async def login(
     - **password**: password dell'utente
     """
     user = db.query(User).filter(User.email == login_data.email).first()
-    if not user or not verify_password(login_data.password, user.password_hash):
+    if not user:
+        raise HTTPException(
+            status_code=401,
+            detail="Email o password non corretti"
+        )
+
+    password_hash = user.password_hash
+    claims = build_token_claims(user)
+    # La transazione si chiude prima di attendere bcrypt: durante una raffica
+    # di login le connessioni tornano al pool invece di esaurirlo
+    db.rollback()
+
+    # bcrypt gira nel pool di thread dedicato, fuori dall'event loop
+    is_valid, new_hash = await verify_and_update_password(
+        login_data.password,
+        password_hash
+    )
+    if not is_valid:
         raise HTTPException(
             status_code=401,
             detail="Email o password non corretti"
         )
+
+    # Aggiorna in modo trasparente gli hash con schema o costo obsoleti
+    if new_hash:
+        db.execute(update(User).where(User.id == claims["uid"]).values(password_hash=new_hash))
+        db.commit()
     
     # Crea coppia di token
-    access_token, refresh_token = create_token_pair({
-        "sub": user.email,
-        "role": user.role.value
-    })
+    access_token, refresh_token = create_token_pair(claims)
     
     return Token(
         access_token=access_token,
@@ -77,9 +99,7 @@ async def refresh_token(
         )
     
     # Crea nuovo access token
-    access_token = create_access_token(
-        {"sub": user.email, "role": user.role.value}
-    )
+    access_token = create_access_token(build_token_claims(user))
     
     return {
         "access_token": access_token,
@@ -99,8 +119,10 @@ async def register(
             detail="Email già registrata"
         )
     
-    # Crea il nuovo utente con password hashata
-    hashed_password = get_password_hash(user_data.password)
+    # Crea il nuovo utente con password hashata; la connessione torna al
+    # pool mentre si attende l'hash
+    db.rollback()
+    hashed_password = await get_password_hash_async(user_data.password)
     db_user = User(
         email=user_data.email,
         name=user_data.name,
@@ -111,5 +133,6 @@ async def register(
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    capacity_index.add_user(db_user.id)
     
     return {"message": "Utente registrato con successo"}
\ No newline at end of file
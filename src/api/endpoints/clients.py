@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from src.database.database import get_db
+from typing import List, Optional
+from src.database.database import get_async_db, get_db
+from src.schemas.pagination import Page
 from src.schemas.client import ClientCreate, ClientResponse, ClientUpdate
-from src.services.client import ClientService
+from src.schemas.bulk import BulkDeleteRequest, BulkResponse, BulkUpdateItem
+from src.services.client import AsyncClientService, ClientService
 
 router = APIRouter()
 service = ClientService()
+# Le letture usano la sessione asincrona e non bloccano l'event loop
+async_service = AsyncClientService()
 
 @router.post("/", response_model=ClientResponse)
 async def create_client(
@@ -15,23 +20,57 @@ async def create_client(
 ):
     return service.create(db, client)
 
+@router.post("/bulk", response_model=BulkResponse[ClientResponse])
+async def bulk_create_clients(
+    items: List[ClientCreate],
+    db: Session = Depends(get_db)
+):
+    """
+    Crea più clienti in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_create(db, items)
+
+@router.put("/bulk", response_model=BulkResponse[ClientResponse])
+async def bulk_update_clients(
+    items: List[BulkUpdateItem[ClientUpdate]],
+    db: Session = Depends(get_db)
+):
+    """
+    Aggiorna più clienti in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_update(db, items)
+
+@router.delete("/bulk", response_model=BulkResponse)
+async def bulk_delete_clients(
+    request: BulkDeleteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Elimina più clienti in un'unica transazione.
+    Restituisce l'esito per ogni id, nell'ordine della richiesta.
+    """
+    return service.bulk_delete(db, request.ids)
+
 @router.get("/{client_id}", response_model=ClientResponse)
 async def get_client(
     client_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    client = service.get(db, client_id)
+    client = await async_service.get(db, client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     return client
 
-@router.get("/", response_model=List[ClientResponse])
+@router.get("/", response_model=Page[ClientResponse])
 async def list_clients(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return service.list(db, skip=skip, limit=limit)
+    items, next_cursor = await async_service.list(db, cursor=cursor, limit=limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.put("/{client_id}", response_model=ClientResponse)
 async def update_client(
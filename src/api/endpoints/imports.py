@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Literal, Optional
+import io
+from src.database.database import get_db
+from src.models.models import UserRole
+from src.schemas.imports import ImportResult
+from src.services.importer import ImportService, detect_format
+
+router = APIRouter()
+service = ImportService()
+
+@router.post("/{kind}", response_model=ImportResult)
+async def import_data(
+    kind: Literal["clients", "projects", "time_entries", "allocations"],
+    request: Request,
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Importa un file CSV/NDJSON (solo amministratori).
+    Clienti, progetti e utenti sono indicati per chiave naturale
+    (client_name, project_name, user_email). Le righe non valide vengono
+    scartate e riportate nel riepilogo; per file molto grandi usare
+    `python -m src.cli.import_data`.
+    """
+    if request.state.user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Permesso negato: ruolo non autorizzato"
+        )
+    if format is None:
+        try:
+            format = detect_format(file.filename or "")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Il file caricato viene letto in streaming, fuori dall'event loop
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return await run_in_threadpool(service.import_stream, db, kind, stream, format)
@@ -1,19 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List, Union
+from typing import List, Optional, Union
 from decimal import Decimal
 
-from src.database.database import get_db
+from src.database.database import get_db, release_request_db
+from src.models.models import InvoiceBatchStatus, UserRole
+from src.schemas.pagination import Page
 from src.schemas.invoice import (
     InvoiceCreate, 
+    InvoiceGenerate,
     InvoiceResponse, 
     InvoiceUpdate,
     InvoiceResponseNoItems
 )
+from src.schemas.invoice_batch import InvoiceBatchCreate, InvoiceBatchResponse
 from src.services.invoice import InvoiceService
+from src.services.invoice_batch import InvoiceBatchService
+from src.services.invoicing import InvoicingService
 
 router = APIRouter()
 service = InvoiceService()
+invoicing_service = InvoicingService()
+batch_service = InvoiceBatchService()
 
 @router.post("/", response_model=InvoiceResponse,
     responses={
@@ -61,6 +69,7 @@ async def create_invoice(
     """
     Crea una nuova fattura.
     Il totale viene calcolato automaticamente dai line items.
+    Senza invoice_number viene assegnato il prossimo numero dell'anno.
     """
     try:
         return service.create(db, invoice)
@@ -72,25 +81,121 @@ async def create_invoice(
             detail=f"Errore nella creazione della fattura: {str(e)}"
         )
 
-@router.get("/project/{project_id}", response_model=List[Union[InvoiceResponse, InvoiceResponseNoItems]])
+@router.post("/generate", response_model=InvoiceResponse)
+async def generate_invoice(
+    invoice: InvoiceGenerate,
+    db: Session = Depends(get_db)
+):
+    """
+    Genera la fattura di un progetto a consuntivo con le time entry non ancora
+    fatturate del periodo: un line item per consulente e tariffa oraria.
+    Le entry fatturate vengono collegate ai line items e non saranno incluse
+    nelle generazioni successive. Senza invoice_number viene assegnato il
+    prossimo numero dell'anno.
+    """
+    return invoicing_service.generate(db, invoice)
+
+@router.post("/batch", response_model=InvoiceBatchResponse, status_code=202)
+async def create_invoice_batch(
+    batch: InvoiceBatchCreate,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Avvia la fatturazione del periodo per tutti i progetti a consuntivo attivi
+    (solo amministratori). Il job viene eseguito in background: lo stato di
+    ogni progetto si legge da GET /invoices/batch/{job_id}.
+    """
+    if request.state.user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Permesso negato: ruolo non autorizzato"
+        )
+    job = batch_service.create_job(
+        db,
+        period_start=batch.period_start,
+        period_end=batch.period_end,
+        invoice_date=batch.invoice_date,
+        due_date=batch.due_date
+    )
+    # I background task girano dentro la richiesta, prima che il middleware
+    # chiuda la sessione: va restituita al pool prima del job
+    release_request_db(request)
+    background_tasks.add_task(batch_service.run_job, job.id)
+    return job
+
+@router.get("/batch/{job_id}", response_model=InvoiceBatchResponse)
+async def get_invoice_batch(
+    job_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Stato del job di fatturazione e di ogni progetto (solo amministratori)"""
+    if request.state.user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Permesso negato: ruolo non autorizzato"
+        )
+    job = batch_service.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job di fatturazione {job_id} non trovato")
+    return job
+
+@router.post("/batch/{job_id}/resume", response_model=InvoiceBatchResponse, status_code=202)
+async def resume_invoice_batch(
+    job_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
+    """
+    Riprende un job interrotto o con progetti falliti (solo amministratori):
+    vengono rieseguiti solo i progetti non ancora fatturati.
+    """
+    if request.state.user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=403,
+            detail="Permesso negato: ruolo non autorizzato"
+        )
+    job = batch_service.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job di fatturazione {job_id} non trovato")
+    if job.status == InvoiceBatchStatus.COMPLETED:
+        raise HTTPException(status_code=400, detail=f"Il job di fatturazione {job_id} è già completato")
+    release_request_db(request)  # vedi create_invoice_batch
+    background_tasks.add_task(batch_service.run_job, job.id)
+    return job
+
+@router.get("/project/{project_id}", response_model=Page[Union[InvoiceResponse, InvoiceResponseNoItems]])
 async def get_project_invoices(
     project_id: int,
     include_line_items: bool = Query(True),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
     """
-    Recupera tutte le fatture per un progetto.
+    Recupera le fatture di un progetto, paginate a cursore.
     Se include_line_items=false, non include i line items nella risposta.
     """
-    invoices = service.get_by_project(db, project_id)
+    invoices, next_cursor = service.get_by_project(
+        db, project_id, cursor=cursor, limit=limit, include_line_items=include_line_items
+    )
     response_model = InvoiceResponse if include_line_items else InvoiceResponseNoItems
-    return [response_model.model_validate(invoice, from_attributes=True) for invoice in invoices]
+    return {
+        "items": [response_model.model_validate(invoice, from_attributes=True) for invoice in invoices],
+        "next_cursor": next_cursor
+    }
 
-@router.get("/unpaid", response_model=List[InvoiceResponseNoItems])
+@router.get("/unpaid", response_model=Page[InvoiceResponseNoItems])
 async def get_unpaid_invoices(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    return service.get_unpaid_invoices(db)
+    items, next_cursor = service.get_unpaid_invoices(db, cursor=cursor, limit=limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.put("/{invoice_id}", response_model=InvoiceResponse)
 async def update_invoice(
@@ -116,8 +221,10 @@ async def delete_invoice(
     db: Session = Depends(get_db)
 ):
     """
-    Elimina una fattura.
-    Solleva 404 se la fattura non esiste.
+    Elimina una fattura con i suoi line items: le time entry fatturate
+    tornano da fatturare.
+    Solleva 404 se la fattura non esiste, 400 se è numerata e non è
+    l'ultima del suo anno (le altre si stornano con una nota di credito).
     """
     success = service.delete(db, invoice_id)
     if not success:
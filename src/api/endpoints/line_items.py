@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from src.database.database import get_db
+from src.schemas.pagination import Page
 from src.schemas.invoice import InvoiceLineItemBase, InvoiceLineItemResponse
 from src.services.line_item import LineItemService
 
@@ -16,12 +17,15 @@ async def add_line_items(
 ):
     return service.batch_create(db, invoice_id, line_items)
 
-@router.get("/invoice/{invoice_id}/items", response_model=List[InvoiceLineItemResponse])
+@router.get("/invoice/{invoice_id}/items", response_model=Page[InvoiceLineItemResponse])
 async def get_invoice_items(
     invoice_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    return service.get_by_invoice(db, invoice_id)
+    items, next_cursor = service.get_by_invoice(db, invoice_id, cursor=cursor, limit=limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.put("/items/{item_id}", response_model=InvoiceLineItemResponse)
 async def update_line_item(
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from src.database.database import get_db
+from src.schemas.pagination import Page
 from src.schemas.project import ProjectCreate, ProjectResponse, ProjectUpdate
+from src.schemas.bulk import BulkDeleteRequest, BulkResponse, BulkUpdateItem
 from src.services.project import ProjectService
 
 router = APIRouter()
@@ -15,6 +17,39 @@ async def create_project(
 ):
     return service.create(db, project)
 
+@router.post("/bulk", response_model=BulkResponse[ProjectResponse])
+async def bulk_create_projects(
+    items: List[ProjectCreate],
+    db: Session = Depends(get_db)
+):
+    """
+    Crea più progetti in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_create(db, items)
+
+@router.put("/bulk", response_model=BulkResponse[ProjectResponse])
+async def bulk_update_projects(
+    items: List[BulkUpdateItem[ProjectUpdate]],
+    db: Session = Depends(get_db)
+):
+    """
+    Aggiorna più progetti in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_update(db, items)
+
+@router.delete("/bulk", response_model=BulkResponse)
+async def bulk_delete_projects(
+    request: BulkDeleteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Elimina più progetti in un'unica transazione.
+    Restituisce l'esito per ogni id, nell'ordine della richiesta.
+    """
+    return service.bulk_delete(db, request.ids)
+
 @router.get("/{project_id}", response_model=ProjectResponse)
 async def get_project(
     project_id: int,
@@ -25,13 +60,14 @@ async def get_project(
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
-@router.get("/", response_model=List[ProjectResponse])
+@router.get("/", response_model=Page[ProjectResponse])
 async def list_projects(
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    return service.list(db, skip=skip, limit=limit)
+    items, next_cursor = service.list(db, cursor=cursor, limit=limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.put("/{project_id}", response_model=ProjectResponse)
 async def update_project(
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
+import base64
+from typing import List, Literal, Optional
 from datetime import date
+import numpy as np
 from src.database.database import get_db
-from src.schemas.resource_allocation import ResourceAllocationCreate, ResourceAllocationResponse, ResourceAllocationUpdate
+from src.schemas.pagination import Page
+from src.schemas.resource_allocation import ResourceAllocationCreate, ResourceAllocationResponse, ResourceAllocationUpdate, TeamAvailabilityResponse, CapacitySearchResponse
+from src.models.models import UserRole, ConsultantRole
+from src.schemas.bulk import BulkDeleteRequest, BulkResponse, BulkUpdateItem
 from src.services.resource_allocation import ResourceAllocationService
+from src.services.availability import PRECISION
 
 router = APIRouter()
 service = ResourceAllocationService()
 
+# Ampiezza massima del periodo per la matrice di disponibilità del team
+MAX_TEAM_AVAILABILITY_DAYS = 366
+
 @router.post("/", response_model=ResourceAllocationResponse)
 async def create_allocation(
     allocation: ResourceAllocationCreate,
@@ -16,14 +25,126 @@ async def create_allocation(
 ):
     return service.create(db, allocation)
 
-@router.get("/user/{user_id}", response_model=List[ResourceAllocationResponse])
+@router.post("/bulk", response_model=BulkResponse[ResourceAllocationResponse])
+async def bulk_create_allocations(
+    items: List[ResourceAllocationCreate],
+    db: Session = Depends(get_db)
+):
+    """
+    Crea più allocazioni in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_create(db, items)
+
+@router.put("/bulk", response_model=BulkResponse[ResourceAllocationResponse])
+async def bulk_update_allocations(
+    items: List[BulkUpdateItem[ResourceAllocationUpdate]],
+    db: Session = Depends(get_db)
+):
+    """
+    Aggiorna più allocazioni in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_update(db, items)
+
+@router.delete("/bulk", response_model=BulkResponse)
+async def bulk_delete_allocations(
+    request: BulkDeleteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Elimina più allocazioni in un'unica transazione.
+    Restituisce l'esito per ogni id, nell'ordine della richiesta.
+    """
+    return service.bulk_delete(db, request.ids)
+
+@router.get("/user/{user_id}", response_model=Page[ResourceAllocationResponse])
 async def get_user_allocations(
     user_id: int,
     start_date: date = None,
     end_date: date = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    return service.get_user_allocations(db, user_id, start_date, end_date)
+    items, next_cursor = service.get_user_allocations(
+        db, user_id, start_date, end_date, cursor=cursor, limit=limit
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/availability", response_model=TeamAvailabilityResponse)
+async def get_team_availability(
+    start_date: date,
+    end_date: date,
+    user_ids: Optional[List[int]] = Query(None),
+    role: Optional[UserRole] = None,
+    project_id: Optional[int] = None,
+    encoding: Literal["percent", "base64"] = "percent",
+    db: Session = Depends(get_db)
+):
+    """
+    Matrice di disponibilità utenti × giorni per il periodo, pensata per le heatmap.
+    Gli utenti si filtrano per id (ripetibile), ruolo e progetto.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=400,
+            detail="La data di fine deve essere successiva alla data di inizio"
+        )
+    days = (end_date - start_date).days + 1
+    if days > MAX_TEAM_AVAILABILITY_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Il periodo non può superare {MAX_TEAM_AVAILABILITY_DAYS} giorni"
+        )
+
+    ordered_ids, matrix = service.get_team_availability(
+        db, start_date, end_date, user_ids=user_ids, role=role, project_id=project_id
+    )
+    percent = np.rint(matrix * 100).astype(np.uint8)
+    if encoding == "base64":
+        values = base64.b64encode(percent.tobytes()).decode()
+    else:
+        values = percent.tolist()
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "days": days,
+        "user_ids": ordered_ids,
+        "encoding": encoding,
+        "values": values
+    }
+
+@router.get("/capacity", response_model=CapacitySearchResponse)
+async def search_capacity(
+    start_date: date,
+    end_date: date,
+    min_available: float = Query(..., gt=0, le=1),
+    role: Optional[ConsultantRole] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Utenti con almeno min_available di capacità libera in ogni giorno del periodo,
+    opzionalmente filtrati per ruolo, dal più disponibile al meno disponibile.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=400,
+            detail="La data di fine deve essere successiva alla data di inizio"
+        )
+
+    candidates = service.find_available_users(db, start_date, end_date, min_available, role)
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "min_available": min_available,
+        "role": role,
+        "candidates": [
+            {"user_id": user_id, "available_percentage": available}
+            for user_id, available in candidates
+        ]
+    }
 
 @router.get("/availability/{user_id}")
 async def check_user_availability(
@@ -31,21 +152,39 @@ async def check_user_availability(
     start_date: date,
     end_date: date,
     request: Request,
+    include_daily: bool = False,
     db: Session = Depends(get_db)
 ) -> dict:
-    available = service.check_availability(db, user_id, start_date, end_date)
-    return {
+    """
+    Disponibilità media di un utente nel periodo.
+    Con include_daily=true restituisce anche la disponibilità giorno per giorno,
+    a partire da start_date.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=400,
+            detail="La data di fine deve essere successiva alla data di inizio"
+        )
+
+    curve = service.get_availability_curve(db, user_id, start_date, end_date)
+    available = round(float(curve.mean()), PRECISION)
+    response = {
         "available_percentage": available,
         "is_fully_available": available == 1,
         "is_partially_available": 0 < available < 1,
         "is_fully_allocated": available == 0
     }
+    if include_daily:
+        response["daily_availability"] = curve.tolist()
+    return response
 
-@router.get("/project/{project_id}", response_model=List[ResourceAllocationResponse])
+@router.get("/project/{project_id}", response_model=Page[ResourceAllocationResponse])
 async def get_project_allocations(
     project_id: int,
     start_date: date = None,
     end_date: date = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
     """
@@ -56,5 +195,10 @@ async def get_project_allocations(
         project_id: ID del progetto
         start_date: Data iniziale opzionale
         end_date: Data finale opzionale
+        cursor: next_cursor della pagina precedente
+        limit: Numero massimo di allocazioni per pagina
     """
-    return service.get_project_allocations(db, project_id, start_date, end_date)
\ No newline at end of file
+    items, next_cursor = service.get_project_allocations(
+        db, project_id, start_date, end_date, cursor=cursor, limit=limit
+    )
+    return {"items": items, "next_cursor": next_cursor}
\ No newline at end of file
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
+import re
 from src.database.database import get_db
-from src.schemas.time_entry import TimeEntryCreate, TimeEntryResponse, TimeEntryUpdate
+from src.schemas.pagination import Page
+from src.schemas.time_entry import TimeEntryCreate, TimeEntryResponse, TimeEntryUpdate, WeekTimesheet, WeekTimesheetResponse
+from src.schemas.bulk import BulkDeleteRequest, BulkResponse, BulkUpdateItem
 from src.services.time_entry import TimeEntryService
+from src.services.export import ExportService, EXPORT_MEDIA_TYPES, parquet_available
 
 router = APIRouter()
 service = TimeEntryService()
+export_service = ExportService()
 
 @router.post("/", response_model=TimeEntryResponse)
 async def create_time_entry(
@@ -16,30 +22,131 @@ async def create_time_entry(
 ):
     return service.create(db, time_entry)
 
-@router.get("/user/{user_id}", response_model=List[TimeEntryResponse])
+@router.post("/bulk", response_model=BulkResponse[TimeEntryResponse])
+async def bulk_create_time_entries(
+    items: List[TimeEntryCreate],
+    db: Session = Depends(get_db)
+):
+    """
+    Crea più time entry in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_create(db, items)
+
+@router.put("/bulk", response_model=BulkResponse[TimeEntryResponse])
+async def bulk_update_time_entries(
+    items: List[BulkUpdateItem[TimeEntryUpdate]],
+    db: Session = Depends(get_db)
+):
+    """
+    Aggiorna più time entry in un'unica transazione.
+    Restituisce l'esito per ogni elemento, nell'ordine della richiesta.
+    """
+    return service.bulk_update(db, items)
+
+@router.delete("/bulk", response_model=BulkResponse)
+async def bulk_delete_time_entries(
+    request: BulkDeleteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Elimina più time entry in un'unica transazione.
+    Restituisce l'esito per ogni id, nell'ordine della richiesta.
+    """
+    return service.bulk_delete(db, request.ids)
+
+@router.put("/week/{user_id}/{iso_week}", response_model=WeekTimesheetResponse)
+async def replace_week_timesheet(
+    user_id: int,
+    iso_week: str,
+    timesheet: WeekTimesheet,
+    db: Session = Depends(get_db)
+):
+    """
+    Salva l'intera settimana di un utente (griglia progetto × giorno) in una
+    sola transazione. iso_week è nel formato ISO 8601, es. 2024-W03.
+    Le celle assenti dalla griglia o con 0 ore vengono eliminate.
+    """
+    match = re.fullmatch(r"(\d{4})-W(\d{2})", iso_week)
+    try:
+        monday = date.fromisocalendar(int(match[1]), int(match[2]), 1) if match else None
+    except ValueError:
+        monday = None
+    if monday is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Settimana non valida: usare il formato ISO AAAA-Www (es. 2024-W03)"
+        )
+
+    result = service.replace_week(db, user_id, monday, timesheet.entries)
+    return {"user_id": user_id, "iso_week": iso_week, "week_start": monday, **result}
+
+@router.get("/user/{user_id}", response_model=Page[TimeEntryResponse])
 async def get_user_time_entries(
     user_id: int,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
     """
-    Recupera le time entry di un utente.
+    Recupera le time entry di un utente, ordinate per data.
     Se non vengono specificate le date, restituisce tutte le time entry.
     
     Args:
         user_id: ID dell'utente
         start_date: Data iniziale opzionale
         end_date: Data finale opzionale
+        cursor: next_cursor della pagina precedente
+        limit: Numero massimo di time entry per pagina
     """
-    return service.get_by_user_and_date_range(db, user_id, start_date, end_date)
+    items, next_cursor = service.get_by_user_and_date_range(
+        db, user_id, start_date, end_date, cursor=cursor, limit=limit
+    )
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/export")
+async def export_time_entries(
+    format: Literal["csv", "ndjson", "parquet"] = "csv",
+    project_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """
+    Esporta le time entry (con email utente e nome progetto) in streaming,
+    ordinate per data. Pensato per gli export di fine mese: la memoria usata
+    non dipende dal numero di righe.
+    Il formato Parquet richiede pyarrow installato sul server.
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=400,
+            detail="Export Parquet non disponibile: installare pyarrow"
+        )
+
+    batches = export_service.time_entry_batches(
+        project_id=project_id,
+        user_id=user_id,
+        start_date=start_date,
+        end_date=end_date
+    )
+    return StreamingResponse(
+        export_service.encode(format, batches),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="time_entries.{format}"'}
+    )
 
-@router.get("/project/{project_id}", response_model=List[TimeEntryResponse])
+@router.get("/project/{project_id}", response_model=Page[TimeEntryResponse])
 async def get_project_time_entries(
     project_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    return service.get_by_project(db, project_id)
+    items, next_cursor = service.get_by_project(db, project_id, cursor=cursor, limit=limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.delete("/{time_entry_id}")
 async def delete_time_entry(
@@ -48,7 +155,8 @@ async def delete_time_entry(
 ):
     """
     Elimina una time entry dato il suo ID.
-    Restituisce un messaggio di successo o un errore 404 se non trovata.
+    Restituisce un messaggio di successo, un errore 404 se non trovata o 400
+    se già fatturata.
     """
     success = service.delete(db, time_entry_id)
     if not success:
@@ -75,7 +183,8 @@ async def update_time_entry(
         TimeEntryResponse: Time entry aggiornata
         
     Raises:
-        HTTPException: 404 se la time entry non esiste
+        HTTPException: 404 se la time entry non esiste, 400 se data od ore
+            cambiano su una entry già fatturata o superano i limiti
     """
     updated_entry = service.update(db, time_entry_id, time_entry)
     if not updated_entry:
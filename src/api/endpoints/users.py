@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from src.auth.security import get_password_hash_async
 from src.database.database import get_db
+from src.schemas.pagination import Page
 from src.schemas.user import UserCreate, UserResponse, UserUpdate, UserUpdateResponse
 from src.services.user import UserService
 from src.models.models import UserRole
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 service = UserService()
 
@@ -14,7 +19,9 @@ async def create_user(
     user: UserCreate,
     db: Session = Depends(get_db)
 ):
-    return service.create(db, user)
+    # L'hash (bcrypt/argon2) gira nel pool dedicato, fuori dall'event loop
+    password_hash = await get_password_hash_async(user.password)
+    return service.create(db, user, password_hash)
 
 @router.get("/{user_id}/projects", response_model=UserResponse)
 async def get_user_with_projects(
@@ -26,11 +33,14 @@ async def get_user_with_projects(
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-@router.get("/consultants", response_model=List[UserResponse])
+@router.get("/consultants", response_model=Page[UserResponse])
 async def get_active_consultants(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
-    return service.get_active_consultants(db)
+    items, next_cursor = service.get_active_consultants(db, cursor=cursor, limit=limit)
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
@@ -47,7 +57,7 @@ async def get_user(
     Raises:
         HTTPException: 404 se l'utente non esiste
     """
-    print(f"GET /users/{user_id} - Auth User: {request.state.user.email}")
+    logger.debug("GET /users/%s - utente autenticato: %s", user_id, request.state.user.email)
     
     user = service.get(db, user_id)
     if not user:
@@ -56,7 +66,7 @@ async def get_user(
             detail=f"Utente {user_id} non trovato"
         )
         
-    print(f"Found user: {user.email}")
+    logger.debug("Trovato utente: %s", user.email)
     return user
 
 @router.put("/{user_id}", response_model=UserUpdateResponse)
@@ -89,11 +99,10 @@ async def update_user(
     
     # Se l'email è cambiata, aggiungi i nuovi token
     if hasattr(user, 'email') and user.email:
-        from src.auth.security import create_token_pair
-        access_token, refresh_token = create_token_pair({
-            "sub": updated_user.email,
-            "role": updated_user.role.value
-        })
+        from src.auth.security import create_token_pair, build_token_claims
+        access_token, refresh_token = create_token_pair(
+            build_token_claims(updated_user)
+        )
         response_data.update({
             "access_token": access_token,
             "refresh_token": refresh_token
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from src.schemas.auth import AuthenticatedUser
+from src.auth.config import (
+    USER_CACHE_MAX_SIZE,
+    USER_CACHE_TTL_SECONDS,
+    ACCESS_TOKEN_EXPIRE_MINUTES
+)
+
+class PrincipalCache:
+    """
+    Cache in-process (LRU limitata + TTL) dei principal autenticati, indicizzata per email.
+
+    Tiene anche traccia del momento in cui un utente è stato invalidato, così i token
+    emessi prima di una modifica di ruolo o di una cancellazione non vengono più
+    accettati sulla sola base dei claim.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, invalidation_ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.invalidation_ttl_seconds = invalidation_ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, AuthenticatedUser]]" = OrderedDict()
+        self._invalidations: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email: str) -> Optional[AuthenticatedUser]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return principal
+
+    def set(self, principal: AuthenticatedUser) -> None:
+        with self._lock:
+            self._entries[principal.email] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(principal.email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: str) -> None:
+        """Rimuove l'utente dalla cache e registra l'istante di invalidazione"""
+        with self._lock:
+            self._entries.pop(email, None)
+            self._invalidations[email] = time.time()
+            self._invalidations.move_to_end(email)
+            while len(self._invalidations) > self.max_size:
+                self._invalidations.popitem(last=False)
+
+    def issued_before_invalidation(self, email: str, issued_at: Optional[float]) -> bool:
+        """
+        True se il token (emesso in `issued_at`, epoch) è precedente all'ultima
+        invalidazione dell'utente, o se non è possibile stabilirlo.
+        """
+        with self._lock:
+            invalidated_at = self._invalidations.get(email)
+            if invalidated_at is None:
+                return False
+            if invalidated_at + self.invalidation_ttl_seconds < time.time():
+                del self._invalidations[email]
+                return False
+        return issued_at is None or issued_at <= invalidated_at
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._invalidations.clear()
+
+# Le invalidazioni devono sopravvivere almeno quanto un access token
+principal_cache = PrincipalCache(
+    max_size=USER_CACHE_MAX_SIZE,
+    ttl_seconds=USER_CACHE_TTL_SECONDS,
+    invalidation_ttl_seconds=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
@@ -1,3 +1,4 @@
+import os
 from typing import List
 from src.models.models import UserRole
 
@@ -7,6 +8,26 @@ JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Modalità di autenticazione:
+# - "database" (default): il principal viene verificato sul database a ogni
+#   richiesta, quindi cambi di ruolo e cancellazioni valgono subito in tutti
+#   i processi
+# - "stateless": il principal viene costruito dai claim del token (uid, sub,
+#   role) e tenuto in una cache in-process con TTL. Le invalidazioni di
+#   UserService.update/delete agiscono solo sul processo che le esegue: con più
+#   worker gli altri accettano il vecchio ruolo fino alla scadenza del token
+#   (ACCESS_TOKEN_EXPIRE_MINUTES). Da usare solo con un unico processo.
+AUTH_MODE = os.getenv("AUTH_MODE", "database")
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "1024"))
+
+# Hashing delle password: il primo schema è usato per i nuovi hash, gli altri
+# restano verificabili e vengono aggiornati al primo login (es. "argon2,bcrypt")
+PASSWORD_HASH_SCHEMES: List[str] = os.getenv("PASSWORD_HASH_SCHEMES", "bcrypt").split(",")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Thread dedicati a hash/verifica, per non bloccare l'event loop durante i login
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
 # Public routes che non richiedono autenticazione
 PUBLIC_ROUTES: List[str] = [
     "/api/v1/auth/token",
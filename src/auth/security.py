@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, Security, Depends
@@ -7,19 +9,38 @@ from fastapi.security import OAuth2PasswordBearer, HTTPBearer, HTTPAuthorization
 from sqlalchemy.orm import Session
 from src.models.models import User, UserRole
 from src.database.database import get_db
+from src.schemas.auth import AuthenticatedUser
+from src.auth.cache import principal_cache
 import logging
 from src.auth.config import (
     JWT_SECRET_KEY,
     JWT_ALGORITHM,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     REFRESH_TOKEN_EXPIRE_DAYS,
-    PUBLIC_ROUTES
+    PUBLIC_ROUTES,
+    AUTH_MODE,
+    PASSWORD_HASH_SCHEMES,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS
 )
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max rounds coincidono con il costo configurato: needs_update() segnala
+# gli hash con un costo diverso, che vengono rigenerati al login successivo
+bcrypt_settings = {}
+if "bcrypt" in PASSWORD_HASH_SCHEMES:
+    bcrypt_settings = {
+        "bcrypt__default_rounds": BCRYPT_ROUNDS,
+        "bcrypt__min_rounds": BCRYPT_ROUNDS,
+        "bcrypt__max_rounds": BCRYPT_ROUNDS
+    }
+pwd_context = CryptContext(schemes=PASSWORD_HASH_SCHEMES, deprecated="auto", **bcrypt_settings)
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 security = HTTPBearer()
 
@@ -29,17 +50,49 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_and_update_password(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la password nel pool di thread dedicato.
+    Ritorna (valida, nuovo_hash): nuovo_hash è valorizzato se l'hash salvato
+    usa uno schema o un costo non più configurato e va sostituito.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        password_executor,
+        pwd_context.verify_and_update,
+        plain_password,
+        hashed_password
+    )
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.hash, password)
+
+def build_token_claims(user: User) -> dict:
+    """Claim usati per costruire il principal senza accedere al database"""
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "role": user.role.value
+    }
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now})
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 def create_refresh_token(data: dict) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    now = datetime.utcnow()
+    expire = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({
         "exp": expire,
+        "iat": now,
         "token_type": "refresh"
     })
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
@@ -79,6 +132,70 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"}
         )
 
+def _principal_from_claims(payload: dict) -> Optional[AuthenticatedUser]:
+    """Costruisce il principal dai claim; None se il token non li contiene tutti"""
+    try:
+        return AuthenticatedUser(
+            id=payload["uid"],
+            email=payload["sub"],
+            role=UserRole(payload["role"])
+        )
+    except (KeyError, ValueError):
+        return None
+
+def resolve_principal(
+    token: str,
+    load_user: Callable[[str], Optional[User]]
+) -> AuthenticatedUser:
+    """
+    Risolve il principal di un access token.
+
+    Con AUTH_MODE "database" il principal viene sempre letto con
+    `load_user(email)`. Con AUTH_MODE "stateless" l'ordine è:
+    1. cache in-process (TTL)
+    2. claim del token, se l'utente non è stato invalidato dopo l'emissione
+       del token
+    3. `load_user(email)`, che accede al database
+    """
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=401,
+            detail="Token non valido o scaduto",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    email = payload.get("sub")
+    if not email:
+        raise HTTPException(
+            status_code=401,
+            detail="Token non valido"
+        )
+
+    stateless = AUTH_MODE == "stateless"
+    if stateless:
+        principal = principal_cache.get(email)
+        if principal:
+            return principal
+
+        principal = _principal_from_claims(payload)
+        if principal and not principal_cache.issued_before_invalidation(email, payload.get("iat")):
+            principal_cache.set(principal)
+            return principal
+
+    user = load_user(email)
+    if not user:
+        raise HTTPException(
+            status_code=401,  # Manteniamo 401 per sicurezza
+            detail="Utente non trovato"
+        )
+
+    principal = AuthenticatedUser.model_validate(user)
+    if stateless:
+        principal_cache.set(principal)
+    return principal
+
 async def get_current_active_user(
     current_user: User = Depends(get_current_user)
 ) -> User:
@@ -0,0 +1,64 @@
+# src/cli/import_data.py
+"""
+Import massivo da CSV/NDJSON (onboarding dello storico da un altro PSA).
+
+I tipi vanno importati in ordine, perché i successivi risolvono i precedenti
+per chiave naturale:
+
+    python -m src.cli.import_data clients clienti.csv
+    python -m src.cli.import_data projects progetti.csv        # colonna client_name
+    python -m src.cli.import_data time_entries ore.ndjson      # user_email, project_name
+    python -m src.cli.import_data allocations allocazioni.csv  # user_email, project_name
+
+Le righe scartate vengono scritte in <file>.rejects.<estensione>.
+"""
+import argparse
+import os
+import sys
+from src.database.database import SessionLocal
+from src.services.importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, IMPORT_KINDS, ImportService, detect_format
+
+def main():
+    parser = argparse.ArgumentParser(description="Import massivo da CSV/NDJSON")
+    parser.add_argument("kind", choices=list(IMPORT_KINDS))
+    parser.add_argument("path", help="File CSV o NDJSON")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Default: dall'estensione del file")
+    parser.add_argument("--reject-file", help="File delle righe scartate")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    format = args.format or detect_format(args.path)
+    root, extension = os.path.splitext(args.path)
+    reject_path = args.reject_file or f"{root}.rejects{extension}"
+
+    def progress(summary):
+        print(
+            f"\r{summary['processed']} righe lette, {summary['imported']} importate, "
+            f"{summary['rejected']} scartate",
+            end="",
+            file=sys.stderr,
+            flush=True
+        )
+
+    with open(args.path, newline="", encoding="utf-8") as stream, \
+            open(reject_path, "w", newline="", encoding="utf-8") as reject_stream, \
+            SessionLocal() as db:
+        summary = ImportService().import_stream(
+            db,
+            args.kind,
+            stream,
+            format,
+            reject_stream=reject_stream,
+            progress=progress,
+            chunk_size=args.chunk_size
+        )
+    print(file=sys.stderr)
+
+    if summary["rejected"]:
+        print(f"Righe scartate: {summary['rejected']} (dettagli in {reject_path})")
+    else:
+        os.remove(reject_path)
+    print(f"Import completato: {summary['imported']} record importati")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Fatturazione di fine mese di tutti i progetti a consuntivo attivi.
+
+    python -m src.cli.invoice_batch                        # mese precedente
+    python -m src.cli.invoice_batch --month 2024-05 --workers 8
+    python -m src.cli.invoice_batch --resume 12            # riprende un job interrotto
+
+I progetti vengono fatturati in parallelo su un pool di processi. Esce con
+codice 1 se la fatturazione di almeno un progetto è fallita: il job può
+essere ripreso con --resume.
+"""
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+from src.database.database import SessionLocal
+from src.services.invoice_batch import INVOICE_BATCH_MAX_ATTEMPTS, INVOICE_BATCH_WORKERS, InvoiceBatchService
+
+def _month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fatturazione di fine mese dei progetti a consuntivo")
+    parser.add_argument("--month", type=_month,
+                        help="Mese da fatturare (YYYY-MM, default: mese precedente)")
+    parser.add_argument("--invoice-date", type=date.fromisoformat,
+                        help="Data fattura (YYYY-MM-DD, default: oggi)")
+    parser.add_argument("--due-days", type=int, default=30,
+                        help="Giorni di scadenza dalla data fattura")
+    parser.add_argument("--workers", type=int, default=INVOICE_BATCH_WORKERS)
+    parser.add_argument("--max-attempts", type=int, default=INVOICE_BATCH_MAX_ATTEMPTS)
+    parser.add_argument("--resume", type=int, metavar="JOB_ID",
+                        help="Riprende un job esistente")
+    args = parser.parse_args()
+
+    service = InvoiceBatchService()
+    job_id = args.resume
+    if job_id is None:
+        period_start = args.month or (date.today().replace(day=1) - timedelta(days=1)).replace(day=1)
+        period_end = (period_start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        invoice_date = args.invoice_date or date.today()
+        with SessionLocal() as db:
+            job = service.create_job(
+                db,
+                period_start=period_start,
+                period_end=period_end,
+                invoice_date=invoice_date,
+                due_date=invoice_date + timedelta(days=args.due_days)
+            )
+        job_id = job.id
+        print(f"Job {job_id}: {len(job.items)} progetti dal {period_start} al {period_end}")
+
+    def progress(result):
+        detail = result["invoice_id"] if result["status"] == "INVOICED" else result["error"] or ""
+        print(f"progetto {result['project_id']}: {result['status']} {detail}".rstrip())
+
+    try:
+        summary = service.run_job(job_id, workers=args.workers, max_attempts=args.max_attempts, progress=progress)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(
+        f"Job {job_id} {summary['status']}: {summary['invoiced']} fatturati, "
+        f"{summary['skipped']} senza ore, {summary['failed']} falliti"
+    )
+    if summary["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# src/cli/rebuild_daily_hours.py
+"""
+Ricostruisce il rollup user_daily_hours da time_entries.
+
+Da usare dopo import massivi o correzioni fatte direttamente sul database:
+
+    python -m src.cli.rebuild_daily_hours
+    python -m src.cli.rebuild_daily_hours --user-id 3 --user-id 7 --from 2024-01-01 --to 2024-02-01
+"""
+import argparse
+from datetime import date
+from src.database.database import SessionLocal
+from src.services.time_entry import TimeEntryService
+
+def main():
+    parser = argparse.ArgumentParser(description="Ricostruisce il rollup user_daily_hours")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids",
+                        help="Utente da ricostruire (ripetibile, default: tutti)")
+    parser.add_argument("--from", type=date.fromisoformat, dest="start_day",
+                        help="Primo giorno incluso (YYYY-MM-DD)")
+    parser.add_argument("--to", type=date.fromisoformat, dest="end_day",
+                        help="Primo giorno escluso (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        rows = TimeEntryService().rebuild_daily_hours(
+            db,
+            user_ids=args.user_ids,
+            start_day=args.start_day,
+            end_day=args.end_day
+        )
+    print(f"Rollup ricostruito: {rows} giorni")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# src/cli/reconcile_invoice_totals.py
+"""
+Verifica i totali delle fatture (importo, numero di righe, ore) rispetto ai
+line items, con un'unica query aggregata.
+
+Da usare dopo correzioni fatte direttamente sul database:
+
+    python -m src.cli.reconcile_invoice_totals
+    python -m src.cli.reconcile_invoice_totals --fix
+
+Esce con codice 1 se trova fatture non allineate e --fix non è indicato.
+"""
+import argparse
+import sys
+from src.database.database import SessionLocal
+from src.services.invoice import InvoiceService
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica i totali delle fatture rispetto ai line items")
+    parser.add_argument("--fix", action="store_true",
+                        help="Corregge i totali non allineati")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        mismatches = InvoiceService().reconcile_totals(db, fix=args.fix)
+
+    for item in mismatches:
+        print(
+            f"Fattura {item['invoice_id']}: "
+            f"importo {item['amount']} (atteso {item['expected_amount']}), "
+            f"righe {item['line_count']} (attese {item['expected_line_count']}), "
+            f"ore {item['hours']} (attese {item['expected_hours']})"
+        )
+    if not mismatches:
+        print("Totali delle fatture allineati")
+    elif args.fix:
+        print(f"Totali corretti: {len(mismatches)} fatture")
+    else:
+        print(f"Fatture non allineate: {len(mismatches)} (usare --fix per correggerle)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
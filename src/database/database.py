@@ -1,9 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import ORMExecuteState, raiseload, sessionmaker, Session
+from sqlalchemy.engine import URL, make_url
+from starlette.requests import Request
 import os
-from typing import Generator
+from typing import AsyncGenerator, Generator, Optional
 
 # Configurazione del database da variabili d'ambiente
 DB_USER = os.getenv("DB_USER", "postgres")
@@ -39,19 +42,116 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+# Sviluppo/test: ogni caricamento lazy di una relazione che emetterebbe SQL
+# solleva un errore, così un nuovo N+1 fallisce subito invece di moltiplicare
+# le query. Le relazioni serializzate da un endpoint vanno caricate dal service
+# (selectinload per le collezioni).
+RAISE_ON_LAZY_LOAD = os.getenv("RAISE_ON_LAZY_LOAD", "false").lower() in ("1", "true", "yes")
+
+def _raise_on_lazy_load(state: ORMExecuteState) -> None:
+    if state.is_select and not state.is_column_load:
+        state.statement = state.statement.options(raiseload("*", sql_only=True))
+
+def enable_raise_on_lazy_load(session_factory: sessionmaker = SessionLocal) -> None:
+    """Applica lazy="raise" a tutte le relazioni caricate dalle sessioni di session_factory"""
+    event.listen(session_factory, "do_orm_execute", _raise_on_lazy_load)
+
+if RAISE_ON_LAZY_LOAD:
+    enable_raise_on_lazy_load()
+
+# URL del driver asincrono: asyncpg per PostgreSQL.
+# Per i test locali si può usare ad es. ASYNC_DATABASE_URL=sqlite+aiosqlite:///./test.db
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or DATABASE_URL.set(
+    drivername="postgresql+asyncpg"
+)
+
+# Sessioni asincrone: il bind viene impostato alla creazione dell'engine
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False
+)
+
+_async_engine: Optional[AsyncEngine] = None
+
 # Base class per i modelli
 Base = declarative_base()
 
-def get_db() -> Generator:
+def get_request_db(request: Request) -> Session:
+    """
+    Restituisce la sessione database associata alla richiesta.
+    La sessione viene creata solo al primo utilizzo e salvata in request.state,
+    così middleware ed endpoint condividono un'unica connessione dal pool.
+    """
+    db = getattr(request.state, "db", None)
+    if db is None:
+        db = SessionLocal()
+        request.state.db = db
+    return db
+
+def release_request_db(request: Request) -> None:
+    """
+    Chiude la sessione della richiesta (se è stata creata) restituendo
+    la connessione al pool.
+    """
+    db = getattr(request.state, "db", None)
+    if db is not None:
+        request.state.db = None
+        db.close()
+
+def get_db(request: Request) -> Generator:
     """
     Generator di sessioni database.
     Usa questo come dependency injection nei router FastAPI.
+    Riusa la sessione della richiesta se il middleware l'ha già aperta; in quel
+    caso la chiusura spetta al middleware, altrimenti avviene qui.
     """
-    db = SessionLocal()
+    owner = getattr(request.state, "db", None) is None
+    db = get_request_db(request)
     try:
         yield db
     finally:
-        db.close()
+        if owner:
+            release_request_db(request)
+
+def dialect_insert(db: Session, target):
+    """
+    INSERT specifico del dialetto della sessione, per usare
+    ON CONFLICT DO NOTHING / DO UPDATE (supportati da PostgreSQL e SQLite).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(target)
+    return sqlite.insert(target)
+
+def get_async_engine() -> AsyncEngine:
+    """
+    Restituisce l'engine asincrono, creandolo al primo utilizzo.
+    La creazione è lazy così il driver asincrono (asyncpg/aiosqlite) è
+    richiesto solo dai router che lo usano.
+    """
+    global _async_engine
+    if _async_engine is None:
+        url = make_url(ASYNC_DATABASE_URL)
+        pool_options = {}
+        if url.get_backend_name() != "sqlite":
+            pool_options = {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30}
+        _async_engine = create_async_engine(url, echo=False, **pool_options)
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Generator di sessioni database asincrone.
+    Dependency per i router migrati ad AsyncBaseService: le query non
+    bloccano l'event loop di uvicorn.
+    Con AUTH_MODE "database" il middleware ha già letto l'utente con la
+    sessione sincrona della richiesta: viene chiusa qui, così la richiesta
+    non tiene due connessioni. Un endpoint asincrono non deve quindi
+    dipendere anche da get_db.
+    """
+    release_request_db(request)
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
 
 def init_db() -> None:
     """
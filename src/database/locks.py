@@ -0,0 +1,30 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+# Namespace dei lock advisory (primo argomento di pg_advisory_xact_lock),
+# per non far collidere chiavi uguali di risorse diverse
+USER_ALLOCATIONS_LOCK = 1
+PROJECT_INVOICING_LOCK = 2
+
+def advisory_xact_lock(db: Session, namespace: int, *keys: int) -> None:
+    """
+    Acquisisce i lock advisory transazionali (namespace, key) di PostgreSQL.
+    I lock vengono rilasciati al commit o al rollback della transazione; le
+    chiavi sono acquisite in ordine crescente per evitare deadlock tra
+    transazioni che bloccano più chiavi.
+    SQLite (usato nei test) ha un solo lock di scrittura per tutto il
+    database: la transazione lo prende subito con BEGIN IMMEDIATE, così le
+    letture fatte sotto lock non possono essere superate da un'altra
+    scrittura. Sugli altri database la funzione non fa nulla.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        connection = db.connection()
+        # Dopo una prima scrittura la transazione ha già il lock
+        if not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        return
+    if dialect != "postgresql":
+        return
+    for key in sorted(set(keys)):
+        db.execute(select(func.pg_advisory_xact_lock(namespace, key)))
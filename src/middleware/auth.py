@@ -1,45 +1,73 @@
 # src/middleware/auth.py
 from fastapi import Request, HTTPException
-from fastapi.security import HTTPAuthorizationCredentials
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
-from src.auth.security import get_current_user
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from src.auth.security import resolve_principal
 from src.auth.config import PUBLIC_ROUTES
+from src.database.database import get_request_db, release_request_db
+from src.models.models import User
 import logging
 
 logger = logging.getLogger(__name__)
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path in PUBLIC_ROUTES:
-            return await call_next(request)
+class AuthMiddleware:
+    """
+    Middleware ASGI di autenticazione.
 
+    Implementato direttamente su ASGI (senza BaseHTTPMiddleware) per evitare il
+    task aggiuntivo e il buffering della risposta: lo streaming passa inalterato e
+    la sessione della richiesta viene rilasciata solo a risposta completamente inviata.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.public_routes = frozenset(PUBLIC_ROUTES)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.public_routes:
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=401,
                 content={"detail": "Token mancante"}
             )
+            await response(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
 
         try:
-            # Usa get_current_user
-            from src.database.database import get_db
-            db = next(get_db())
-            credentials = HTTPAuthorizationCredentials(
-                scheme="Bearer",
-                credentials=auth_header.split(" ")[1]
+            # La sessione della richiesta viene aperta solo se il principal
+            # non è in cache né ricavabile dai claim, e riusata dagli endpoint
+            request.state.user = resolve_principal(
+                auth_header.split(" ")[1],
+                lambda email: get_request_db(request).query(User).filter(User.email == email).first()
             )
-            user = await get_current_user(credentials, db)
-            request.state.user = user
-            return await call_next(request)
-            
+            await self.app(scope, receive, send_wrapper)
+
         except HTTPException as he:
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=he.status_code,
                 content={"detail": he.detail}
             )
+            await response(scope, receive, send)
         except Exception as e:
-            return JSONResponse(
+            if response_started:
+                raise
+            response = JSONResponse(
                 status_code=500,
                 content={"detail": f"Errore interno: {str(e)}"}
-            )
\ No newline at end of file
+            )
+            await response(scope, receive, send)
+        finally:
+            release_request_db(request)
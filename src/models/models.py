@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Enum, Date, Numeric, Boolean, Index
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Enum, Date, Numeric, Boolean, Index, Computed
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import DeclarativeBase, relationship, validates
 from datetime import date
@@ -29,6 +29,18 @@ class BillingType(enum.Enum):
     TIME_AND_MATERIALS = "TIME_AND_MATERIALS"
     FIXED_PRICE = "FIXED_PRICE"
 
+class InvoiceBatchStatus(enum.Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+class InvoiceBatchItemStatus(enum.Enum):
+    PENDING = "PENDING"
+    INVOICED = "INVOICED"
+    SKIPPED = "SKIPPED"
+    FAILED = "FAILED"
+
 class ConsultantRole(enum.Enum):
     JUNIOR = "JUNIOR"
     MID = "MID"
@@ -119,6 +131,10 @@ class TimeEntry(Base):
     __table_args__ = (
         Index('idx_time_entries_date', 'date'),
         Index('idx_time_entries_user_date', 'user_id', 'date'),
+        # Copre i controlli sulle ore giornaliere/settimanali (index-only scan)
+        Index('idx_time_entries_user_day', 'user_id', 'entry_day', postgresql_include=['hours']),
+        # Selezione delle entry da fatturare per progetto e periodo
+        Index('idx_time_entries_project_day', 'project_id', 'entry_day'),
     )
     
     id = Column(Integer, primary_key=True)
@@ -126,6 +142,8 @@ class TimeEntry(Base):
     project_id = Column(Integer, ForeignKey("projects.id"))
     date = Column(DateTime, nullable=False)
     hours = Column(Float, nullable=False)
+    # Giorno della entry, calcolato e salvato dal database
+    entry_day = Column(Date, Computed("date(date)", persisted=True))
     description = Column(String)
     
     user = relationship("User", back_populates="time_entries")
@@ -142,6 +160,18 @@ class TimeEntry(Base):
         overlaps="line_item_links"
     )
 
+class UserDailyHours(Base):
+    """
+    Totale delle ore registrate da un utente in un giorno.
+    Mantenuto da TimeEntryService a ogni scrittura di time entry; si ricostruisce
+    da time_entries con `python -m src.cli.rebuild_daily_hours`.
+    """
+    __tablename__ = "user_daily_hours"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hours = Column(Float, nullable=False, default=0)
+
 class ResourceAllocation(Base):
     __tablename__ = "resource_allocations"
     
@@ -184,17 +214,11 @@ class Invoice(Base):
     invoice_number = Column(String, unique=True, nullable=False)
     invoice_date = Column(Date, nullable=False)
     due_date = Column(Date, nullable=False)
+    # Totali dei line items, mantenuti da InvoiceService/LineItemService con
+    # UPDATE incrementali; si verificano con `python -m src.cli.reconcile_invoice_totals`
     amount = Column(Numeric(10, 2), nullable=False)
-    
-    @property
-    def calculated_amount(self):
-        return sum(item.amount for item in self.line_items)
-    
-    @validates('amount')
-    def validate_amount(self, key, amount):
-        if self.line_items and amount != self.calculated_amount:
-            raise ValueError("Invoice amount must match line items total")
-        return amount
+    line_count = Column(Integer, nullable=False, default=0, server_default="0")
+    hours = Column(Numeric(10, 2), nullable=False, default=0, server_default="0")
 
     paid = Column(Boolean, default=False)
     paid_date = Column(Date)
@@ -203,6 +227,17 @@ class Invoice(Base):
     project = relationship("Project", back_populates="invoices")
     line_items = relationship("InvoiceLineItem", back_populates="invoice")
 
+class InvoiceNumberCounter(Base):
+    """
+    Ultimo numero fattura assegnato per anno fiscale (numerazione progressiva
+    senza buchi). La riga viene incrementata nella transazione della fattura
+    da InvoiceNumberingService: un rollback restituisce il numero.
+    """
+    __tablename__ = "invoice_number_counters"
+
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    last_number = Column(Integer, nullable=False, default=0)
+
 class InvoiceLineItem(Base):
     __tablename__ = "invoice_line_items"
     
@@ -230,9 +265,45 @@ class InvoiceLineItem(Base):
 # Tabella di collegamento tra TimeEntry e InvoiceLineItem
 class LineItemTimeEntry(Base):
     __tablename__ = "line_item_time_entries"
+    __table_args__ = (
+        # Anti-join "entry non ancora fatturata" e controllo delle entry fatturate
+        Index('idx_line_item_time_entries_time_entry', 'time_entry_id'),
+    )
     
     line_item_id = Column(Integer, ForeignKey("invoice_line_items.id"), primary_key=True)
     time_entry_id = Column(Integer, ForeignKey("time_entries.id"), primary_key=True)
 
     line_item = relationship("InvoiceLineItem", back_populates="time_entry_links")
     time_entry = relationship("TimeEntry", back_populates="line_item_links")
+
+class InvoiceBatchJob(Base):
+    """
+    Fatturazione di fine mese di tutti i progetti a consuntivo attivi.
+    Lo stato di ogni progetto è in InvoiceBatchItem: un job interrotto
+    riprende dai progetti non ancora fatturati.
+    """
+    __tablename__ = "invoice_batch_jobs"
+
+    id = Column(Integer, primary_key=True)
+    period_start = Column(Date, nullable=False)
+    period_end = Column(Date, nullable=False)
+    invoice_date = Column(Date, nullable=False)
+    due_date = Column(Date, nullable=False)
+    status = Column(Enum(InvoiceBatchStatus), nullable=False, default=InvoiceBatchStatus.PENDING)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime)
+
+    items = relationship("InvoiceBatchItem", back_populates="job", order_by="InvoiceBatchItem.project_id")
+
+class InvoiceBatchItem(Base):
+    __tablename__ = "invoice_batch_items"
+
+    job_id = Column(Integer, ForeignKey("invoice_batch_jobs.id", ondelete="CASCADE"), primary_key=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), primary_key=True)
+    status = Column(Enum(InvoiceBatchItemStatus), nullable=False, default=InvoiceBatchItemStatus.PENDING)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"))
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    job = relationship("InvoiceBatchJob", back_populates="items")
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr
+from src.models.models import UserRole
 
 class Token(BaseModel):
     access_token: str
@@ -9,6 +10,16 @@ class TokenData(BaseModel):
     email: str | None = None
     role: str | None = None
 
+class AuthenticatedUser(BaseModel):
+    """Principal della richiesta, salvato in request.state.user dal middleware"""
+    id: int
+    email: str
+    role: UserRole
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
\ No newline at end of file
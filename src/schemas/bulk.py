@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from typing import Any, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+class BulkUpdateItem(BaseModel, Generic[U]):
+    id: int
+    data: U
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1)
+
+class BulkItemResult(BaseModel, Generic[T]):
+    index: int  # posizione dell'elemento nella richiesta
+    id: Optional[int] = None
+    success: bool
+    error: Optional[str] = None
+    item: Optional[T] = None
+
+class BulkResponse(BaseModel, Generic[T]):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult[T]]
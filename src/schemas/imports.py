@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List
+
+class ImportReject(BaseModel):
+    line: int  # riga del file
+    error: str
+
+class ImportResult(BaseModel):
+    kind: str
+    processed: int
+    imported: int
+    rejected: int
+    rejects: List[ImportReject]  # prime righe scartate
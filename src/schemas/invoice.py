@@ -25,7 +25,8 @@ class InvoiceLineItemCreate(InvoiceLineItemBase):
 
 class InvoiceCreate(BaseModel):
     project_id: int
-    invoice_number: str = Field(min_length=1, max_length=50)
+    # Se assente viene assegnato il prossimo numero dell'anno della data fattura
+    invoice_number: Optional[str] = Field(None, min_length=1, max_length=50)
     invoice_date: date
     due_date: date
     notes: Optional[str] = None
@@ -36,7 +37,7 @@ class InvoiceCreate(BaseModel):
         if self.due_date < self.invoice_date:
             raise ValueError("La data di scadenza deve essere successiva alla data fattura")
         
-        if self.invoice_number.lower() == 'string':
+        if self.invoice_number is not None and self.invoice_number.lower() == 'string':
             raise ValueError("Il numero fattura non può essere 'string'")
             
         return self
@@ -60,10 +61,27 @@ class InvoiceCreate(BaseModel):
         }
     }
 
+class InvoiceGenerate(BaseModel):
+    """Fattura da generare con le time entry non fatturate del progetto nel periodo"""
+    project_id: int
+    period_start: date
+    period_end: date
+    invoice_number: Optional[str] = Field(None, min_length=1, max_length=50)
+    invoice_date: date
+    due_date: date
+    notes: Optional[str] = None
+
+    @model_validator(mode='after')
+    def validate_dates(self) -> 'InvoiceGenerate':
+        if self.period_end < self.period_start:
+            raise ValueError("La fine del periodo deve essere successiva all'inizio")
+        if self.due_date < self.invoice_date:
+            raise ValueError("La data di scadenza deve essere successiva alla data fattura")
+        return self
+
 class InvoiceUpdate(BaseModel):
     invoice_date: Optional[date] = None
     due_date: Optional[date] = None
-    amount: Optional[Decimal] = None
     paid: Optional[bool] = None
     paid_date: Optional[date] = None
     notes: Optional[str] = None
@@ -75,6 +93,8 @@ class InvoiceResponseNoItems(BaseModel):
     invoice_date: date
     due_date: date
     amount: Annotated[Decimal, Field(max_digits=10, decimal_places=2)]
+    line_count: int = 0
+    hours: Decimal = Decimal('0')
     notes: Optional[str] = None
     paid: bool = False
     paid_date: Optional[date] = None
@@ -96,6 +116,8 @@ class InvoiceBase(BaseModel):
     invoice_date: date
     due_date: date = None
     amount: Annotated[Decimal, Field(max_digits=10, decimal_places=2)]
+    line_count: int = 0
+    hours: Decimal = Decimal('0')
     notes: Optional[str] = None
     line_items: List[InvoiceLineItemBase] = None
 
@@ -0,0 +1,43 @@
+from pydantic import BaseModel, model_validator
+from typing import List, Optional
+from datetime import date, datetime
+from src.models.models import InvoiceBatchItemStatus, InvoiceBatchStatus
+
+class InvoiceBatchCreate(BaseModel):
+    """Fatturazione di tutti i progetti a consuntivo attivi per il periodo"""
+    period_start: date
+    period_end: date
+    invoice_date: date
+    due_date: date
+
+    @model_validator(mode='after')
+    def validate_dates(self) -> 'InvoiceBatchCreate':
+        if self.period_end < self.period_start:
+            raise ValueError("La fine del periodo deve essere successiva all'inizio")
+        if self.due_date < self.invoice_date:
+            raise ValueError("La data di scadenza deve essere successiva alla data fattura")
+        return self
+
+class InvoiceBatchItemResponse(BaseModel):
+    project_id: int
+    status: InvoiceBatchItemStatus
+    invoice_id: Optional[int] = None
+    attempts: int
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class InvoiceBatchResponse(BaseModel):
+    id: int
+    period_start: date
+    period_end: date
+    invoice_date: date
+    due_date: date
+    status: InvoiceBatchStatus
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    items: List[InvoiceBatchItemResponse] = []
+
+    class Config:
+        from_attributes = True
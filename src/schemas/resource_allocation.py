@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator, ValidationInfo, model_validator
 from datetime import date
-from typing import Optional, Any
+from typing import Optional, Any, List, Union
 from src.models.models import ConsultantRole, ResourceAllocationStatus
 
 class ResourceAllocationBase(BaseModel):
@@ -16,34 +16,11 @@ class ResourceAllocationCreate(ResourceAllocationBase):
     @model_validator(mode='after')
     def validate_allocation(self) -> 'ResourceAllocationCreate':
         """Validazione completa del modello dopo che tutti i campi sono popolati"""
-        try:
-            # Verifica date
-            if self.end_date < self.start_date:
-                raise ValueError("La data di fine deve essere successiva alla data di inizio")
-            
-            # Verifica disponibilità
-            from src.services.resource_allocation import ResourceAllocationService
-            from src.database.database import SessionLocal
-            
-            with SessionLocal() as db:
-                service = ResourceAllocationService()
-                total_allocation = service.check_availability(
-                    db,
-                    self.user_id,
-                    self.start_date,
-                    self.end_date
-                )
-
-                if total_allocation + self.allocation_percentage > 1:
-                    raise ValueError(
-                        f"L'allocazione totale non può superare il 100%. "
-                        f"Allocazione disponibile: {(1-total_allocation)*100}%"
-                    )
-
-            return self
-            
-        except Exception as e:
-            raise ValueError(str(e))
+        if self.end_date < self.start_date:
+            raise ValueError("La data di fine deve essere successiva alla data di inizio")
+        # Il limite del 100% per utente è verificato da ResourceAllocationService
+        # in scrittura, sotto lock, insieme alle allocazioni esistenti
+        return self
 
 class ResourceAllocationUpdate(BaseModel):
     start_date: Optional[date] = None
@@ -56,4 +33,25 @@ class ResourceAllocationResponse(ResourceAllocationBase):
     id: int
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class TeamAvailabilityResponse(BaseModel):
+    start_date: date
+    end_date: date
+    days: int
+    user_ids: List[int]  # righe della matrice, nello stesso ordine
+    # "percent": lista di righe con la disponibilità in percentuale intera (0-100)
+    # "base64": stessi valori come byte uint8 riga per riga, codificati in base64
+    encoding: str
+    values: Union[List[List[int]], str]
+
+class CapacityCandidate(BaseModel):
+    user_id: int
+    available_percentage: float  # disponibilità minima nel periodo (0-1)
+
+class CapacitySearchResponse(BaseModel):
+    start_date: date
+    end_date: date
+    min_available: float
+    role: Optional[ConsultantRole] = None
+    candidates: List[CapacityCandidate]
@@ -1,8 +1,6 @@
 from pydantic import BaseModel, Field, field_validator, ValidationInfo
-from datetime import datetime, timedelta
-from typing import Optional
-from sqlalchemy.orm import Session
-from src.models.models import TimeEntry
+from datetime import date, datetime
+from typing import List, Optional
 
 class TimeEntryBase(BaseModel):
     user_id: int
@@ -19,40 +17,8 @@ class TimeEntryCreate(TimeEntryBase):
         if v <= 0 or v > 8:
             raise ValueError("Le ore giornaliere devono essere comprese tra 0 e 8")
 
-        # Ottieni user_id e date dai dati validati
-        user_id = getattr(info.data, 'user_id', None)
-        date_value = getattr(info.data, 'date', None)
-
-        if user_id is None or date_value is None:
-            return v
-
-        # Calcola inizio e fine settimana
-        week_start = date_value - timedelta(days=date_value.weekday())
-        week_end = week_start + timedelta(days=4)
-
-        from src.services.time_entry import TimeEntryService
-        from src.database.database import SessionLocal
-        
-        db = SessionLocal()
-        try:
-            service = TimeEntryService()
-            weekly_hours = service.get_weekly_hours(
-                db, 
-                user_id,
-                week_start.date(), 
-                week_end.date()
-            )
-
-            total_hours = weekly_hours + v
-            if total_hours > 40:
-                raise ValueError(
-                    f"Il totale delle ore settimanali non può superare 40. "
-                    f"Ore già registrate questa settimana: {weekly_hours}"
-                )
-
-        finally:
-            db.close()
-        
+        # I limiti giornalieri e settimanali, che richiedono le entry già
+        # registrate, sono verificati da TimeEntryService in scrittura
         return v
 
 class TimeEntryUpdate(BaseModel):
@@ -64,4 +30,23 @@ class TimeEntryResponse(TimeEntryBase):
     id: int
     
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class WeekTimesheetCell(BaseModel):
+    project_id: int
+    date: date
+    hours: float = Field(..., ge=0, le=8)  # 0 elimina la cella
+    description: Optional[str] = None
+
+class WeekTimesheet(BaseModel):
+    # La griglia sostituisce l'intera settimana: le celle assenti vengono eliminate
+    entries: List[WeekTimesheetCell]
+
+class WeekTimesheetResponse(BaseModel):
+    user_id: int
+    iso_week: str
+    week_start: date
+    created: int
+    updated: int
+    deleted: int
+    entries: List[TimeEntryResponse]
@@ -0,0 +1,117 @@
+from typing import Generic, TypeVar, Type, List, Optional, Tuple
+from sqlalchemy import delete, select, update, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+from src.models.models import Base
+from src.services.base import requires_orm_delete, requires_orm_update
+from src.services.pagination import encode_cursor, decode_cursor, keyset_filter
+
+ModelType = TypeVar("ModelType", bound=Base)
+CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
+UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+
+class AsyncBaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """
+    Variante asincrona di BaseService, da usare con la dependency get_async_db.
+
+    Le relazioni non vengono caricate in modo lazy con AsyncSession: i metodi
+    che le usano devono caricarle esplicitamente (selectinload/joinedload).
+    """
+
+    # Chiave di ordinamento stabile (univoca) usata dalla paginazione a cursore
+    cursor_columns: Tuple[str, ...] = ("id",)
+
+    def __init__(self, model: Type[ModelType]):
+        self.model = model
+
+    async def get(self, db: AsyncSession, id: int) -> Optional[ModelType]:
+        result = await db.execute(select(self.model).where(self.model.id == id))
+        return result.scalars().first()
+
+    async def paginate(
+        self,
+        db: AsyncSession,
+        statement: Select,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """Paginazione keyset, come BaseService.paginate"""
+        columns = [getattr(self.model, name) for name in self.cursor_columns]
+        if cursor:
+            statement = statement.where(keyset_filter(columns, decode_cursor(cursor, columns)))
+
+        result = await db.execute(statement.order_by(*columns).limit(limit + 1))
+        items = list(result.scalars().all())
+        if len(items) <= limit:
+            return items, None
+
+        items = items[:limit]
+        last = items[-1]
+        return items, encode_cursor([getattr(last, name) for name in self.cursor_columns])
+
+    async def list(
+        self,
+        db: AsyncSession,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        return await self.paginate(db, select(self.model), cursor, limit)
+
+    async def create(self, db: AsyncSession, obj_in: CreateSchemaType) -> ModelType:
+        obj_data = obj_in.model_dump()
+        db_obj = self.model(**obj_data)
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def update(self, db: AsyncSession, id: int, obj_in: UpdateSchemaType) -> Optional[ModelType]:
+        """
+        Come BaseService.update: un solo UPDATE ... RETURNING, oppure il
+        percorso ORM se i campi modificati hanno hook @validates.
+        """
+        update_data = obj_in.model_dump(exclude_unset=True)
+        if (
+            not update_data
+            or requires_orm_update(self.model, update_data)
+            or not db.get_bind().dialect.update_returning
+        ):
+            return await self._orm_update(db, id, update_data)
+
+        statement = update(self.model)\
+            .where(self.model.id == id)\
+            .values(**update_data)\
+            .returning(self.model)\
+            .execution_options(synchronize_session=False, populate_existing=True)
+        db_obj = (await db.scalars(statement)).first()
+        await db.commit()
+        return db_obj
+
+    async def _orm_update(self, db: AsyncSession, id: int, update_data: dict) -> Optional[ModelType]:
+        db_obj = await self.get(db, id)
+        if not db_obj:
+            return None
+
+        for field, value in update_data.items():
+            setattr(db_obj, field, value)
+
+        db.add(db_obj)
+        await db.commit()
+        await db.refresh(db_obj)
+        return db_obj
+
+    async def delete(self, db: AsyncSession, id: int) -> bool:
+        """Come BaseService.delete: un solo DELETE ... RETURNING id, oppure l'ORM se ci sono relazioni"""
+        if requires_orm_delete(self.model) or not db.get_bind().dialect.delete_returning:
+            obj = await self.get(db, id)
+            if not obj:
+                return False
+            await db.delete(obj)
+            await db.commit()
+            return True
+
+        deleted_id = await db.scalar(
+            delete(self.model).where(self.model.id == id).returning(self.model.id)
+        )
+        await db.commit()
+        return deleted_id is not None
@@ -0,0 +1,106 @@
+from datetime import date
+from typing import Iterable, Sequence, Tuple
+import numpy as np
+
+# Le percentuali vengono arrotondate per evitare residui di floating point
+# (es. 0.1 + 0.2 - 0.3) nei confronti con 0 e 1
+PRECISION = 6
+
+def allocation_curve(
+    intervals: Iterable[Tuple[date, date, float]],
+    start_date: date,
+    end_date: date
+) -> np.ndarray:
+    """
+    Allocazione complessiva giorno per giorno in [start_date, end_date].
+
+    Sweep-line vettorizzato: ogni intervallo (inizio, fine, percentuale) aggiunge
+    +percentuale al giorno di inizio e -percentuale al giorno dopo la fine; la
+    somma cumulata dei delta dà la curva. Costo O(giorni + intervalli).
+    """
+    n_days = (end_date - start_date).days + 1
+    if n_days <= 0:
+        raise ValueError("La data di fine deve essere successiva alla data di inizio")
+
+    rows = list(intervals)
+    if not rows:
+        return np.zeros(n_days)
+
+    origin = start_date.toordinal()
+    starts = np.fromiter((s.toordinal() for s, _, _ in rows), dtype=np.int64, count=len(rows)) - origin
+    ends = np.fromiter((e.toordinal() for _, e, _ in rows), dtype=np.int64, count=len(rows)) - origin + 1
+    percentages = np.fromiter((p for _, _, p in rows), dtype=np.float64, count=len(rows))
+
+    deltas = np.zeros(n_days + 1)
+    np.add.at(deltas, np.clip(starts, 0, n_days), percentages)
+    np.add.at(deltas, np.clip(ends, 0, n_days), -percentages)
+    return np.round(np.cumsum(deltas[:-1]), PRECISION)
+
+def peak_allocation(
+    intervals: Iterable[Tuple[date, date, float]],
+    start_date: date,
+    end_date: date
+) -> Tuple[float, date]:
+    """
+    Allocazione massima in [start_date, end_date] e primo giorno in cui è raggiunta.
+
+    Sweep sugli estremi ordinati degli intervalli: O(k log k) sul numero di
+    intervalli, indipendente dalla durata del periodo.
+    """
+    events = []
+    for start, end, percentage in intervals:
+        start, end = max(start, start_date), min(end, end_date)
+        if start <= end:
+            events.append((start.toordinal(), percentage))
+            events.append((end.toordinal() + 1, -percentage))
+    events.sort()
+
+    peak, peak_day, level = 0.0, start_date, 0.0
+    for position, (day, delta) in enumerate(events):
+        level += delta
+        # Il livello del giorno è noto solo dopo tutti i suoi eventi
+        if position + 1 < len(events) and events[position + 1][0] == day:
+            continue
+        current = round(level, PRECISION)
+        if current > peak:
+            peak, peak_day = current, date.fromordinal(day)
+    return peak, peak_day
+
+def availability_curve(
+    intervals: Iterable[Tuple[date, date, float]],
+    start_date: date,
+    end_date: date
+) -> np.ndarray:
+    """Disponibilità giornaliera (1 - allocazione, mai negativa) in [start_date, end_date]"""
+    return np.round(np.maximum(0, 1 - allocation_curve(intervals, start_date, end_date)), PRECISION)
+
+def availability_matrix(
+    rows: Sequence[Tuple[int, date, date, float]],
+    n_users: int,
+    start_date: date,
+    end_date: date
+) -> np.ndarray:
+    """
+    Matrice utenti × giorni della disponibilità in [start_date, end_date].
+
+    `rows` contiene (indice utente, inizio, fine, percentuale): come per
+    allocation_curve i delta vengono accumulati in un'unica matrice e sommati
+    lungo l'asse dei giorni, in un solo passaggio per tutti gli utenti.
+    """
+    n_days = (end_date - start_date).days + 1
+    if n_days <= 0:
+        raise ValueError("La data di fine deve essere successiva alla data di inizio")
+
+    deltas = np.zeros((n_users, n_days + 1))
+    if rows:
+        origin = start_date.toordinal()
+        count = len(rows)
+        users = np.fromiter((r[0] for r in rows), dtype=np.int64, count=count)
+        starts = np.fromiter((r[1].toordinal() for r in rows), dtype=np.int64, count=count) - origin
+        ends = np.fromiter((r[2].toordinal() for r in rows), dtype=np.int64, count=count) - origin + 1
+        percentages = np.fromiter((r[3] for r in rows), dtype=np.float64, count=count)
+        np.add.at(deltas, (users, np.clip(starts, 0, n_days)), percentages)
+        np.add.at(deltas, (users, np.clip(ends, 0, n_days)), -percentages)
+
+    allocation = np.round(np.cumsum(deltas[:, :-1], axis=1), PRECISION)
+    return np.round(np.maximum(0, 1 - allocation), PRECISION)
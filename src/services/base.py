@@ -1,22 +1,86 @@
-from typing import Generic, TypeVar, Type, List, Optional
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import Any, Dict, Generic, TypeVar, Type, List, Optional, Tuple
+from sqlalchemy import Integer, cast, column, delete, insert, inspect, select, update, values
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, Query, MANYTOONE, selectinload
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
 from src.models.models import Base
+from src.schemas.bulk import BulkUpdateItem
+from src.services.pagination import encode_cursor, decode_cursor, keyset_filter
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+def requires_orm_update(model: Type[Base], fields) -> bool:
+    """True se almeno un campo ha un hook @validates, che gira solo sul percorso ORM"""
+    return bool(set(fields) & set(inspect(model).validators))
+
+def _delete_relationships(model: Type[Base]) -> List[Any]:
+    """
+    Relazioni che il delete ORM deve gestire (cascade, azzeramento delle
+    foreign key, righe delle tabelle di collegamento)
+    """
+    return [
+        relationship for relationship in inspect(model).relationships
+        if not relationship.viewonly and relationship.direction is not MANYTOONE
+    ]
+
+def requires_orm_delete(model: Type[Base]) -> bool:
+    """True se il delete deve passare dall'ORM per gestire le relazioni"""
+    return bool(_delete_relationships(model))
+
+def orm_delete_options(model: Type[Base]) -> List[Any]:
+    """
+    selectinload delle relazioni gestite dal delete ORM, caricate insieme
+    all'oggetto: db.delete() non dipende dalle load lazy, che l'ORM esegue
+    comunque anche con RAISE_ON_LAZY_LOAD attivo
+    """
+    return [selectinload(relationship.class_attribute) for relationship in _delete_relationships(model)]
+
 class BaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # Chiave di ordinamento stabile (univoca) usata dalla paginazione a cursore
+    cursor_columns: Tuple[str, ...] = ("id",)
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
     def get(self, db: Session, id: int) -> Optional[ModelType]:
         return db.query(self.model).filter(self.model.id == id).first()
 
-    def list(self, db: Session, skip: int = 0, limit: int = 100) -> List[ModelType]:
-        return db.query(self.model).offset(skip).limit(limit).all()
+    def paginate(
+        self,
+        query: Query,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        """
+        Paginazione keyset: filtra le righe successive al cursore sulla chiave
+        `cursor_columns` invece di usare OFFSET, così il costo di una pagina non
+        cresce con la sua profondità.
+        Ritorna (items, next_cursor); next_cursor è None sull'ultima pagina.
+        """
+        columns = [getattr(self.model, name) for name in self.cursor_columns]
+        if cursor:
+            query = query.filter(keyset_filter(columns, decode_cursor(cursor, columns)))
+
+        # Una riga in più indica l'esistenza della pagina successiva
+        items = query.order_by(*columns).limit(limit + 1).all()
+        if len(items) <= limit:
+            return items, None
+
+        items = items[:limit]
+        last = items[-1]
+        return items, encode_cursor([getattr(last, name) for name in self.cursor_columns])
+
+    def list(
+        self,
+        db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[ModelType], Optional[str]]:
+        return self.paginate(db.query(self.model), cursor, limit)
 
     def create(self, db: Session, obj_in: CreateSchemaType) -> ModelType:
         obj_data = obj_in.model_dump()
@@ -26,12 +90,40 @@ class BaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db.refresh(db_obj)
         return db_obj
 
+    def _requires_orm_update(self, fields) -> bool:
+        return requires_orm_update(self.model, fields)
+
+    def _requires_orm_delete(self) -> bool:
+        return requires_orm_delete(self.model)
+
     def update(self, db: Session, id: int, obj_in: UpdateSchemaType) -> Optional[ModelType]:
+        """
+        Aggiorna con un solo UPDATE ... WHERE id = :id RETURNING, costruendo
+        l'oggetto dalla riga restituita. Usa il percorso ORM (SELECT + flush)
+        se i campi modificati hanno hook @validates.
+        """
+        update_data = obj_in.model_dump(exclude_unset=True)
+        if (
+            not update_data
+            or self._requires_orm_update(update_data)
+            or not db.get_bind().dialect.update_returning
+        ):
+            return self._orm_update(db, id, update_data)
+
+        statement = update(self.model)\
+            .where(self.model.id == id)\
+            .values(**update_data)\
+            .returning(self.model)\
+            .execution_options(synchronize_session=False, populate_existing=True)
+        db_obj = db.scalars(statement).first()
+        db.commit()
+        return db_obj
+
+    def _orm_update(self, db: Session, id: int, update_data: Dict[str, Any]) -> Optional[ModelType]:
         db_obj = self.get(db, id)
         if not db_obj:
             return None
         
-        update_data = obj_in.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_obj, field, value)
             
@@ -41,9 +133,244 @@ class BaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return db_obj
 
     def delete(self, db: Session, id: int) -> bool:
-        obj = self.get(db, id)
-        if not obj:
-            return False
-        db.delete(obj)
+        """
+        Elimina con un solo DELETE ... RETURNING id, oppure tramite l'ORM
+        se il modello ha relazioni da gestire.
+        """
+        if self._requires_orm_delete() or not db.get_bind().dialect.delete_returning:
+            obj = db.query(self.model)\
+                .filter(self.model.id == id)\
+                .options(*orm_delete_options(self.model))\
+                .first()
+            if not obj:
+                return False
+            db.delete(obj)
+            db.commit()
+            return True
+
+        deleted_id = db.scalar(
+            delete(self.model).where(self.model.id == id).returning(self.model.id)
+        )
         db.commit()
-        return True
\ No newline at end of file
+        return deleted_id is not None
+
+    # --- Operazioni bulk -------------------------------------------------
+    # Ogni operazione gira in un'unica transazione con SQL set-based e ritorna
+    # un esito per elemento: gli elementi non validi vengono scartati con il
+    # relativo errore, gli altri vengono scritti insieme. Se il database rifiuta
+    # la scrittura, la transazione viene annullata e tutti gli elementi validi
+    # risultano falliti con l'errore del database.
+
+    def _bulk_create_values(self, obj_in: CreateSchemaType) -> Dict[str, Any]:
+        """Valori da inserire per un elemento di bulk_create"""
+        return obj_in.model_dump()
+
+    def _bulk_create_errors(self, db: Session, rows: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Controlli aggiuntivi prima di bulk_create: {posizione in rows: errore}"""
+        return {}
+
+    def _bulk_update_errors(self, db: Session, rows: List[Dict[str, Any]]) -> Dict[int, str]:
+        """Hook per le validazioni che richiedono il database: {posizione in rows: errore}"""
+        return {}
+
+    def _bulk_delete_errors(self, db: Session, ids: List[int]) -> Dict[int, str]:
+        """
+        Controlli aggiuntivi prima di bulk_delete: {id: errore}.
+        Il DELETE bulk non gestisce le relazioni come il delete ORM: di default
+        vengono bloccati gli elementi con righe collegate (una query per relazione).
+        """
+        errors = {}
+        for relationship in _delete_relationships(self.model):
+            for _, remote in relationship.synchronize_pairs:
+                linked = db.scalars(select(remote).where(remote.in_(ids)).distinct())
+                for id in linked:
+                    errors.setdefault(id, f"Impossibile eliminare: esistono righe collegate in {remote.table.name}")
+        return errors
+
+    def _model_errors(self, data: Dict[str, Any]) -> Optional[str]:
+        """Esegue gli hook @validates del modello su un oggetto transiente"""
+        try:
+            self.model(**data)
+        except (ValueError, TypeError) as e:
+            return str(e)
+        return None
+
+    def _bulk_summary(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        succeeded = sum(1 for result in results if result["success"])
+        return {
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "results": results
+        }
+
+    def bulk_create(self, db: Session, items: List[CreateSchemaType]) -> Dict[str, Any]:
+        """Inserisce gli elementi con un INSERT multi-riga ... RETURNING"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        rows, indexes = [], []
+        for index, item in enumerate(items):
+            data = self._bulk_create_values(item)
+            error = self._model_errors(data)
+            if error:
+                results[index] = {"index": index, "success": False, "error": error}
+                continue
+            rows.append(data)
+            indexes.append(index)
+
+        for position, error in self._bulk_create_errors(db, rows).items():
+            index = indexes[position]
+            results[index] = {"index": index, "success": False, "error": error}
+        pending = [(index, row) for index, row in zip(indexes, rows) if results[index] is None]
+
+        if pending:
+            try:
+                created = db.scalars(
+                    insert(self.model).returning(self.model, sort_by_parameter_order=True),
+                    [row for _, row in pending]
+                ).all()
+                db.commit()
+            except SQLAlchemyError as e:
+                db.rollback()
+                for index, _ in pending:
+                    results[index] = {"index": index, "success": False, "error": str(getattr(e, "orig", e))}
+            else:
+                for (index, _), obj in zip(pending, created):
+                    results[index] = {"index": index, "id": obj.id, "success": True, "item": obj}
+        else:
+            db.rollback()  # nessun inserimento: rilascia i lock presi dai controlli
+
+        return self._bulk_summary(results)
+
+    def _bulk_update_group(
+        self,
+        db: Session,
+        fields: Tuple[str, ...],
+        rows: List[Dict[str, Any]]
+    ) -> List[ModelType]:
+        """Aggiorna un gruppo di righe che modificano gli stessi campi"""
+        ids = [row["id"] for row in rows]
+        if db.get_bind().dialect.name != "postgresql":
+            # Executemany per chiave primaria, poi una SELECT per i valori aggiornati
+            db.execute(update(self.model), rows)
+            return db.scalars(
+                select(self.model)
+                .where(self.model.id.in_(ids))
+                .execution_options(populate_existing=True)
+            ).all()
+
+        # UPDATE ... FROM (VALUES ...) ... RETURNING in un solo statement
+        table = self.model.__table__
+        data = values(
+            column("id", Integer),
+            *[column(field, table.c[field].type) for field in fields],
+            name="bulk_values"
+        ).data([tuple(row[name] for name in ("id",) + fields) for row in rows])
+        statement = update(self.model)\
+            .where(self.model.id == data.c.id)\
+            .values({field: cast(data.c[field], table.c[field].type) for field in fields})\
+            .returning(self.model)\
+            .execution_options(synchronize_session=False, populate_existing=True)
+        return db.scalars(statement).all()
+
+    def bulk_update(
+        self,
+        db: Session,
+        items: List[BulkUpdateItem[UpdateSchemaType]]
+    ) -> Dict[str, Any]:
+        """
+        Aggiorna gli elementi raggruppandoli per insieme di campi modificati:
+        un UPDATE ... FROM (VALUES ...) ... RETURNING per gruppo.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        existing = set(db.scalars(
+            select(self.model.id).where(self.model.id.in_({item.id for item in items}))
+        ))
+
+        groups: Dict[Tuple[str, ...], List[Tuple[int, Dict[str, Any]]]] = defaultdict(list)
+        pending: List[Tuple[int, Dict[str, Any]]] = []
+        seen = set()
+        for index, item in enumerate(items):
+            error = None
+            data = item.data.model_dump(exclude_unset=True)
+            if item.id not in existing:
+                error = f"Elemento {item.id} non trovato"
+            elif item.id in seen:
+                error = f"Elemento {item.id} duplicato nella richiesta"
+            elif not data:
+                error = "Nessun campo da aggiornare"
+            else:
+                error = self._model_errors(data)
+            if error:
+                results[index] = {"index": index, "id": item.id, "success": False, "error": error}
+                continue
+            seen.add(item.id)
+            pending.append((index, {"id": item.id, **data}))
+
+        blocked = self._bulk_update_errors(db, [row for _, row in pending])
+        for position, (index, row) in enumerate(pending):
+            if position in blocked:
+                results[index] = {"index": index, "id": row["id"], "success": False, "error": blocked[position]}
+            else:
+                groups[tuple(sorted(row.keys() - {"id"}))].append((index, row))
+
+        if groups:
+            try:
+                updated = {}
+                for fields, members in groups.items():
+                    for obj in self._bulk_update_group(db, fields, [row for _, row in members]):
+                        updated[obj.id] = obj
+                db.commit()
+            except SQLAlchemyError as e:
+                db.rollback()
+                for members in groups.values():
+                    for index, row in members:
+                        results[index] = {"index": index, "id": row["id"], "success": False, "error": str(getattr(e, "orig", e))}
+            else:
+                for members in groups.values():
+                    for index, row in members:
+                        results[index] = {"index": index, "id": row["id"], "success": True, "item": updated[row["id"]]}
+        else:
+            db.rollback()  # nessun aggiornamento: rilascia i lock presi dai controlli
+
+        return self._bulk_summary(results)
+
+    def bulk_delete(self, db: Session, ids: List[int]) -> Dict[str, Any]:
+        """
+        Elimina gli elementi con un unico DELETE ... WHERE id IN (...) RETURNING id.
+        Gli id ripetuti hanno un solo esito, alla posizione della prima occorrenza.
+        """
+        # id distinti -> posizione della prima occorrenza nella richiesta
+        positions: Dict[int, int] = {}
+        for index, id in enumerate(ids):
+            positions.setdefault(id, index)
+        ids = list(positions)
+
+        blocked = self._bulk_delete_errors(db, ids)
+        to_delete = [id for id in ids if id not in blocked]
+
+        deleted = set()
+        error = None
+        if to_delete:
+            statement = delete(self.model).where(self.model.id.in_(to_delete))
+            try:
+                if db.get_bind().dialect.delete_returning:
+                    deleted = set(db.scalars(statement.returning(self.model.id)))
+                else:
+                    deleted = set(db.scalars(select(self.model.id).where(self.model.id.in_(to_delete))))
+                    db.execute(statement)
+                db.commit()
+            except SQLAlchemyError as e:
+                db.rollback()
+                deleted = set()
+                error = str(getattr(e, "orig", e))
+
+        results = []
+        for id, index in positions.items():
+            if id in blocked:
+                results.append({"index": index, "id": id, "success": False, "error": blocked[id]})
+            elif error:
+                results.append({"index": index, "id": id, "success": False, "error": error})
+            elif id in deleted:
+                results.append({"index": index, "id": id, "success": True})
+            else:
+                results.append({"index": index, "id": id, "success": False, "error": f"Elemento {id} non trovato"})
+        return self._bulk_summary(results)
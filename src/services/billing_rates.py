@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction, object_session
+from src.models.models import BillingRate, User
+from src.services.line_item import CENTS
+
+# Ogni processo ha la propria cache: le scritture fatte da altri worker
+# vengono recepite al rebuild periodico
+RATE_CACHE_TTL_SECONDS = int(os.getenv("RATE_CACHE_TTL_SECONDS", "300"))
+
+# Giorno di fine delle tariffe senza end_date
+OPEN_END = date.max.toordinal()
+
+# (user_id, project_id): None indica una tariffa valida per tutti gli utenti
+# del progetto o per tutti i progetti dell'utente
+RateKey = Tuple[Optional[int], Optional[int]]
+
+class RateTable:
+    """
+    Tariffe di una chiave (utente, progetto) come intervalli disgiunti ordinati:
+    `starts`/`ends` sono gli ordinali del primo e dell'ultimo giorno inclusi e
+    `rates[i]` la tariffa tra starts[i] e ends[i].
+    Dove due BillingRate si sovrappongono vale quella iniziata più di recente.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int, Decimal]]):
+        # Estremi elementari: in ogni tratto tra due estremi consecutivi la
+        # tariffa attiva è costante
+        points = sorted({start for start, _, _ in intervals} | {end + 1 for _, end, _ in intervals if end < OPEN_END})
+        starts, ends, rates = [], [], []
+        for position, point in enumerate(points):
+            active = [
+                (start, rate) for start, end, rate in intervals
+                if start <= point <= end
+            ]
+            if not active:
+                continue
+            rate = max(active, key=lambda item: item[0])[1]
+            end = points[position + 1] - 1 if position + 1 < len(points) else OPEN_END
+            if rates and rates[-1] == rate and ends[-1] + 1 == point:
+                ends[-1] = end  # tratto contiguo con la stessa tariffa
+                continue
+            starts.append(point)
+            ends.append(end)
+            rates.append(rate)
+
+        self.starts = np.array(starts, dtype=np.int64)
+        self.ends = np.array(ends, dtype=np.int64)
+        self.rates = np.array(rates, dtype=object)
+
+    def lookup(self, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Per ogni giorno (ordinale): (trovato, tariffa). Ricerca binaria vettorizzata"""
+        if not len(self.starts):
+            return np.zeros(len(days), dtype=bool), np.full(len(days), None, dtype=object)
+        positions = np.searchsorted(self.starts, days, side="right") - 1
+        clipped = np.clip(positions, 0, None)
+        return (positions >= 0) & (days <= self.ends[clipped]), self.rates[clipped]
+
+class BillingRateResolver:
+    """
+    Tariffa oraria effettiva "utente U sul progetto P il giorno D".
+
+    Le BillingRate vengono caricate in memoria con una sola query, raggruppate
+    per (utente, progetto) in intervalli ordinati e cercate con una ricerca
+    binaria. Ordine di risoluzione:
+    1. tariffa dell'utente sul progetto
+    2. tariffa del progetto (user_id NULL)
+    3. tariffa dell'utente su tutti i progetti (project_id NULL)
+    4. User.hourly_rate
+
+    La cache viene invalidata al commit di ogni scrittura di BillingRate o
+    User fatta da questo processo (eventi SQLAlchemy) e ricostruita comunque
+    dopo il TTL.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._tables: Dict[RateKey, RateTable] = {}
+        self._hourly_rates: Dict[int, Decimal] = {}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built_at = None
+
+    def ensure_built(self, db: Session) -> Tuple[Dict[RateKey, RateTable], Dict[int, Decimal]]:
+        """Costruisce la cache se assente o scaduta e ne restituisce uno snapshot"""
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.ttl_seconds:
+                return self._tables, self._hourly_rates
+
+            intervals: Dict[RateKey, List[Tuple[int, int, Decimal]]] = defaultdict(list)
+            rows = db.execute(
+                select(
+                    BillingRate.user_id,
+                    BillingRate.project_id,
+                    BillingRate.start_date,
+                    BillingRate.end_date,
+                    BillingRate.rate
+                )
+            )
+            for user_id, project_id, start_date, end_date, rate in rows:
+                if user_id is None and project_id is None:
+                    continue
+                intervals[(user_id, project_id)].append((
+                    start_date.toordinal(),
+                    end_date.toordinal() if end_date else OPEN_END,
+                    Decimal(str(rate)).quantize(CENTS)
+                ))
+
+            self._tables = {key: RateTable(values) for key, values in intervals.items()}
+            self._hourly_rates = {
+                user_id: Decimal(str(hourly_rate)).quantize(CENTS)
+                for user_id, hourly_rate in db.execute(
+                    select(User.id, User.hourly_rate).where(User.hourly_rate.is_not(None))
+                )
+            }
+            self._built_at = time.monotonic()
+            return self._tables, self._hourly_rates
+
+    def rate(self, db: Session, user_id: int, project_id: int, day: date) -> Optional[Decimal]:
+        """Tariffa di un singolo giorno; None se nessuna regola si applica"""
+        return self.annotate(db, [user_id], [project_id], [day])[0]
+
+    def annotate(
+        self,
+        db: Session,
+        user_ids: Sequence[int],
+        project_ids: Sequence[int],
+        days: Sequence[date]
+    ) -> List[Optional[Decimal]]:
+        """
+        Tariffe di un blocco di time entry (liste allineate per posizione), in
+        un solo passaggio: le entry vengono raggruppate per chiave e ogni
+        gruppo risolto con una searchsorted sugli intervalli della chiave.
+        """
+        tables, hourly_rates = self.ensure_built(db)
+        count = len(days)
+        if not count:
+            return []
+
+        users = np.fromiter(user_ids, dtype=np.int64, count=count)
+        projects = np.fromiter(project_ids, dtype=np.int64, count=count)
+        ordinals = np.fromiter((day.toordinal() for day in days), dtype=np.int64, count=count)
+        result = np.full(count, None, dtype=object)
+        pending = np.ones(count, dtype=bool)
+
+        for use_user, use_project in ((True, True), (False, True), (True, False)):
+            indexes = np.flatnonzero(pending)
+            if not len(indexes):
+                break
+            keys = np.stack([
+                users[indexes] if use_user else np.full(len(indexes), -1),
+                projects[indexes] if use_project else np.full(len(indexes), -1)
+            ], axis=1)
+            unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.cumsum(np.bincount(inverse, minlength=len(unique_keys)))[:-1]
+            for (user_id, project_id), group in zip(unique_keys, np.split(indexes[order], bounds)):
+                table = tables.get((
+                    int(user_id) if use_user else None,
+                    int(project_id) if use_project else None
+                ))
+                if table is None:
+                    continue
+                found, rates = table.lookup(ordinals[group])
+                result[group[found]] = rates[found]
+                pending[group[found]] = False
+
+        for index in np.flatnonzero(pending):
+            result[index] = hourly_rates.get(int(users[index]))
+        return result.tolist()
+
+billing_rate_resolver = BillingRateResolver(RATE_CACHE_TTL_SECONDS)
+
+# --- Invalidazione ----------------------------------------------------------
+# Le scritture ORM (flush) passano dagli eventi del mapper, gli INSERT/UPDATE/
+# DELETE bulk eseguiti con la sessione da do_orm_execute. Entrambi segnano la
+# sessione; la cache viene invalidata solo dopo il commit, come capacity_index
+# recepisce le allocazioni: invalidando prima, un rebuild concorrente
+# rileggerebbe le tariffe non ancora committate e le terrebbe fino al TTL.
+# Un rollback toglie il segno senza toccare la cache.
+
+RATES_CHANGED = "billing_rates_changed"
+
+def _mark_session(session: Optional[Session]) -> None:
+    if session is not None:
+        session.info[RATES_CHANGED] = True
+
+def _mark_on_flush(mapper, connection, target) -> None:
+    _mark_session(object_session(target))
+
+def _mark_on_hourly_rate_change(mapper, connection, target: User) -> None:
+    if inspect(target).attrs.hourly_rate.history.has_changes():
+        _mark_session(object_session(target))
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(BillingRate, _event, _mark_on_flush)
+event.listen(User, "after_insert", _mark_on_hourly_rate_change)
+event.listen(User, "after_update", _mark_on_hourly_rate_change)
+event.listen(User, "after_delete", _mark_on_flush)
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_on_bulk_write(state: ORMExecuteState) -> None:
+    if (state.is_insert or state.is_update or state.is_delete) \
+            and state.bind_mapper is not None \
+            and state.bind_mapper.class_ in (BillingRate, User):
+        _mark_session(state.session)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop(RATES_CHANGED, False):
+        billing_rate_resolver.invalidate()
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_after_rollback(session: Session, transaction: SessionTransaction) -> None:
+    # Fine della transazione esterna: dopo un commit il segno è già stato
+    # consumato, dopo un rollback le scritture non esistono più
+    if transaction.parent is None:
+        session.info.pop(RATES_CHANGED, None)
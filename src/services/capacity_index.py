@@ -0,0 +1,218 @@
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.models.models import ResourceAllocation, ResourceAllocationStatus, ConsultantRole, User
+from src.services.availability import PRECISION
+
+# Ogni processo ha il proprio indice: le scritture fatte da altri worker
+# vengono recepite al rebuild periodico
+CAPACITY_INDEX_TTL_SECONDS = int(os.getenv("CAPACITY_INDEX_TTL_SECONDS", "300"))
+
+ACTIVE_STATUSES = (ResourceAllocationStatus.PLANNED, ResourceAllocationStatus.ACTIVE)
+
+class UserTimeline:
+    """
+    Allocazioni attive di un utente come funzione a gradini.
+
+    `points` sono gli estremi ordinati degli intervalli (ordinali dei giorni, fine
+    esclusa) e `levels[i]` è l'allocazione complessiva tra points[i] e points[i + 1].
+    Gli array vengono ricalcolati solo per l'utente modificato, in O(k log k).
+    """
+
+    def __init__(self):
+        self.intervals: Dict[int, Tuple[int, int, float]] = {}
+        self.points: List[int] = []
+        self.levels: List[float] = []
+        self.dirty = False
+
+    def set(self, allocation_id: int, start: int, end: int, percentage: float) -> None:
+        self.intervals[allocation_id] = (start, end, percentage)
+        self.dirty = True
+
+    def discard(self, allocation_id: int) -> None:
+        if self.intervals.pop(allocation_id, None) is not None:
+            self.dirty = True
+
+    def _rebuild(self) -> None:
+        deltas: Dict[int, float] = defaultdict(float)
+        for start, end, percentage in self.intervals.values():
+            deltas[start] += percentage
+            deltas[end] -= percentage
+        self.points = sorted(deltas)
+        self.levels = []
+        level = 0.0
+        for point in self.points:
+            level += deltas[point]
+            self.levels.append(round(level, PRECISION))
+        self.dirty = False
+
+    def peak(self, start: int, end: int) -> float:
+        """Allocazione massima nei giorni [start, end)"""
+        if self.dirty:
+            self._rebuild()
+        if not self.points:
+            return 0.0
+        first = bisect_right(self.points, start) - 1
+        last = bisect_left(self.points, end)
+        levels = self.levels[max(first, 0):last]
+        if first < 0:
+            levels.append(0.0)  # prima del primo estremo l'utente è libero
+        return max(levels, default=0.0)
+
+class CapacityIndex:
+    """
+    Indice in memoria delle allocazioni attive (PLANNED/ACTIVE) per la ricerca di
+    capacità: "chi ha almeno N% libero tra due date".
+
+    Costruito alla prima ricerca con tre query, poi aggiornato in modo incrementale
+    dalle scritture di ResourceAllocationService e UserService.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._built_at: Optional[float] = None
+        self._timelines: Dict[int, UserTimeline] = {}
+        self._allocation_users: Dict[int, int] = {}
+        # Ruoli delle allocazioni non cancellate, per utente: il ruolo di un utente
+        # è quello dell'allocazione con la data di inizio più recente
+        self._roles: Dict[int, Dict[int, Tuple[date, ConsultantRole]]] = defaultdict(dict)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built_at = None
+
+    def ensure_built(self, db: Session) -> None:
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.ttl_seconds:
+                return
+
+            self._timelines = {user_id: UserTimeline() for user_id in db.scalars(select(User.id))}
+            self._allocation_users = {}
+            self._roles = defaultdict(dict)
+
+            allocations = db.execute(
+                select(
+                    ResourceAllocation.id,
+                    ResourceAllocation.user_id,
+                    ResourceAllocation.start_date,
+                    ResourceAllocation.end_date,
+                    ResourceAllocation.allocation_percentage
+                ).where(ResourceAllocation.status.in_(ACTIVE_STATUSES))
+            )
+            for allocation_id, user_id, start_date, end_date, percentage in allocations:
+                self._set(allocation_id, user_id, start_date, end_date, percentage)
+
+            roles = db.execute(
+                select(
+                    ResourceAllocation.id,
+                    ResourceAllocation.user_id,
+                    ResourceAllocation.start_date,
+                    ResourceAllocation.role
+                ).where(
+                    ResourceAllocation.role.is_not(None),
+                    ResourceAllocation.status != ResourceAllocationStatus.CANCELLED
+                )
+            )
+            for allocation_id, user_id, start_date, role in roles:
+                self._roles[user_id][allocation_id] = (start_date, role)
+
+            self._built_at = time.monotonic()
+
+    def _set(self, allocation_id: int, user_id: int, start_date: date, end_date: date, percentage: float) -> None:
+        previous_user = self._allocation_users.get(allocation_id)
+        if previous_user is not None and previous_user != user_id and previous_user in self._timelines:
+            self._timelines[previous_user].discard(allocation_id)
+        self._allocation_users[allocation_id] = user_id
+        self._timelines.setdefault(user_id, UserTimeline()).set(
+            allocation_id,
+            start_date.toordinal(),
+            end_date.toordinal() + 1,
+            percentage
+        )
+
+    def _role(self, user_id: int) -> Optional[ConsultantRole]:
+        roles = self._roles.get(user_id)
+        if not roles:
+            return None
+        return max(roles.items(), key=lambda item: (item[1][0], item[0]))[1][1]
+
+    def _discard_role(self, allocation_id: int) -> None:
+        for roles in self._roles.values():
+            if roles.pop(allocation_id, None) is not None:
+                return
+
+    def _discard(self, allocation_id: int) -> None:
+        user_id = self._allocation_users.pop(allocation_id, None)
+        if user_id is not None and user_id in self._timelines:
+            self._timelines[user_id].discard(allocation_id)
+
+    def apply(self, allocation: ResourceAllocation) -> None:
+        """Recepisce una allocazione creata o modificata (dopo il commit)"""
+        with self._lock:
+            if self._built_at is None:
+                return
+            if allocation.status in ACTIVE_STATUSES:
+                self._set(
+                    allocation.id,
+                    allocation.user_id,
+                    allocation.start_date,
+                    allocation.end_date,
+                    allocation.allocation_percentage
+                )
+            else:
+                self._discard(allocation.id)
+            self._discard_role(allocation.id)
+            if allocation.role is not None and allocation.status != ResourceAllocationStatus.CANCELLED:
+                self._roles[allocation.user_id][allocation.id] = (allocation.start_date, allocation.role)
+
+    def discard(self, allocation_id: int) -> None:
+        """Recepisce una allocazione eliminata (dopo il commit)"""
+        with self._lock:
+            self._discard(allocation_id)
+            self._discard_role(allocation_id)
+
+    def add_user(self, user_id: int) -> None:
+        with self._lock:
+            if self._built_at is not None:
+                self._timelines.setdefault(user_id, UserTimeline())
+
+    def remove_user(self, user_id: int) -> None:
+        with self._lock:
+            self._timelines.pop(user_id, None)
+            self._roles.pop(user_id, None)
+
+    def search(
+        self,
+        db: Session,
+        start_date: date,
+        end_date: date,
+        min_available: float,
+        role: Optional[ConsultantRole] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Utenti con disponibilità minima >= min_available in ogni giorno di
+        [start_date, end_date]. Ritorna (user_id, disponibilità minima),
+        dal più disponibile al meno disponibile.
+        """
+        self.ensure_built(db)
+        start, end = start_date.toordinal(), end_date.toordinal() + 1
+        threshold = round(min_available, PRECISION)
+        results = []
+        with self._lock:
+            for user_id, timeline in self._timelines.items():
+                if role is not None and self._role(user_id) != role:
+                    continue
+                available = round(max(0.0, 1 - timeline.peak(start, end)), PRECISION)
+                if available >= threshold:
+                    results.append((user_id, available))
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results
+
+capacity_index = CapacityIndex(ttl_seconds=CAPACITY_INDEX_TTL_SECONDS)
@@ -1,7 +1,9 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from src.models.models import Client
+from sqlalchemy import select
+from src.models.models import Client, Project
 from src.schemas.client import ClientCreate, ClientUpdate
+from src.services.async_base import AsyncBaseService
 from src.services.base import BaseService
 
 class ClientService(BaseService[Client, ClientCreate, ClientUpdate]):
@@ -9,4 +11,19 @@ class ClientService(BaseService[Client, ClientCreate, ClientUpdate]):
         super().__init__(Client)
     
     def get_by_name(self, db: Session, name: str) -> Optional[Client]:
-        return db.query(self.model).filter(self.model.name == name).first()
\ No newline at end of file
+        return db.query(self.model).filter(self.model.name == name).first()
+
+    def _bulk_delete_errors(self, db: Session, ids: List[int]) -> Dict[int, str]:
+        linked = db.scalars(
+            select(Project.client_id).where(Project.client_id.in_(ids)).distinct()
+        )
+        return {
+            client_id: "Impossibile eliminare il cliente: esistono progetti associati"
+            for client_id in linked
+        }
+
+class AsyncClientService(AsyncBaseService[Client, ClientCreate, ClientUpdate]):
+    """Letture dei clienti su AsyncSession (GET /clients/ e /clients/{id})"""
+
+    def __init__(self):
+        super().__init__(Client)
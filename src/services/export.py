@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Iterator, List, Optional, Sequence
+from sqlalchemy import Row, select
+from src.database.database import SessionLocal
+from src.models.models import Project, TimeEntry, User
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet disponibile solo con pyarrow installato
+    pa = None
+    pq = None
+
+# Righe lette dal cursore lato server per ogni blocco (e row group Parquet)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+TIME_ENTRY_COLUMNS = (
+    TimeEntry.id,
+    TimeEntry.date,
+    TimeEntry.user_id,
+    User.email.label("user_email"),
+    TimeEntry.project_id,
+    Project.name.label("project_name"),
+    TimeEntry.hours,
+    TimeEntry.description,
+)
+
+def parquet_available() -> bool:
+    return pa is not None
+
+class _ChunkSink(io.RawIOBase):
+    """File in sola scrittura che accumula i byte scritti da ParquetWriter finché non vengono ritirati"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+class ExportService:
+    """
+    Export in streaming delle time entry.
+
+    Le righe vengono lette a blocchi con un cursore lato server
+    (stream_results + yield_per) come righe Core, senza oggetti ORM né identity
+    map, e codificate blocco per blocco: la memoria usata dipende dalla
+    dimensione del blocco e non dal numero di righe esportate.
+    Ogni export apre la propria sessione, che resta aperta per tutta la durata
+    della risposta e viene chiusa anche se il client si disconnette.
+    """
+
+    def time_entry_batches(
+        self,
+        project_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        batch_size: int = EXPORT_BATCH_SIZE
+    ) -> Iterator[Sequence[Row]]:
+        statement = select(*TIME_ENTRY_COLUMNS)\
+            .join(User, User.id == TimeEntry.user_id, isouter=True)\
+            .join(Project, Project.id == TimeEntry.project_id, isouter=True)\
+            .order_by(TimeEntry.date, TimeEntry.id)
+        if project_id:
+            statement = statement.where(TimeEntry.project_id == project_id)
+        if user_id:
+            statement = statement.where(TimeEntry.user_id == user_id)
+        if start_date:
+            statement = statement.where(TimeEntry.entry_day >= start_date)
+        if end_date:
+            statement = statement.where(TimeEntry.entry_day <= end_date)
+
+        with SessionLocal() as db:
+            result = db.execute(
+                statement,
+                execution_options={"stream_results": True, "yield_per": batch_size}
+            )
+            yield from result.partitions()
+
+    def encode(self, format: str, batches: Iterator[Sequence[Row]]) -> Iterator[bytes]:
+        """Codifica i blocchi di righe nel formato richiesto, un blocco alla volta"""
+        columns = [column.key for column in TIME_ENTRY_COLUMNS]
+        if format == "csv":
+            return self._encode_csv(columns, batches)
+        if format == "ndjson":
+            return self._encode_ndjson(columns, batches)
+        if format == "parquet":
+            return self._encode_parquet(columns, batches)
+        raise ValueError(f"Formato non valido: {format}")
+
+    def _encode_csv(self, columns: List[str], batches: Iterator[Sequence[Row]]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+    def _encode_ndjson(self, columns: List[str], batches: Iterator[Sequence[Row]]) -> Iterator[bytes]:
+        for batch in batches:
+            yield "".join(
+                json.dumps({column: _json_value(value) for column, value in zip(columns, row)}) + "\n"
+                for row in batch
+            ).encode()
+
+    def _encode_parquet(self, columns: List[str], batches: Iterator[Sequence[Row]]) -> Iterator[bytes]:
+        if pa is None:
+            raise RuntimeError("Export Parquet non disponibile: installare pyarrow")
+        schema = pa.schema([
+            ("id", pa.int64()),
+            ("date", pa.timestamp("us")),
+            ("user_id", pa.int64()),
+            ("user_email", pa.string()),
+            ("project_id", pa.int64()),
+            ("project_name", pa.string()),
+            ("hours", pa.float64()),
+            ("description", pa.string()),
+        ])
+        sink = _ChunkSink()
+        # Ogni blocco diventa un row group, inviato appena scritto
+        with pq.ParquetWriter(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array([row[index] for row in batch], type=field.type) for index, field in enumerate(schema)],
+                    schema=schema
+                ))
+                yield sink.take()
+        yield sink.take()
@@ -0,0 +1,302 @@
+import csv
+import enum
+import io
+import json
+import logging
+import os
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from src.models.models import Client, Project, ResourceAllocation, TimeEntry, User
+from src.schemas.client import ClientCreate
+from src.schemas.project import ProjectCreate
+from src.schemas.resource_allocation import ResourceAllocationCreate
+from src.schemas.time_entry import TimeEntryCreate
+from src.services.capacity_index import capacity_index
+from src.services.time_entry import TimeEntryService
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+# Righe scartate restituite nel riepilogo (l'elenco completo va nel file degli scarti)
+IMPORT_REJECT_SAMPLE = 100
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Per ogni tipo: schema di validazione, modello e chiavi naturali da risolvere
+# (colonna del file -> (mappa, campo dello schema))
+IMPORT_KINDS: Dict[str, Dict[str, Any]] = {
+    "clients": {"schema": ClientCreate, "model": Client, "keys": {}},
+    "projects": {"schema": ProjectCreate, "model": Project, "keys": {"client_name": ("clients", "client_id")}},
+    "time_entries": {
+        "schema": TimeEntryCreate,
+        "model": TimeEntry,
+        "keys": {"user_email": ("users", "user_id"), "project_name": ("projects", "project_id")}
+    },
+    "allocations": {
+        "schema": ResourceAllocationCreate,
+        "model": ResourceAllocation,
+        "keys": {"user_email": ("users", "user_id"), "project_name": ("projects", "project_id")}
+    },
+}
+
+ProgressCallback = Callable[[Dict[str, int]], None]
+
+def detect_format(filename: str) -> str:
+    """Formato dall'estensione del file: .csv oppure .ndjson/.jsonl"""
+    lower = filename.lower()
+    if lower.endswith(".csv"):
+        return "csv"
+    if lower.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    raise ValueError(f"Formato non riconosciuto per {filename}: usare .csv o .ndjson")
+
+def read_records(stream: TextIO, format: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Legge il file un record alla volta.
+    Ritorna (numero di riga, record, errore di parsing).
+    """
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # DictReader mette le colonne in più sotto None e completa con None
+            # quelle mancanti: la riga non corrisponde all'intestazione
+            extra = record.pop(None, [])
+            columns = sum(value is not None for value in record.values()) + len(extra)
+            if columns != len(reader.fieldnames):
+                yield reader.line_num, record, (
+                    f"CSV non valido: {columns} colonne invece di {len(reader.fieldnames)}"
+                )
+                continue
+            yield reader.line_num, record, None
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, {"raw": line.rstrip("\n")}, f"JSON non valido: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {"raw": line.rstrip("\n")}, "Il record deve essere un oggetto JSON"
+            continue
+        yield line_number, record, None
+
+class RejectWriter:
+    """Scrive le righe scartate nello stesso formato del file, con riga ed errore"""
+
+    def __init__(self, stream: Optional[TextIO], format: str):
+        self.stream = stream
+        self.format = format
+        self._writer: Optional[csv.DictWriter] = None
+
+    def write(self, line_number: int, record: Dict[str, Any], error: str) -> None:
+        if self.stream is None:
+            return
+        if self.format == "ndjson":
+            self.stream.write(json.dumps({"line": line_number, "error": error, "record": record}, default=str) + "\n")
+            return
+        if self._writer is None:
+            self._writer = csv.DictWriter(
+                self.stream,
+                fieldnames=["line", "error", *record.keys()],
+                extrasaction="ignore"
+            )
+            self._writer.writeheader()
+        self._writer.writerow({"line": line_number, "error": error, **record})
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'record'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+def _copy_value(value: Any) -> Any:
+    return value.name if isinstance(value, enum.Enum) else value
+
+class ImportService:
+    """
+    Import massivo di clienti, progetti, time entry e allocazioni da CSV/NDJSON.
+
+    Il file viene letto in streaming e validato a blocchi con gli schemi
+    Pydantic esistenti. Clienti, progetti e utenti sono risolti per chiave
+    naturale (nome, nome, email) con mappe in memoria caricate all'avvio.
+    Time entry e allocazioni vengono caricate con COPY su PostgreSQL
+    (executemany sugli altri database); ogni blocco viene committato.
+
+    I limiti di ore e di allocazione non vengono verificati: si importa lo
+    storico così com'è. Al termine il rollup delle ore e l'indice di capacità
+    vengono ricostruiti.
+    """
+
+    def _load_lookups(self, db: Session) -> Dict[str, Dict[str, int]]:
+        return {
+            "users": dict(db.execute(select(User.email, User.id)).all()),
+            "projects": dict(db.execute(select(Project.name, Project.id)).all()),
+            "clients": dict(db.execute(select(Client.name, Client.id)).all()),
+        }
+
+    def _resolve(
+        self,
+        kind: str,
+        record: Dict[str, Any],
+        lookups: Dict[str, Dict[str, int]]
+    ) -> Tuple[Optional[BaseModel], Optional[str]]:
+        """Sostituisce le chiavi naturali con gli id e valida il record"""
+        spec = IMPORT_KINDS[kind]
+        data = {key: value for key, value in record.items() if value not in ("", None)}
+        for column, (lookup, field) in spec["keys"].items():
+            if field in data:
+                continue
+            key = data.pop(column, None)
+            if key is None:
+                return None, f"{column}: campo obbligatorio"
+            if key not in lookups[lookup]:
+                return None, f"{column}: '{key}' non trovato"
+            data[field] = lookups[lookup][key]
+
+        try:
+            item = spec["schema"].model_validate(data)
+        except ValidationError as e:
+            return None, _validation_message(e)
+
+        # Clienti e progetti sono a loro volta chiavi naturali: niente duplicati
+        if kind in ("clients", "projects") and item.name in lookups[kind]:
+            return None, f"name: '{item.name}' già presente"
+        return item, None
+
+    def _copy(self, db: Session, model, rows: List[Dict[str, Any]]) -> None:
+        """COPY ... FROM STDIN su PostgreSQL, executemany altrimenti"""
+        connection = db.connection()
+        if connection.dialect.name != "postgresql":
+            db.execute(insert(model), rows)
+            return
+
+        columns = list(rows[0].keys())
+        statement = f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN"
+        with connection.connection.dbapi_connection.cursor() as cursor:
+            if hasattr(cursor, "copy_expert"):
+                # psycopg2: i dati passano come CSV (campo vuoto non quotato = NULL)
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow([_copy_value(row[column]) for column in columns])
+                buffer.seek(0)
+                cursor.copy_expert(f"{statement} WITH (FORMAT csv)", buffer)
+            else:
+                # psycopg 3
+                with cursor.copy(statement) as copy:
+                    for row in rows:
+                        copy.write_row([_copy_value(row[column]) for column in columns])
+
+    def _load_chunk(
+        self,
+        db: Session,
+        kind: str,
+        items: List[BaseModel],
+        lookups: Dict[str, Dict[str, int]]
+    ) -> None:
+        model = IMPORT_KINDS[kind]["model"]
+        rows = [item.model_dump() for item in items]
+        if kind in ("clients", "projects"):
+            # Pochi record: INSERT ... RETURNING per aggiornare la mappa dei nomi
+            created = db.execute(insert(model).returning(model.name, model.id), rows)
+            lookups[kind].update(dict(created.all()))
+        else:
+            self._copy(db, model, rows)
+        db.commit()
+
+    def import_stream(
+        self,
+        db: Session,
+        kind: str,
+        stream: TextIO,
+        format: str,
+        reject_stream: Optional[TextIO] = None,
+        progress: Optional[ProgressCallback] = None,
+        chunk_size: int = IMPORT_CHUNK_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Importa i record di `stream` ("clients", "projects", "time_entries" o
+        "allocations"). Le righe non valide vengono scritte in `reject_stream`
+        e non fermano l'import. Ritorna il riepilogo con un campione degli scarti.
+        """
+        if kind not in IMPORT_KINDS:
+            raise ValueError(f"Tipo di import non valido: {kind}")
+        if format not in IMPORT_FORMATS:
+            raise ValueError(f"Formato non valido: {format}")
+
+        lookups = self._load_lookups(db)
+        rejects = RejectWriter(reject_stream, format)
+        summary = {"kind": kind, "processed": 0, "imported": 0, "rejected": 0, "rejects": []}
+        affected_users = set()
+        first_day = last_day = None
+
+        def reject(line_number: int, record: Dict[str, Any], error: str) -> None:
+            summary["rejected"] += 1
+            rejects.write(line_number, record, error)
+            if len(summary["rejects"]) < IMPORT_REJECT_SAMPLE:
+                summary["rejects"].append({"line": line_number, "error": error})
+
+        def flush(chunk: List[Tuple[int, Dict[str, Any], BaseModel]]) -> None:
+            try:
+                self._load_chunk(db, kind, [item for _, _, item in chunk], lookups)
+            except Exception as e:
+                # Il blocco viene scartato per intero con l'errore del database
+                db.rollback()
+                logger.warning("Import %s: blocco scartato: %s", kind, e)
+                error = str(getattr(e, "orig", e)).strip()
+                for line_number, record, _ in chunk:
+                    reject(line_number, record, error)
+                return
+            summary["imported"] += len(chunk)
+
+        chunk: List[Tuple[int, Dict[str, Any], BaseModel]] = []
+        chunk_names = set()
+        for line_number, record, error in read_records(stream, format):
+            summary["processed"] += 1
+            item = None
+            if error is None:
+                item, error = self._resolve(kind, record, lookups)
+            if error is None and kind in ("clients", "projects"):
+                if item.name in chunk_names:
+                    error = f"name: '{item.name}' duplicato nel file"
+                chunk_names.add(item.name)
+            if error is not None:
+                reject(line_number, record, error)
+            else:
+                chunk.append((line_number, record, item))
+                if kind == "time_entries":
+                    affected_users.add(item.user_id)
+                    day = item.date.date()
+                    first_day = day if first_day is None else min(first_day, day)
+                    last_day = day if last_day is None else max(last_day, day)
+
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk, chunk_names = [], set()
+                if progress:
+                    progress(summary)
+        if chunk:
+            flush(chunk)
+        if progress:
+            progress(summary)
+
+        if kind == "time_entries" and affected_users:
+            TimeEntryService().rebuild_daily_hours(
+                db,
+                user_ids=sorted(affected_users),
+                start_day=first_day,
+                end_day=last_day + timedelta(days=1)
+            )
+        elif kind == "allocations":
+            capacity_index.invalidate()
+
+        logger.info(
+            "Import %s: %d righe lette, %d importate, %d scartate",
+            kind, summary["processed"], summary["imported"], summary["rejected"]
+        )
+        return summary
@@ -1,15 +1,48 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import date
 from decimal import Decimal
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import case, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException
-from src.models.models import Invoice, InvoiceLineItem
+from src.models.models import Invoice, InvoiceBatchItem, InvoiceLineItem, LineItemTimeEntry
 from src.schemas.invoice import InvoiceCreate, InvoiceUpdate
 from src.services.base import BaseService
+from src.services.invoice_numbering import InvoiceNumberingService
+from src.services.line_item import LineItemService, line_item_totals, line_item_values
+
+# Profili di caricamento per endpoint: le relazioni serializzate nella risposta
+# vengono caricate in anticipo con una query per collezione, mai in modo lazy
+WITH_LINE_ITEMS = (selectinload(Invoice.line_items),)
+# Risposte senza line items (InvoiceResponseNoItems): solo le colonne serializzate
+WITHOUT_LINE_ITEMS = (
+    load_only(
+        Invoice.id,
+        Invoice.project_id,
+        Invoice.invoice_number,
+        Invoice.invoice_date,
+        Invoice.due_date,
+        Invoice.amount,
+        Invoice.line_count,
+        Invoice.hours,
+        Invoice.notes,
+        Invoice.paid,
+        Invoice.paid_date
+    ),
+)
 
 class InvoiceService(BaseService[Invoice, InvoiceCreate, InvoiceUpdate]):
     def __init__(self):
         super().__init__(Invoice)
+
+    def get(self, db: Session, id: int) -> Optional[Invoice]:
+        """Fattura con i line items, caricati con una sola SELECT aggiuntiva"""
+        return db.query(self.model)\
+            .filter(self.model.id == id)\
+            .options(*WITH_LINE_ITEMS)\
+            .populate_existing()\
+            .first()
     
     def get_project_invoices(
         self, 
@@ -18,70 +51,190 @@ class InvoiceService(BaseService[Invoice, InvoiceCreate, InvoiceUpdate]):
         include_line_items: bool = False
     ) -> List[Invoice]:
         query = db.query(self.model)\
-            .filter(self.model.project_id == project_id)
-            
-        if include_line_items:
-            query = query.options(joinedload(self.model.line_items))
-            
+            .filter(self.model.project_id == project_id)\
+            .options(*(WITH_LINE_ITEMS if include_line_items else WITHOUT_LINE_ITEMS))
         return query.all()
     
-    def get_unpaid_invoices(self, db: Session) -> List[Invoice]:
-        return db.query(self.model)\
+    def get_unpaid_invoices(
+        self,
+        db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[Invoice], Optional[str]]:
+        query = db.query(self.model)\
             .filter(self.model.paid == False)\
             .filter(self.model.due_date <= date.today())\
-            .all()
+            .options(*WITHOUT_LINE_ITEMS)
+        return self.paginate(query, cursor, limit)
 
-    def get_by_project(self, db: Session, project_id: int) -> List[Invoice]:
-        query = db.query(Invoice).filter(Invoice.project_id == project_id)
-        return query.all()
+    def get_by_project(
+        self,
+        db: Session,
+        project_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        include_line_items: bool = True
+    ) -> Tuple[List[Invoice], Optional[str]]:
+        query = db.query(Invoice)\
+            .filter(Invoice.project_id == project_id)\
+            .options(*(WITH_LINE_ITEMS if include_line_items else WITHOUT_LINE_ITEMS))
+        return self.paginate(query, cursor, limit)
+
+    def update(self, db: Session, id: int, invoice_in: InvoiceUpdate) -> Optional[Invoice]:
+        """Aggiorna la fattura e la restituisce con i line items (InvoiceResponse)"""
+        if super().update(db, id, invoice_in) is None:
+            return None
+        return self.get(db, id)
     
-    def create(self, db: Session, invoice_in: InvoiceCreate) -> Invoice:
-        """Crea una nuova fattura con i suoi line items"""
-        
-        # Verifica unicità numero fattura
-        existing = db.query(Invoice).filter(
-            Invoice.invoice_number == invoice_in.invoice_number
+    def delete(self, db: Session, id: int) -> bool:
+        """
+        Elimina la fattura con i suoi line items e i collegamenti alle time
+        entry, che tornano da fatturare. Statement set-based nella stessa
+        transazione; gli item dei job di fatturazione perdono il riferimento.
+        Una fattura numerata può essere eliminata solo se è l'ultima del suo
+        anno (400 altrimenti): il numero torna al contatore.
+        """
+        invoice = db.execute(
+            select(Invoice.invoice_number, Invoice.invoice_date).where(Invoice.id == id)
         ).first()
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Numero fattura '{invoice_in.invoice_number}' già utilizzato"
-            )
-        
-        # Calcola il totale dai line items
-        total = sum(item.quantity * item.rate for item in invoice_in.line_items)
-        
-        # Crea la fattura con il totale calcolato
-        db_invoice = Invoice(
+        if not invoice:
+            return False
+        InvoiceNumberingService().release(db, invoice.invoice_number, invoice.invoice_date)
+
+        line_items = select(InvoiceLineItem.id).where(InvoiceLineItem.invoice_id == id)
+        db.execute(
+            delete(LineItemTimeEntry)
+            .where(LineItemTimeEntry.line_item_id.in_(line_items))
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            delete(InvoiceLineItem)
+            .where(InvoiceLineItem.invoice_id == id)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            update(InvoiceBatchItem)
+            .where(InvoiceBatchItem.invoice_id == id)
+            .values(invoice_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = db.execute(delete(Invoice).where(Invoice.id == id)).rowcount
+        db.commit()
+        return deleted > 0
+
+    def add_invoice(self, db: Session, **values: Any) -> Invoice:
+        """
+        Inserisce la fattura con un flush, senza commit: l'ID è subito disponibile.
+        L'unicità del numero fattura è garantita dal vincolo del database:
+        un numero già usato annulla la transazione con un errore 400.
+        """
+        db_invoice = Invoice(**values)
+        db.add(db_invoice)
+        try:
+            db.flush()
+        except IntegrityError as e:
+            db.rollback()
+            if "invoice_number" in str(e.orig):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Numero fattura '{values['invoice_number']}' già utilizzato"
+                )
+            raise
+        return db_invoice
+
+    def create(self, db: Session, invoice_in: InvoiceCreate) -> Invoice:
+        """
+        Crea una nuova fattura con i suoi line items.
+        Costo costante indipendente dal numero di righe: INSERT della fattura,
+        un INSERT multi-riga ... RETURNING per i line items e il commit.
+        Senza invoice_number viene assegnato il prossimo numero dell'anno.
+        L'unicità del numero fattura è garantita dal vincolo del database.
+        """
+        # Totali calcolati dai line items prima dell'inserimento
+        rows = [line_item_values(item) for item in invoice_in.line_items]
+        amount, line_count, hours = line_item_totals(rows)
+
+        db_invoice = self.add_invoice(
+            db,
             project_id=invoice_in.project_id,
-            invoice_number=invoice_in.invoice_number,
+            invoice_number=InvoiceNumberingService().assign(db, invoice_in.invoice_date, invoice_in.invoice_number),
             invoice_date=invoice_in.invoice_date,
             due_date=invoice_in.due_date,
-            amount=total,  # Usa il totale calcolato
+            amount=amount,
+            line_count=line_count,
+            hours=hours,
             notes=invoice_in.notes
         )
-        db.add(db_invoice)
-        db.flush()  # Ottieni l'ID della fattura
-        
-        # Crea i line items
-        total_amount = Decimal('0')
-        for item in invoice_in.line_items:
-            quantity = Decimal(str(item.quantity))
-            rate = Decimal(str(item.rate))
-            amount = quantity * rate
-            
-            line_item = InvoiceLineItem(
-                invoice_id=db_invoice.id,
-                description=item.description,
-                quantity=quantity,
-                rate=rate,
-                amount=amount
-            )
-            total_amount += amount
-            db.add(line_item)
-        
-        # Aggiorna l'importo totale della fattura
-        db_invoice.amount = total_amount
+
+        line_items = LineItemService().insert_many(db, db_invoice.id, rows)
+        # I line items appena inseriti diventano la collezione caricata della
+        # fattura, senza rileggerli dal database
+        set_committed_value(db_invoice, "line_items", line_items)
         db.commit()
-        db.refresh(db_invoice)
-        return db_invoice
\ No newline at end of file
+        return db_invoice
+
+    def reconcile_totals(self, db: Session, fix: bool = False) -> List[Dict[str, Any]]:
+        """
+        Confronta i totali salvati sulle fatture con quelli ricalcolati dai
+        line items, con un'unica query aggregata (GROUP BY invoice_id).
+        Le fatture senza line items mantengono l'importo inserito a mano:
+        per loro si verificano solo numero di righe e ore.
+        Con fix=True corregge le differenze e committa.
+        Ritorna le fatture non allineate con valori salvati e attesi.
+        """
+        totals = select(
+            InvoiceLineItem.invoice_id,
+            func.sum(InvoiceLineItem.amount).label("amount"),
+            func.count().label("line_count"),
+            func.sum(InvoiceLineItem.quantity).label("hours")
+        ).where(InvoiceLineItem.invoice_id.is_not(None))\
+            .group_by(InvoiceLineItem.invoice_id)\
+            .subquery()
+        expected_count = func.coalesce(totals.c.line_count, 0)
+        expected_hours = func.coalesce(totals.c.hours, 0)
+        expected_amount = case((expected_count > 0, func.coalesce(totals.c.amount, 0)), else_=Invoice.amount)
+
+        rows = db.execute(
+            select(
+                Invoice.id,
+                Invoice.amount,
+                Invoice.line_count,
+                Invoice.hours,
+                expected_amount.label("expected_amount"),
+                expected_count.label("expected_line_count"),
+                expected_hours.label("expected_hours")
+            )
+            .outerjoin(totals, totals.c.invoice_id == Invoice.id)
+            .where(or_(
+                Invoice.amount != expected_amount,
+                Invoice.line_count != expected_count,
+                Invoice.hours != expected_hours
+            ))
+            .order_by(Invoice.id)
+        ).all()
+
+        mismatches = [
+            {
+                "invoice_id": row.id,
+                "amount": row.amount,
+                "line_count": row.line_count,
+                "hours": row.hours,
+                "expected_amount": Decimal(str(row.expected_amount)),
+                "expected_line_count": row.expected_line_count,
+                "expected_hours": Decimal(str(row.expected_hours))
+            }
+            for row in rows
+        ]
+        if fix and mismatches:
+            # UPDATE executemany per chiave primaria
+            db.execute(update(Invoice), [
+                {
+                    "id": item["invoice_id"],
+                    "amount": item["expected_amount"],
+                    "line_count": item["expected_line_count"],
+                    "hours": item["expected_hours"]
+                }
+                for item in mismatches
+            ])
+            db.commit()
+        return mismatches
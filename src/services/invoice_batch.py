@@ -0,0 +1,334 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from itertools import repeat
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+from src.database.database import RAISE_ON_LAZY_LOAD, SessionLocal, enable_raise_on_lazy_load
+from src.models.models import (
+    BillingType,
+    Invoice,
+    InvoiceBatchItem,
+    InvoiceBatchItemStatus,
+    InvoiceBatchJob,
+    InvoiceBatchStatus,
+    Project,
+    ProjectStatus
+)
+from src.schemas.invoice import InvoiceGenerate
+from src.services.invoice_numbering import InvoiceNumberingService
+from src.services.invoicing import InvoicingService, NothingToInvoice
+
+logger = logging.getLogger(__name__)
+
+INVOICE_BATCH_WORKERS = int(os.getenv("INVOICE_BATCH_WORKERS", str(os.cpu_count() or 1)))
+INVOICE_BATCH_MAX_ATTEMPTS = int(os.getenv("INVOICE_BATCH_MAX_ATTEMPTS", "3"))
+
+# SQLSTATE dei conflitti risolti ripetendo la transazione:
+# serialization_failure e deadlock_detected
+RETRYABLE_SQLSTATES = ("40001", "40P01")
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+def batch_invoice_number(job_id: int, project_id: int) -> str:
+    """
+    Numero provvisorio e deterministico: rieseguire un progetto non può
+    produrre due fatture. Viene sostituito dal numero definitivo a fine job.
+    """
+    return f"B{job_id}-{project_id}"
+
+def _is_retryable(error: DBAPIError) -> bool:
+    sqlstate = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+    return sqlstate in RETRYABLE_SQLSTATES
+
+def _set_item(db: Session, job_id: int, project_id: int, **values) -> None:
+    db.execute(
+        update(InvoiceBatchItem)
+        .where(InvoiceBatchItem.job_id == job_id, InvoiceBatchItem.project_id == project_id)
+        .values(updated_at=datetime.utcnow(), **values)
+    )
+
+def invoice_project(
+    session_factory: sessionmaker,
+    job: Dict[str, Any],
+    project_id: int,
+    max_attempts: int = INVOICE_BATCH_MAX_ATTEMPTS
+) -> Dict[str, Any]:
+    """
+    Fattura un progetto del job in una propria transazione, che aggiorna anche
+    lo stato dell'item: dopo un crash l'item risulta fatturato solo se la
+    fattura è stata committata.
+    I conflitti di serializzazione e i deadlock vengono ripetuti fino a
+    max_attempts volte. Ritorna l'esito del progetto.
+    """
+    invoicing = InvoicingService()
+    job_id = job["id"]
+    result = {"project_id": project_id, "status": None, "invoice_id": None, "error": None}
+
+    for attempt in range(1, max_attempts + 1):
+        with session_factory() as db:
+            try:
+                # Il lock sull'item serializza due esecuzioni dello stesso job
+                item = db.execute(
+                    select(InvoiceBatchItem.status, InvoiceBatchItem.invoice_id, InvoiceBatchItem.attempts)
+                    .where(InvoiceBatchItem.job_id == job_id, InvoiceBatchItem.project_id == project_id)
+                    .with_for_update()
+                ).one()
+                if item.status in (InvoiceBatchItemStatus.INVOICED, InvoiceBatchItemStatus.SKIPPED):
+                    db.rollback()
+                    return {**result, "status": item.status.value, "invoice_id": item.invoice_id}
+                attempts = item.attempts + 1
+
+                invoice = invoicing.build_invoice(db, InvoiceGenerate(
+                    project_id=project_id,
+                    period_start=job["period_start"],
+                    period_end=job["period_end"],
+                    invoice_number=batch_invoice_number(job_id, project_id),
+                    invoice_date=job["invoice_date"],
+                    due_date=job["due_date"]
+                ))
+                _set_item(
+                    db, job_id, project_id,
+                    status=InvoiceBatchItemStatus.INVOICED,
+                    invoice_id=invoice.id,
+                    attempts=attempts,
+                    error=None
+                )
+                db.commit()
+                return {**result, "status": InvoiceBatchItemStatus.INVOICED.value, "invoice_id": invoice.id}
+            except NothingToInvoice:
+                db.rollback()
+                status, error = InvoiceBatchItemStatus.SKIPPED, None
+            except HTTPException as e:
+                db.rollback()
+                status, error = InvoiceBatchItemStatus.FAILED, str(e.detail)
+            except DBAPIError as e:
+                db.rollback()
+                if _is_retryable(e) and attempt < max_attempts:
+                    logger.info("Batch %s, progetto %s: conflitto, nuovo tentativo (%d)", job_id, project_id, attempt)
+                    time.sleep(0.05 * 2 ** attempt)
+                    continue
+                status, error = InvoiceBatchItemStatus.FAILED, str(e.orig).strip()
+            except Exception as e:
+                db.rollback()
+                logger.exception("Batch %s, progetto %s: errore", job_id, project_id)
+                status, error = InvoiceBatchItemStatus.FAILED, str(e)
+
+            _set_item(
+                db, job_id, project_id,
+                status=status,
+                attempts=InvoiceBatchItem.attempts + 1,
+                error=error
+            )
+            db.commit()
+            return {**result, "status": status.value, "error": error}
+    return result
+
+# --- Worker del pool --------------------------------------------------------
+# Ogni processo apre un proprio engine: le connessioni non si condividono tra
+# processi, e con pool_size=1 ogni worker tiene al più una connessione.
+
+_worker_sessions: Optional[sessionmaker] = None
+
+def _init_worker(url: URL) -> None:
+    global _worker_sessions
+    _worker_sessions = sessionmaker(
+        bind=create_engine(url, pool_size=1, max_overflow=0),
+        autoflush=False,
+        expire_on_commit=False
+    )
+    if RAISE_ON_LAZY_LOAD:
+        enable_raise_on_lazy_load(_worker_sessions)
+
+def _invoice_project_in_worker(job: Dict[str, Any], project_id: int, max_attempts: int) -> Dict[str, Any]:
+    return invoice_project(_worker_sessions, job, project_id, max_attempts)
+
+class InvoiceBatchService:
+    """
+    Fatturazione di fine mese di tutti i progetti a consuntivo attivi.
+
+    Il job e lo stato di ogni progetto sono salvati in invoice_batch_jobs e
+    invoice_batch_items. I progetti vengono distribuiti su un pool di processi;
+    ogni progetto è fatturato in una transazione indipendente che aggiorna
+    anche il proprio item, quindi un job interrotto può essere ripreso: vengono
+    rieseguiti solo i progetti PENDING o FAILED.
+
+    I worker non toccano il contatore dei numeri fattura: le fatture nascono
+    con un numero provvisorio e a fine job ricevono un blocco di numeri
+    consecutivi, assegnato con un solo statement in un'unica transazione.
+    """
+
+    def assign_numbers(self, db: Session, job_id: int) -> int:
+        """
+        Sostituisce i numeri provvisori delle fatture del job con numeri
+        definitivi consecutivi (in ordine di progetto) e committa.
+        Ritorna il numero di fatture numerate.
+        """
+        # Il lock sul job serializza due esecuzioni concorrenti: la seconda
+        # legge le fatture già numerate e non consuma un altro blocco
+        db.execute(select(InvoiceBatchJob.id).where(InvoiceBatchJob.id == job_id).with_for_update())
+        rows = db.execute(
+            select(InvoiceBatchItem.project_id, Invoice.id, Invoice.invoice_number, Invoice.invoice_date)
+            .join(Invoice, Invoice.id == InvoiceBatchItem.invoice_id)
+            .where(
+                InvoiceBatchItem.job_id == job_id,
+                InvoiceBatchItem.status == InvoiceBatchItemStatus.INVOICED
+            )
+            .order_by(Invoice.invoice_date, InvoiceBatchItem.project_id)
+        ).all()
+        interim = [row for row in rows if row.invoice_number == batch_invoice_number(job_id, row.project_id)]
+        if not interim:
+            return 0
+
+        numbering = InvoiceNumberingService()
+        values = []
+        for year in sorted({row.invoice_date.year for row in interim}):
+            invoices = [row.id for row in interim if row.invoice_date.year == year]
+            numbers = numbering.allocate_block(db, year, len(invoices))
+            values += [{"id": invoice_id, "invoice_number": number} for invoice_id, number in zip(invoices, numbers)]
+        db.execute(update(Invoice), values)
+        db.commit()
+        return len(values)
+
+    def create_job(
+        self,
+        db: Session,
+        period_start: date,
+        period_end: date,
+        invoice_date: date,
+        due_date: date
+    ) -> InvoiceBatchJob:
+        """Crea il job con un item per ogni progetto TIME_AND_MATERIALS attivo"""
+        job = InvoiceBatchJob(
+            period_start=period_start,
+            period_end=period_end,
+            invoice_date=invoice_date,
+            due_date=due_date
+        )
+        db.add(job)
+        db.flush()
+        project_ids = db.scalars(
+            select(Project.id)
+            .where(
+                Project.billing_type == BillingType.TIME_AND_MATERIALS,
+                Project.status == ProjectStatus.ACTIVE
+            )
+            .order_by(Project.id)
+        ).all()
+        if project_ids:
+            db.execute(
+                insert(InvoiceBatchItem),
+                [{"job_id": job.id, "project_id": project_id} for project_id in project_ids]
+            )
+        db.commit()
+        return self.get_job(db, job.id)
+
+    def get_job(self, db: Session, job_id: int) -> Optional[InvoiceBatchJob]:
+        return db.scalars(
+            select(InvoiceBatchJob)
+            .options(selectinload(InvoiceBatchJob.items))
+            .where(InvoiceBatchJob.id == job_id)
+            .execution_options(populate_existing=True)
+        ).first()
+
+    def run_job(
+        self,
+        job_id: int,
+        workers: int = INVOICE_BATCH_WORKERS,
+        max_attempts: int = INVOICE_BATCH_MAX_ATTEMPTS,
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Esegue (o riprende) il job e ritorna il riepilogo con l'esito di ogni
+        progetto elaborato. Con workers <= 1 i progetti vengono fatturati nel
+        processo corrente.
+        """
+        with SessionLocal() as db:
+            job = db.get(InvoiceBatchJob, job_id)
+            if job is None:
+                raise ValueError(f"Job di fatturazione {job_id} non trovato")
+            spec = {
+                "id": job.id,
+                "period_start": job.period_start,
+                "period_end": job.period_end,
+                "invoice_date": job.invoice_date,
+                "due_date": job.due_date
+            }
+            project_ids = db.scalars(
+                select(InvoiceBatchItem.project_id)
+                .where(
+                    InvoiceBatchItem.job_id == job_id,
+                    InvoiceBatchItem.status.in_((InvoiceBatchItemStatus.PENDING, InvoiceBatchItemStatus.FAILED))
+                )
+                .order_by(InvoiceBatchItem.project_id)
+            ).all()
+            job.status = InvoiceBatchStatus.RUNNING
+            job.finished_at = None
+            db.commit()
+            url = db.get_bind().url
+
+            results: List[Dict[str, Any]] = []
+            workers = min(workers, len(project_ids))
+            if workers <= 1:
+                outcomes = (invoice_project(SessionLocal, spec, project_id, max_attempts) for project_id in project_ids)
+                executor = None
+            else:
+                executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(url,)
+                )
+                outcomes = executor.map(
+                    _invoice_project_in_worker,
+                    repeat(spec),
+                    project_ids,
+                    repeat(max_attempts),
+                    chunksize=max(1, len(project_ids) // (workers * 4))
+                )
+            try:
+                for outcome in outcomes:
+                    results.append(outcome)
+                    if progress:
+                        progress(outcome)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+
+            try:
+                numbered = self.assign_numbers(db, job_id)
+            except IntegrityError as e:
+                # Un numero del blocco è già stato usato a mano: le fatture
+                # restano provvisorie e il job può essere ripreso
+                db.rollback()
+                logger.error("Batch %s: numerazione fallita: %s", job_id, e.orig)
+                numbered = None
+
+            counts = dict(db.execute(
+                select(InvoiceBatchItem.status, func.count())
+                .where(InvoiceBatchItem.job_id == job_id)
+                .group_by(InvoiceBatchItem.status)
+            ).all())
+            failed = counts.get(InvoiceBatchItemStatus.FAILED, 0)
+            job.status = InvoiceBatchStatus.FAILED if failed or numbered is None else InvoiceBatchStatus.COMPLETED
+            job.finished_at = datetime.utcnow()
+            db.commit()
+
+        logger.info("Batch %s: %s, %d progetti elaborati, %d falliti", job_id, job.status.value, len(results), failed)
+        return {
+            "job_id": job_id,
+            "status": job.status.value,
+            "invoiced": counts.get(InvoiceBatchItemStatus.INVOICED, 0),
+            "skipped": counts.get(InvoiceBatchItemStatus.SKIPPED, 0),
+            "failed": failed,
+            "pending": counts.get(InvoiceBatchItemStatus.PENDING, 0),
+            "numbered": numbered or 0,
+            "results": results
+        }
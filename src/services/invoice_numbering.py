@@ -0,0 +1,120 @@
+import os
+import re
+import string
+from datetime import date
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from src.database.database import dialect_insert
+from src.models.models import InvoiceNumberCounter
+
+# Campi disponibili: {year} e {number}, es. "{year}/{number:03d}" -> 2024/001
+INVOICE_NUMBER_FORMAT = os.getenv("INVOICE_NUMBER_FORMAT", "{year}/{number:03d}")
+
+class InvoiceNumberingService:
+    """
+    Numerazione progressiva delle fatture per anno fiscale, senza buchi.
+
+    Il contatore dell'anno è una riga di invoice_number_counters, incrementata
+    con un solo statement (INSERT ... ON CONFLICT DO UPDATE ... RETURNING,
+    che crea la riga al primo numero dell'anno) nella transazione della
+    fattura. Il lock sulla riga dura fino al commit: le transazioni che
+    numerano nello stesso anno si serializzano solo su questo statement e un
+    rollback restituisce i numeri. Conviene quindi assegnare il numero come
+    ultima operazione prima dell'inserimento della fattura.
+
+    Un numero indicato a mano nel formato della numerazione è accettato solo
+    se è il prossimo dell'anno; i numeri in altri formati (es. importati) sono
+    fuori numerazione. Solo l'ultima fattura numerata dell'anno può essere
+    eliminata, restituendo il numero; le altre si annullano con una nota di
+    credito, così la sequenza resta senza buchi.
+    """
+
+    def __init__(self, number_format: str = INVOICE_NUMBER_FORMAT):
+        if number_format.format(year=2000, number=1) == number_format.format(year=2000, number=2):
+            raise ValueError(f"Formato numero fattura senza {{number}}: {number_format}")
+        self.number_format = number_format
+        # Riconosce i numeri nel formato della numerazione (es. inseriti a mano)
+        pattern = ""
+        for literal, field, _, _ in string.Formatter().parse(number_format):
+            pattern += re.escape(literal)
+            if field is not None:
+                pattern += f"(?P<{field}>[0-9]+)"
+        self._pattern = re.compile(pattern)
+
+    def format(self, year: int, number: int) -> str:
+        return self.number_format.format(year=year, number=number)
+
+    def allocate_block(self, db: Session, year: int, count: int) -> List[str]:
+        """Assegna `count` numeri consecutivi dell'anno con un solo statement, senza commit"""
+        if count < 1:
+            return []
+        statement = dialect_insert(db, InvoiceNumberCounter).values(year=year, last_number=count)
+        statement = statement.on_conflict_do_update(
+            index_elements=[InvoiceNumberCounter.year],
+            set_={"last_number": InvoiceNumberCounter.last_number + statement.excluded.last_number}
+        ).returning(InvoiceNumberCounter.last_number)
+        last_number = db.execute(statement).scalar_one()
+        return [self.format(year, number) for number in range(last_number - count + 1, last_number + 1)]
+
+    def allocate(self, db: Session, year: int) -> str:
+        """Assegna il prossimo numero dell'anno, senza commit"""
+        return self.allocate_block(db, year, 1)[0]
+
+    def parse(self, invoice_number: str, invoice_date: date) -> Optional[Tuple[int, int]]:
+        """(anno, numero) se invoice_number è nel formato della numerazione, altrimenti None"""
+        match = self._pattern.fullmatch(invoice_number)
+        if not match:
+            return None
+        year = int(match["year"]) if "year" in match.groupdict() else invoice_date.year
+        return year, int(match["number"])
+
+    def assign(self, db: Session, invoice_date: date, invoice_number: Optional[str] = None) -> str:
+        """
+        Numero della fattura, senza commit: il prossimo dell'anno se non indicato.
+        Un numero indicato nel formato della numerazione deve essere il
+        prossimo del suo anno, che viene così consumato; altrimenti la
+        transazione viene annullata con un errore 400.
+        """
+        if invoice_number is None:
+            return self.allocate(db, invoice_date.year)
+
+        parsed = self.parse(invoice_number, invoice_date)
+        if parsed is None:
+            return invoice_number
+        year, _ = parsed
+        expected = self.allocate(db, year)
+        if expected != invoice_number:
+            db.rollback()  # restituisce il numero appena assegnato
+            raise HTTPException(
+                status_code=400,
+                detail=f"Numero fattura '{invoice_number}' fuori sequenza: il prossimo numero del {year} è {expected}"
+            )
+        return invoice_number
+
+    def release(self, db: Session, invoice_number: str, invoice_date: date) -> None:
+        """
+        Restituisce il numero di una fattura da eliminare, senza commit.
+        Solo l'ultimo numero dell'anno può tornare al contatore: per gli altri
+        la transazione viene annullata con un errore 400.
+        """
+        parsed = self.parse(invoice_number, invoice_date)
+        if parsed is None:
+            return
+        year, number = parsed
+        released = db.execute(
+            update(InvoiceNumberCounter)
+            .where(InvoiceNumberCounter.year == year, InvoiceNumberCounter.last_number == number)
+            .values(last_number=InvoiceNumberCounter.last_number - 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not released:
+            db.rollback()
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Impossibile eliminare la fattura {invoice_number}: solo l'ultima fattura "
+                    f"numerata del {year} può essere eliminata, le altre vanno stornate con una nota di credito"
+                )
+            )
@@ -0,0 +1,178 @@
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import Row, exists, insert, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from src.database.locks import advisory_xact_lock, PROJECT_INVOICING_LOCK
+from src.models.models import BillingType, Invoice, LineItemTimeEntry, Project, TimeEntry, User
+from src.schemas.invoice import InvoiceGenerate
+from src.services.billing_rates import billing_rate_resolver
+from src.services.invoice import InvoiceService
+from src.services.invoice_numbering import InvoiceNumberingService
+from src.services.line_item import CENTS, LineItemService, line_item_totals
+
+class NothingToInvoice(HTTPException):
+    """Nessuna time entry da fatturare nel periodo: 400 per l'API, progetto saltato dal batch"""
+
+    def __init__(self):
+        super().__init__(status_code=400, detail="Nessuna time entry da fatturare nel periodo")
+
+class InvoicingService:
+    """
+    Generazione delle fatture a consuntivo dalle time entry non ancora fatturate.
+
+    Le entry del progetto nel periodo vengono selezionate con un anti-join
+    (NOT EXISTS) su line_item_time_entries e lette come righe Core, senza
+    oggetti ORM. Le tariffe di tutte le entry vengono risolte in blocco da
+    BillingRateResolver e le entry raggruppate in un line item per utente e
+    tariffa. Fattura, line items e collegamenti alle entry vengono inseriti in
+    un'unica transazione, con un numero di statement che non dipende dal
+    numero di entry.
+    """
+
+    def unbilled_entries(
+        self,
+        db: Session,
+        project_id: int,
+        period_start: date,
+        period_end: date
+    ) -> Sequence[Row]:
+        """
+        Time entry del progetto nel periodo (estremi inclusi) non collegate a
+        nessun line item, ordinate per utente e giorno: (id, user_id, entry_day, hours).
+        Le entry senza utente non sono fatturabili e vengono ignorate.
+        """
+        billed = exists().where(LineItemTimeEntry.time_entry_id == TimeEntry.id)
+        return db.execute(
+            select(TimeEntry.id, TimeEntry.user_id, TimeEntry.entry_day, TimeEntry.hours)
+            .where(
+                TimeEntry.project_id == project_id,
+                TimeEntry.user_id.is_not(None),
+                TimeEntry.entry_day >= period_start,
+                TimeEntry.entry_day <= period_end,
+                ~billed
+            )
+            .order_by(TimeEntry.user_id, TimeEntry.entry_day, TimeEntry.id)
+        ).all()
+
+    def _insert_links(self, db: Session, links: List[Tuple[int, int]]) -> None:
+        """Collega le entry ai line items: un solo INSERT ... SELECT unnest(...) su PostgreSQL"""
+        if not links:
+            return
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(
+                text(
+                    "INSERT INTO line_item_time_entries (line_item_id, time_entry_id) "
+                    "SELECT * FROM unnest(CAST(:line_item_ids AS integer[]), CAST(:time_entry_ids AS integer[]))"
+                ),
+                {
+                    "line_item_ids": [line_item_id for line_item_id, _ in links],
+                    "time_entry_ids": [time_entry_id for _, time_entry_id in links]
+                }
+            )
+            return
+        db.execute(
+            insert(LineItemTimeEntry.__table__),
+            [{"line_item_id": line_item_id, "time_entry_id": time_entry_id} for line_item_id, time_entry_id in links]
+        )
+
+    def generate(self, db: Session, invoice_in: InvoiceGenerate) -> Invoice:
+        """
+        Genera la fattura del progetto con le time entry non fatturate del
+        periodo e la restituisce con i line items. Senza invoice_number viene
+        assegnato il prossimo numero dell'anno della data fattura.
+        Solleva 404 se il progetto non esiste, 400 se non è a consuntivo o se
+        manca la tariffa di un utente, NothingToInvoice (400) se non ci sono
+        entry da fatturare.
+        """
+        db_invoice = self.build_invoice(db, invoice_in)
+        db.commit()
+        return db_invoice
+
+    def build_invoice(self, db: Session, invoice_in: InvoiceGenerate) -> Invoice:
+        """
+        Come generate, ma senza commit: il chiamante può aggiungere altre
+        scritture alla stessa transazione. In caso di errore la transazione
+        viene annullata.
+        """
+        project = db.execute(
+            select(Project.id, Project.billing_type).where(Project.id == invoice_in.project_id)
+        ).first()
+        if not project:
+            raise HTTPException(status_code=404, detail=f"Progetto {invoice_in.project_id} non trovato")
+        if project.billing_type != BillingType.TIME_AND_MATERIALS:
+            raise HTTPException(
+                status_code=400,
+                detail="Solo i progetti a consuntivo (TIME_AND_MATERIALS) possono essere fatturati dalle time entry"
+            )
+
+        # Una generazione per progetto alla volta: l'anti-join vede così le
+        # entry già fatturate da un'esecuzione concorrente appena committata
+        advisory_xact_lock(db, PROJECT_INVOICING_LOCK, invoice_in.project_id)
+
+        entries = self.unbilled_entries(db, invoice_in.project_id, invoice_in.period_start, invoice_in.period_end)
+        if not entries:
+            db.rollback()
+            raise NothingToInvoice()
+
+        users = dict(db.execute(
+            select(User.id, User.name).where(User.id.in_({entry.user_id for entry in entries}))
+        ).all())
+        rates = billing_rate_resolver.annotate(
+            db,
+            [entry.user_id for entry in entries],
+            [invoice_in.project_id] * len(entries),
+            [entry.entry_day for entry in entries]
+        )
+
+        # (utente, tariffa) -> [ore, primo giorno, ultimo giorno, id delle entry]
+        groups: Dict[Tuple[int, Decimal], List[Any]] = {}
+        missing: Dict[int, date] = {}
+        for (entry_id, user_id, day, hours), rate in zip(entries, rates):
+            if rate is None:
+                missing.setdefault(user_id, day)
+                continue
+            group = groups.get((user_id, rate))
+            if group is None:
+                group = groups[(user_id, rate)] = [0.0, day, day, []]
+            group[0] += hours
+            group[2] = day
+            group[3].append(entry_id)
+
+        if missing:
+            db.rollback()
+            detail = ", ".join(f"utente {user_id} il {day}" for user_id, day in sorted(missing.items()))
+            raise HTTPException(status_code=400, detail=f"Tariffa oraria non trovata: {detail}")
+
+        rows = []
+        for (user_id, rate), (hours, first_day, last_day, _) in groups.items():
+            quantity = Decimal(str(round(hours, 2))).quantize(CENTS)
+            rows.append({
+                "description": f"Consulenza {users[user_id]} dal {first_day:%d/%m/%Y} al {last_day:%d/%m/%Y}",
+                "quantity": quantity,
+                "rate": rate,
+                "amount": (quantity * rate).quantize(CENTS)
+            })
+        amount, line_count, hours = line_item_totals(rows)
+
+        db_invoice = InvoiceService().add_invoice(
+            db,
+            project_id=invoice_in.project_id,
+            invoice_number=InvoiceNumberingService().assign(db, invoice_in.invoice_date, invoice_in.invoice_number),
+            invoice_date=invoice_in.invoice_date,
+            due_date=invoice_in.due_date,
+            amount=amount,
+            line_count=line_count,
+            hours=hours,
+            notes=invoice_in.notes
+        )
+        line_items = LineItemService().insert_many(db, db_invoice.id, rows)
+        self._insert_links(db, [
+            (line_item.id, entry_id)
+            for line_item, group in zip(line_items, groups.values())
+            for entry_id in group[3]
+        ])
+        set_committed_value(db_invoice, "line_items", line_items)
+        return db_invoice
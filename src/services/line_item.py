@@ -1,71 +1,203 @@
 from decimal import Decimal
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import exists, insert, select, update
 from sqlalchemy.orm import Session
-from src.models.models import InvoiceLineItem
+from fastapi import HTTPException
+from src.models.models import Invoice, InvoiceLineItem, LineItemTimeEntry
 from src.schemas.invoice import InvoiceLineItemBase
 from src.services.base import BaseService
 
+# Precisione delle colonne Numeric(10, 2) dei line items e delle fatture
+CENTS = Decimal('0.01')
+
+def line_item_values(item: InvoiceLineItemBase) -> Dict[str, Any]:
+    """
+    Valori da salvare per un line item, con amount = quantity × rate.
+    Arrotondati ai centesimi come nel database, così i totali della fattura
+    coincidono con la somma dei valori salvati.
+    """
+    quantity = Decimal(str(item.quantity)).quantize(CENTS)
+    rate = Decimal(str(item.rate)).quantize(CENTS)
+    return {
+        "description": item.description,
+        "quantity": quantity,
+        "rate": rate,
+        "amount": (quantity * rate).quantize(CENTS)
+    }
+
+def line_item_totals(rows: Iterable[Dict[str, Any]]) -> Tuple[Decimal, int, Decimal]:
+    """(importo, numero di righe, ore) di un insieme di line items"""
+    amount, count, hours = Decimal('0'), 0, Decimal('0')
+    for row in rows:
+        amount += row["amount"]
+        count += 1
+        hours += row["quantity"]
+    return amount, count, hours
+
 class LineItemService(BaseService[InvoiceLineItem, InvoiceLineItemBase, InvoiceLineItemBase]):
     def __init__(self):
         super().__init__(InvoiceLineItem)
     
-    def get_by_invoice(self, db: Session, invoice_id: int) -> List[InvoiceLineItem]:
-        return db.query(self.model)\
-            .filter(self.model.invoice_id == invoice_id)\
-            .all()
+    def get_by_invoice(
+        self,
+        db: Session,
+        invoice_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[InvoiceLineItem], Optional[str]]:
+        query = db.query(self.model)\
+            .filter(self.model.invoice_id == invoice_id)
+        return self.paginate(query, cursor, limit)
     
+    def insert_many(
+        self,
+        db: Session,
+        invoice_id: int,
+        rows: List[Dict[str, Any]]
+    ) -> List[InvoiceLineItem]:
+        """
+        Inserisce i line items (valori di line_item_values) con un solo INSERT
+        multi-riga ... RETURNING. Su SQLite, che non garantisce l'ordine delle
+        righe restituite, SQLAlchemy esegue un INSERT per riga.
+        Non aggiorna i totali della fattura e non esegue il commit: lo fa il chiamante.
+        """
+        if not rows:
+            return []
+        return db.scalars(
+            insert(self.model).returning(self.model, sort_by_parameter_order=True),
+            [{**row, "invoice_id": invoice_id} for row in rows]
+        ).all()
+
+    def apply_invoice_delta(
+        self,
+        db: Session,
+        invoice_id: Optional[int],
+        amount: Decimal,
+        line_count: int,
+        hours: Decimal
+    ) -> int:
+        """
+        Aggiorna i totali della fattura con un solo UPDATE incrementale,
+        senza leggere i line items. Non esegue il commit.
+        Ritorna il numero di fatture aggiornate (0 se non c'era nulla da applicare).
+        """
+        if invoice_id is None or (not amount and not line_count and not hours):
+            return 0
+        return db.execute(
+            update(Invoice)
+            .where(Invoice.id == invoice_id)
+            .values(
+                amount=Invoice.amount + amount,
+                line_count=Invoice.line_count + line_count,
+                hours=Invoice.hours + hours
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
     def batch_create(
         self, 
         db: Session, 
         invoice_id: int, 
         line_items: List[InvoiceLineItemBase]
     ) -> List[InvoiceLineItem]:
-        db_items = []
-        for item in line_items:
-            db_item = self.model(
-                **item.model_dump(),
-                invoice_id=invoice_id
+        rows = [line_item_values(item) for item in line_items]
+        # Prima i totali: l'UPDATE blocca la fattura fino al commit e, se non
+        # aggiorna nulla, la fattura non esiste (senza affidarsi alla foreign key)
+        if rows and not self.apply_invoice_delta(db, invoice_id, *line_item_totals(rows)):
+            db.rollback()
+            raise HTTPException(
+                status_code=404,
+                detail=f"Fattura {invoice_id} non trovata"
             )
-            db.add(db_item)
-            db_items.append(db_item)
-        
+        db_items = self.insert_many(db, invoice_id, rows)
         db.commit()
-        for item in db_items:
-            db.refresh(item)
         return db_items
 
+    def _get_for_update(self, db: Session, id: int) -> Optional[InvoiceLineItem]:
+        """Line item bloccato fino al commit: i delta sui totali partono da valori stabili"""
+        return db.query(self.model)\
+            .filter(self.model.id == id)\
+            .with_for_update()\
+            .first()
+
+    def _check_not_generated(self, db: Session, id: int) -> None:
+        """
+        I line items generati dalle time entry non si modificano né si
+        eliminano singolarmente: le entry collegate risulterebbero fatturate
+        con valori diversi, o tornerebbero da fatturare come effetto
+        collaterale. Per rifatturarle si elimina la fattura.
+        """
+        if db.scalar(select(exists().where(LineItemTimeEntry.line_item_id == id))):
+            db.rollback()  # rilascia il lock sul line item
+            raise HTTPException(
+                status_code=400,
+                detail="Line item generato dalle time entry: per modificarlo eliminare e rigenerare la fattura"
+            )
+
     def create(self, db: Session, obj_in: InvoiceLineItemBase) -> InvoiceLineItem:
-        """Crea un line item calcolando automaticamente l'amount"""
+        """Crea un line item calcolando automaticamente l'amount e aggiorna i totali della fattura"""
         obj_data = obj_in.model_dump()
-        
-        # Calcola l'amount dal rate e quantity
-        amount = Decimal(str(obj_data["quantity"])) * Decimal(str(obj_data["rate"]))
-        obj_data["amount"] = amount
+        obj_data.update(line_item_values(obj_in))
         
         db_obj = self.model(**obj_data)
         db.add(db_obj)
+        db.flush()
+        self.apply_invoice_delta(db, db_obj.invoice_id, db_obj.amount, 1, db_obj.quantity)
         db.commit()
         db.refresh(db_obj)
         return db_obj
     
     def update(self, db: Session, id: int, obj_in: InvoiceLineItemBase) -> InvoiceLineItem:
-        """Aggiorna un line item ricalcolando l'amount"""
-        db_obj = self.get(db, id)
+        """Aggiorna un line item ricalcolando l'amount e i totali della fattura"""
+        db_obj = self._get_for_update(db, id)
         if not db_obj:
             return None
             
         update_data = obj_in.model_dump(exclude_unset=True)
+        if update_data.keys() & {"quantity", "rate"}:
+            self._check_not_generated(db, id)
+        old_amount, old_quantity = db_obj.amount or Decimal('0'), db_obj.quantity or Decimal('0')
         
-        # Se quantity o rate cambiano, ricalcola amount
+        # Se quantity o rate cambiano, ricalcola amount sui valori arrotondati
+        # ai centesimi, come line_item_values
         if "quantity" in update_data or "rate" in update_data:
-            quantity = update_data.get("quantity", db_obj.quantity)
-            rate = update_data.get("rate", db_obj.rate)
-            update_data["amount"] = Decimal(str(quantity)) * Decimal(str(rate))
+            for field in ("quantity", "rate"):
+                if field in update_data:
+                    update_data[field] = Decimal(str(update_data[field])).quantize(CENTS)
+            quantity = Decimal(str(update_data.get("quantity", db_obj.quantity)))
+            rate = Decimal(str(update_data.get("rate", db_obj.rate)))
+            update_data["amount"] = (quantity * rate).quantize(CENTS)
             
         for field, value in update_data.items():
             setattr(db_obj, field, value)
             
         db.add(db_obj)
+        db.flush()
+        self.apply_invoice_delta(
+            db,
+            db_obj.invoice_id,
+            Decimal(str(db_obj.amount)) - old_amount,
+            0,
+            Decimal(str(db_obj.quantity)) - old_quantity
+        )
         db.commit()
         db.refresh(db_obj)
-        return db_obj
\ No newline at end of file
+        return db_obj
+
+    def delete(self, db: Session, id: int) -> bool:
+        """Elimina un line item sottraendone importo e ore dai totali della fattura"""
+        db_obj = self._get_for_update(db, id)
+        if not db_obj:
+            return False
+        self._check_not_generated(db, id)
+
+        self.apply_invoice_delta(
+            db,
+            db_obj.invoice_id,
+            -(db_obj.amount or Decimal('0')),
+            -1,
+            -(db_obj.quantity or Decimal('0'))
+        )
+        db.delete(db_obj)
+        db.commit()
+        return True
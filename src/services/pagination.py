@@ -0,0 +1,58 @@
+import base64
+import enum
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Sequence
+from fastapi import HTTPException
+from sqlalchemy import Column, literal, tuple_
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+def _from_json(value: Any, column: Column) -> Any:
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is Decimal:
+        return Decimal(value)
+    if issubclass(python_type, enum.Enum):
+        return python_type(value)
+    return python_type(value)
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Codifica i valori della chiave di ordinamento in un cursore opaco"""
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, columns: Sequence[Column]) -> List[Any]:
+    """Decodifica un cursore nei valori tipizzati delle colonne di ordinamento"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("numero di valori errato")
+        # Le chiavi di ordinamento non sono mai NULL: un confronto con NULL
+        # darebbe una pagina vuota invece di un errore
+        if any(value is None for value in values):
+            raise ValueError("valore nullo")
+        return [_from_json(v, c) for v, c in zip(values, columns)]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(
+            status_code=400,
+            detail="Cursore di paginazione non valido"
+        )
+
+def keyset_filter(columns: Sequence[Column], values: Sequence[Any]):
+    """Predicato "dopo il cursore" sulla chiave (col1, col2, ...) > (val1, val2, ...)"""
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return tuple_(*columns) > tuple_(*[literal(v, c.type) for v, c in zip(values, columns)])
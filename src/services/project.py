@@ -1,11 +1,21 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
-from src.models.models import Project
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import exists, select
+from src.models.models import BillingRate, Invoice, Project, ProjectUser, ResourceAllocation, TimeEntry
 from src.schemas.project import ProjectCreate, ProjectUpdate
-from src.services.base import BaseService
+from src.services.base import BaseService, orm_delete_options
 from src.models.models import Client
 from fastapi import HTTPException
 
+# Righe che impediscono l'eliminazione di un progetto
+DELETE_CHECKS = [
+    (TimeEntry, "esistono time entries associate"),
+    (ResourceAllocation, "esistono resource allocations associate"),
+    (Invoice, "esistono fatture associate"),
+    (BillingRate, "esistono tariffe associate"),
+    (ProjectUser, "esistono utenti assegnati"),
+]
+
 class ProjectService(BaseService[Project, ProjectCreate, ProjectUpdate]):
     def __init__(self):
         super().__init__(Project)
@@ -19,7 +29,7 @@ class ProjectService(BaseService[Project, ProjectCreate, ProjectUpdate]):
     def get_project_with_allocations(self, db: Session, project_id: int) -> Optional[Project]:
         return db.query(self.model)\
             .filter(self.model.id == project_id)\
-            .options(joinedload(self.model.allocations))\
+            .options(selectinload(self.model.allocations))\
             .first()
     
     def update(self, db: Session, id: int, obj_in: ProjectUpdate) -> Optional[Project]:
@@ -39,32 +49,34 @@ class ProjectService(BaseService[Project, ProjectCreate, ProjectUpdate]):
         - Time entries associate
         - Resource allocations attive 
         - Fatture
+        - Tariffe o utenti assegnati
         """
-        project = db.query(self.model).filter(self.model.id == id).first()
+        project = db.query(self.model)\
+            .filter(self.model.id == id)\
+            .options(*orm_delete_options(self.model))\
+            .first()
         if not project:
             return False
 
-        # Controlla time entries
-        if project.time_entries:
-            raise HTTPException(
-                status_code=400,
-                detail="Impossibile eliminare il progetto: esistono time entries associate"
-            )
-
-        # Controlla allocations
-        if project.allocations:
-            raise HTTPException(
-                status_code=400,
-                detail="Impossibile eliminare il progetto: esistono resource allocations associate"
-            )
-
-        # Controlla fatture
-        if project.invoices:
-            raise HTTPException(
-                status_code=400,
-                detail="Impossibile eliminare il progetto: esistono fatture associate"
-            )
+        # Un EXISTS per tabella collegata, senza caricare le collezioni
+        for model, reason in DELETE_CHECKS:
+            if db.scalar(select(exists().where(model.project_id == id))):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Impossibile eliminare il progetto: {reason}"
+                )
 
         db.delete(project)
         db.commit()
-        return True
\ No newline at end of file
+        return True
+
+    def _bulk_delete_errors(self, db: Session, ids: List[int]) -> Dict[int, str]:
+        """Stessi vincoli di delete, verificati con una query per tabella collegata"""
+        errors = {}
+        for model, reason in DELETE_CHECKS:
+            linked = db.scalars(
+                select(model.project_id).where(model.project_id.in_(ids)).distinct()
+            )
+            for project_id in linked:
+                errors.setdefault(project_id, f"Impossibile eliminare il progetto: {reason}")
+        return errors
@@ -1,24 +1,208 @@
-from typing import List, Optional
-from datetime import date, timedelta
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date
+import numpy as np
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from src.models.models import ResourceAllocation, ResourceAllocationStatus
+from sqlalchemy import and_, or_, select
+from src.database.locks import advisory_xact_lock, USER_ALLOCATIONS_LOCK
+from src.models.models import ResourceAllocation, ResourceAllocationStatus, User, UserRole, ProjectUser, ConsultantRole
+from src.schemas.bulk import BulkUpdateItem
 from src.schemas.resource_allocation import ResourceAllocationCreate, ResourceAllocationUpdate
 from src.services.base import BaseService
+from src.services.availability import availability_curve, availability_matrix, peak_allocation, PRECISION
+from src.services.capacity_index import capacity_index, ACTIVE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Campi che influiscono sull'allocazione complessiva di un utente
+CAPACITY_FIELDS = {"user_id", "start_date", "end_date", "allocation_percentage", "status"}
 
 class ResourceAllocationService(BaseService[ResourceAllocation, ResourceAllocationCreate, ResourceAllocationUpdate]):
     def __init__(self):
         super().__init__(ResourceAllocation)
+
+    def _capacity_errors(self, db: Session, candidates: List[Dict[str, Any]]) -> Dict[int, str]:
+        """
+        Verifica che le allocazioni candidate non portino nessun utente oltre il 100%.
+
+        Prende il lock advisory degli utenti coinvolti (rilasciato al commit della
+        scrittura), legge con una sola query le allocazioni attive sovrapposte ai
+        periodi candidati e calcola il picco con uno sweep sugli estremi.
+        I candidati sono valutati nell'ordine dato: quelli accettati contano per i
+        successivi. Le righe con "id" sostituiscono la versione salvata solo se
+        accettate; finché non lo sono, conta la versione salvata.
+        Ritorna {posizione in candidates: errore}.
+        """
+        errors = {}
+        active = []
+        for position, values in enumerate(candidates):
+            if values["end_date"] < values["start_date"]:
+                errors[position] = "La data di fine deve essere successiva alla data di inizio"
+            elif values.get("status", ResourceAllocationStatus.PLANNED) in ACTIVE_STATUSES:
+                active.append((position, values))
+        if not active:
+            return errors
+
+        user_ids = {values["user_id"] for _, values in active}
+        advisory_xact_lock(db, USER_ALLOCATIONS_LOCK, *user_ids)
+
+        # Le righe portate fuori dagli stati attivi non occupano più capacità
+        released = [
+            values["id"] for position, values in enumerate(candidates)
+            if values.get("id") is not None and position not in errors
+            and values.get("status", ResourceAllocationStatus.PLANNED) not in ACTIVE_STATUSES
+        ]
+        query = db.query(
+            ResourceAllocation.id,
+            ResourceAllocation.user_id,
+            ResourceAllocation.start_date,
+            ResourceAllocation.end_date,
+            ResourceAllocation.allocation_percentage
+        ).filter(
+            ResourceAllocation.user_id.in_(user_ids),
+            ResourceAllocation.status.in_(ACTIVE_STATUSES),
+            ResourceAllocation.start_date <= max(values["end_date"] for _, values in active),
+            ResourceAllocation.end_date >= min(values["start_date"] for _, values in active)
+        )
+        if released:
+            query = query.filter(ResourceAllocation.id.not_in(released))
+
+        # {utente: {id o posizione del candidato: (inizio, fine, percentuale)}}
+        intervals = defaultdict(dict)
+        stored_users = {}
+        for allocation_id, user_id, start, end, percentage in query:
+            intervals[user_id][allocation_id] = (start, end, percentage)
+            stored_users[allocation_id] = user_id
+
+        for position, values in active:
+            key = values.get("id")
+            if key is None:
+                key = ("candidate", position)
+            stored = intervals[stored_users[key]].pop(key) if key in stored_users else None
+            user_intervals = intervals[values["user_id"]]
+            interval = (values["start_date"], values["end_date"], values["allocation_percentage"])
+            peak, day = peak_allocation(
+                [*user_intervals.values(), interval], values["start_date"], values["end_date"]
+            )
+            if peak > 1:
+                errors[position] = (
+                    f"L'allocazione totale non può superare il 100%: "
+                    f"l'utente {values['user_id']} sarebbe al {round(peak * 100, 2):g}% il {day.isoformat()}"
+                )
+                if stored is not None:
+                    intervals[stored_users[key]][key] = stored
+            else:
+                user_intervals[key] = interval
+                stored_users[key] = values["user_id"]
+        return errors
+
+    def _current_values(self, db: Session, rows: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Valori risultanti dagli aggiornamenti, sovrapposti a quelli salvati"""
+        columns = [getattr(ResourceAllocation, field) for field in sorted(CAPACITY_FIELDS)]
+        stored = {
+            row.id: row._asdict()
+            for row in db.query(ResourceAllocation.id, *columns).filter(
+                ResourceAllocation.id.in_([row["id"] for row in rows])
+            )
+        }
+        return [
+            {**stored[row["id"]], **row} if row["id"] in stored else None
+            for row in rows
+        ]
+
+    def _bulk_create_errors(self, db: Session, rows: List[Dict[str, Any]]) -> Dict[int, str]:
+        return self._capacity_errors(db, rows)
+
+    def _bulk_update_errors(self, db: Session, rows: List[Dict[str, Any]]) -> Dict[int, str]:
+        positions = [position for position, row in enumerate(rows) if row.keys() & CAPACITY_FIELDS]
+        if not positions:
+            return {}
+        merged = self._current_values(db, [rows[position] for position in positions])
+        checked = [(position, values) for position, values in zip(positions, merged) if values is not None]
+        errors = self._capacity_errors(db, [values for _, values in checked])
+        return {checked[index][0]: error for index, error in errors.items()}
+
+    # Le scritture vengono riportate sull'indice di capacità dopo il commit
+
+    def create(self, db: Session, obj_in: ResourceAllocationCreate) -> ResourceAllocation:
+        errors = self._capacity_errors(db, [obj_in.model_dump()])
+        if errors:
+            db.rollback()  # rilascia il lock
+            raise HTTPException(status_code=400, detail=errors[0])
+        allocation = super().create(db, obj_in)
+        capacity_index.apply(allocation)
+        return allocation
+
+    def update(self, db: Session, id: int, obj_in: ResourceAllocationUpdate) -> Optional[ResourceAllocation]:
+        errors = self._bulk_update_errors(db, [{"id": id, **obj_in.model_dump(exclude_unset=True)}])
+        if errors:
+            db.rollback()  # rilascia il lock
+            raise HTTPException(status_code=400, detail=errors[0])
+        allocation = super().update(db, id, obj_in)
+        if allocation:
+            capacity_index.apply(allocation)
+        return allocation
+
+    def delete(self, db: Session, id: int) -> bool:
+        deleted = super().delete(db, id)
+        if deleted:
+            capacity_index.discard(id)
+        return deleted
+
+    def bulk_create(self, db: Session, items: List[ResourceAllocationCreate]) -> Dict[str, Any]:
+        summary = super().bulk_create(db, items)
+        self._apply_bulk_results(summary)
+        return summary
+
+    def bulk_update(
+        self,
+        db: Session,
+        items: List[BulkUpdateItem[ResourceAllocationUpdate]]
+    ) -> Dict[str, Any]:
+        summary = super().bulk_update(db, items)
+        self._apply_bulk_results(summary)
+        return summary
+
+    def bulk_delete(self, db: Session, ids: List[int]) -> Dict[str, Any]:
+        summary = super().bulk_delete(db, ids)
+        for result in summary["results"]:
+            if result["success"]:
+                capacity_index.discard(result["id"])
+        return summary
+
+    def _apply_bulk_results(self, summary: Dict[str, Any]) -> None:
+        for result in summary["results"]:
+            if result["success"]:
+                capacity_index.apply(result["item"])
+
+    def find_available_users(
+        self,
+        db: Session,
+        start_date: date,
+        end_date: date,
+        min_available: float,
+        role: Optional[ConsultantRole] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Utenti con almeno `min_available` di capacità libera in ogni giorno del
+        periodo, opzionalmente filtrati per ruolo (quello dell'allocazione più recente).
+        Servito dall'indice di capacità in memoria, senza query per utente.
+        """
+        return capacity_index.search(db, start_date, end_date, min_available, role)
     
     def get_user_allocations(
         self, 
         db: Session, 
         user_id: int, 
         start_date: Optional[date] = None, 
-        end_date: Optional[date] = None
-    ) -> List[ResourceAllocation]:
+        end_date: Optional[date] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[ResourceAllocation], Optional[str]]:
         """
-        Recupera tutte le allocazioni di un utente, opzionalmente filtrate per periodo
+        Recupera le allocazioni di un utente, opzionalmente filtrate per periodo, paginate a cursore
         """
         query = db.query(self.model).filter(self.model.user_id == user_id)
         
@@ -27,24 +211,25 @@ class ResourceAllocationService(BaseService[ResourceAllocation, ResourceAllocati
         if end_date:
             query = query.filter(self.model.start_date <= end_date)
             
-        return query.all()
+        return self.paginate(query, cursor, limit)
     
-    def check_availability(
-        self, 
-        db: Session, 
-        user_id: int, 
-        start_date: date, 
+    def get_availability_curve(
+        self,
+        db: Session,
+        user_id: int,
+        start_date: date,
         end_date: date
-    ) -> float:
+    ) -> np.ndarray:
         """
-        Verifica la disponibilità di un utente in un periodo
-        Ritorna la percentuale media di disponibilità nel periodo
+        Disponibilità giornaliera di un utente per ogni giorno del periodo
+        (1 = libero, 0 = completamente allocato)
         """
-        # Debug log
-        print(f"Checking availability for period: {start_date} - {end_date}")
-        
-        # Recupera tutte le allocazioni nel periodo
-        allocations = db.query(ResourceAllocation).filter(
+        # Solo le colonne necessarie, senza materializzare oggetti ORM
+        intervals = db.query(
+            ResourceAllocation.start_date,
+            ResourceAllocation.end_date,
+            ResourceAllocation.allocation_percentage
+        ).filter(
             and_(
                 ResourceAllocation.user_id == user_id,
                 ResourceAllocation.status.in_([
@@ -56,37 +241,88 @@ class ResourceAllocationService(BaseService[ResourceAllocation, ResourceAllocati
             )
         ).all()
 
-        print(f"Found {len(allocations)} allocations in period")
-        
-        # Calcola disponibilità giornaliera
-        days = []
-        current_date = start_date
-        while current_date <= end_date:
-            day_allocations = [
-                a for a in allocations 
-                if a.start_date <= current_date <= a.end_date
-            ]
-            
-            daily_allocation = sum(a.allocation_percentage for a in day_allocations)
-            daily_availability = max(0, 1 - daily_allocation)
-            
-            print(f"Date {current_date}: allocated {daily_allocation}, available {daily_availability}")
-            days.append(daily_availability)
-            current_date += timedelta(days=1)
+        logger.debug(
+            "Availability for user %s in %s - %s: %d allocations",
+            user_id, start_date, end_date, len(intervals)
+        )
+        return availability_curve(intervals, start_date, end_date)
 
-        # Calcola media disponibilità
-        average_availability = sum(days) / len(days)
-        print(f"Average availability: {average_availability}")
-        
-        return average_availability
+    def check_availability(
+        self, 
+        db: Session, 
+        user_id: int, 
+        start_date: date, 
+        end_date: date
+    ) -> float:
+        """
+        Verifica la disponibilità di un utente in un periodo
+        Ritorna la percentuale media di disponibilità nel periodo
+        """
+        curve = self.get_availability_curve(db, user_id, start_date, end_date)
+        return round(float(curve.mean()), PRECISION)
+
+    def get_team_availability(
+        self,
+        db: Session,
+        start_date: date,
+        end_date: date,
+        user_ids: Optional[List[int]] = None,
+        role: Optional[UserRole] = None,
+        project_id: Optional[int] = None
+    ) -> Tuple[List[int], np.ndarray]:
+        """
+        Disponibilità giornaliera di più utenti nel periodo.
+
+        Gli utenti possono essere filtrati per id, ruolo e progetto (membri del
+        progetto o utenti con allocazioni sul progetto). Tutte le allocazioni
+        sovrapposte al periodo vengono lette con un'unica query.
+
+        Ritorna (id utenti ordinati, matrice utenti × giorni).
+        """
+        users = select(User.id)
+        if user_ids:
+            users = users.where(User.id.in_(user_ids))
+        if role:
+            users = users.where(User.role == role)
+        if project_id:
+            users = users.where(or_(
+                User.id.in_(select(ProjectUser.user_id).where(ProjectUser.project_id == project_id)),
+                User.id.in_(select(ResourceAllocation.user_id).where(ResourceAllocation.project_id == project_id))
+            ))
+        ordered_ids = list(db.scalars(users.order_by(User.id)))
+
+        allocations = db.query(
+            ResourceAllocation.user_id,
+            ResourceAllocation.start_date,
+            ResourceAllocation.end_date,
+            ResourceAllocation.allocation_percentage
+        ).filter(
+            ResourceAllocation.user_id.in_(users),
+            ResourceAllocation.status.in_([
+                ResourceAllocationStatus.PLANNED,
+                ResourceAllocationStatus.ACTIVE
+            ]),
+            ResourceAllocation.start_date <= end_date,
+            ResourceAllocation.end_date >= start_date
+        ).all()
+
+        position = {user_id: index for index, user_id in enumerate(ordered_ids)}
+        rows = [
+            (position[user_id], start, end, percentage)
+            for user_id, start, end, percentage in allocations
+            if user_id in position
+        ]
+        return ordered_ids, availability_matrix(rows, len(ordered_ids), start_date, end_date)
 
     def get_project_allocations(
         self,
         db: Session,
         project_id: int,
         start_date: date = None,
-        end_date: date = None
-    ) -> List[ResourceAllocation]:
+        end_date: date = None,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[ResourceAllocation], Optional[str]]:
         """
         Recupera le allocazioni di risorse per un progetto specifico.
         
@@ -95,6 +331,8 @@ class ResourceAllocationService(BaseService[ResourceAllocation, ResourceAllocati
             project_id: ID del progetto
             start_date: Data iniziale opzionale per il filtro
             end_date: Data finale opzionale per il filtro
+            cursor: Cursore della pagina precedente (paginazione keyset)
+            limit: Numero massimo di allocazioni per pagina
         """
         query = db.query(self.model).filter(self.model.project_id == project_id)
         
@@ -110,4 +348,4 @@ class ResourceAllocationService(BaseService[ResourceAllocation, ResourceAllocati
         elif end_date:
             query = query.filter(self.model.end_date <= end_date)
             
-        return query.all()
\ No newline at end of file
+        return self.paginate(query, cursor, limit)
\ No newline at end of file
@@ -1,12 +1,24 @@
-from typing import List, Optional
-from datetime import date, datetime
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from datetime import date, datetime, time, timedelta
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from src.models.models import TimeEntry
-from src.schemas.time_entry import TimeEntryCreate, TimeEntryUpdate
+from sqlalchemy import and_, delete, func, insert, or_, select, text, update
+from src.database.database import dialect_insert
+from src.models.models import TimeEntry, LineItemTimeEntry, UserDailyHours
+from src.schemas.time_entry import TimeEntryCreate, TimeEntryUpdate, WeekTimesheetCell
 from src.services.base import BaseService
 
+DAILY_HOURS_LIMIT = 8
+WEEKLY_HOURS_LIMIT = 40
+
+def week_start(day: date) -> date:
+    """Lunedì della settimana ISO del giorno"""
+    return day - timedelta(days=day.weekday())
+
 class TimeEntryService(BaseService[TimeEntry, TimeEntryCreate, TimeEntryUpdate]):
+    cursor_columns = ("date", "id")
+
     def __init__(self):
         super().__init__(TimeEntry)
         
@@ -15,10 +27,13 @@ class TimeEntryService(BaseService[TimeEntry, TimeEntryCreate, TimeEntryUpdate])
         db: Session, 
         user_id: int, 
         start_date: Optional[date] = None, 
-        end_date: Optional[date] = None
-    ) -> List[TimeEntry]:
+        end_date: Optional[date] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[TimeEntry], Optional[str]]:
         """
-        Recupera le time entry di un utente, opzionalmente filtrate per data.
+        Recupera le time entry di un utente, opzionalmente filtrate per data,
+        ordinate per data e paginate a cursore.
         """
         query = db.query(self.model).filter(self.model.user_id == user_id)
         
@@ -27,31 +42,50 @@ class TimeEntryService(BaseService[TimeEntry, TimeEntryCreate, TimeEntryUpdate])
         if end_date:
             query = query.filter(self.model.date <= end_date)
             
-        return query.all()
+        return self.paginate(query, cursor, limit)
             
-    def get_by_project(self, db: Session, project_id: int) -> List[TimeEntry]:
-        return db.query(self.model)\
-            .filter(self.model.project_id == project_id)\
-            .all()
+    def get_by_project(
+        self,
+        db: Session,
+        project_id: int,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[TimeEntry], Optional[str]]:
+        query = db.query(self.model)\
+            .filter(self.model.project_id == project_id)
+        return self.paginate(query, cursor, limit)
 
-    def get_weekly_hours(
+    def get_hours_between(
         self,
         db: Session,
         user_id: int,
-        week_start: date,
-        week_end: date
+        start_day: date,
+        end_day: date
     ) -> float:
         """
-        Calcola il totale delle ore settimanali per un utente.
+        Totale delle ore di un utente nei giorni [start_day, end_day),
+        letto dal rollup user_daily_hours (una riga per giorno).
         """
-        result = db.query(func.sum(TimeEntry.hours))\
+        result = db.query(func.sum(UserDailyHours.hours))\
             .filter(
-                TimeEntry.user_id == user_id,
-                TimeEntry.date >= week_start,
-                TimeEntry.date <= week_end
+                UserDailyHours.user_id == user_id,
+                UserDailyHours.day >= start_day,
+                UserDailyHours.day < end_day
             ).scalar()
         return float(result or 0)
 
+    def get_weekly_hours(
+        self,
+        db: Session,
+        user_id: int,
+        week_start: date,
+        week_end: date
+    ) -> float:
+        """
+        Calcola il totale delle ore settimanali per un utente (week_end incluso).
+        """
+        return self.get_hours_between(db, user_id, week_start, week_end + timedelta(days=1))
+
     def get_daily_hours(
         self,
         db: Session,
@@ -61,24 +95,364 @@ class TimeEntryService(BaseService[TimeEntry, TimeEntryCreate, TimeEntryUpdate])
         """
         Calcola il totale delle ore giornaliere per un utente.
         """
-        result = db.query(func.sum(TimeEntry.hours))\
+        return self.get_hours_between(db, user_id, day, day + timedelta(days=1))
+
+    # --- Rollup user_daily_hours -----------------------------------------
+    # Ogni scrittura aggiorna il rollup nella stessa transazione della
+    # time entry: i delta vengono applicati prima del commit di BaseService,
+    # così un errore del database annulla entrambi.
+
+    def _apply_daily_deltas(self, db: Session, deltas: Dict[Tuple[int, date], float]) -> None:
+        """Somma i delta al rollup con un unico INSERT ... ON CONFLICT DO UPDATE"""
+        rows = [
+            {"user_id": user_id, "day": day, "hours": hours}
+            for (user_id, day), hours in deltas.items()
+            if hours
+        ]
+        if not rows:
+            return
+        statement = dialect_insert(db, UserDailyHours)
+        statement = statement.on_conflict_do_update(
+            index_elements=[UserDailyHours.user_id, UserDailyHours.day],
+            set_={"hours": UserDailyHours.hours + statement.excluded.hours}
+        )
+        db.execute(statement, rows)
+
+    def _entry_deltas(
+        self,
+        added: List[Dict[str, Any]],
+        removed: List[Dict[str, Any]]
+    ) -> Dict[Tuple[int, date], float]:
+        deltas: Dict[Tuple[int, date], float] = defaultdict(float)
+        for entry in added:
+            deltas[(entry["user_id"], entry["date"].date())] += entry["hours"]
+        for entry in removed:
+            deltas[(entry["user_id"], entry["date"].date())] -= entry["hours"]
+        return deltas
+
+    def _stored_entries(self, db: Session, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        return {
+            row.id: row._asdict()
+            for row in db.query(TimeEntry.id, TimeEntry.user_id, TimeEntry.date, TimeEntry.hours)
+            .filter(TimeEntry.id.in_(ids))
+        }
+
+    def _lock_weeks(
+        self,
+        db: Session,
+        weeks: Set[Tuple[int, date]]
+    ) -> Tuple[Dict[Tuple[int, date], float], Dict[Tuple[int, date], float]]:
+        """
+        Legge con SELECT ... FOR UPDATE le righe del rollup delle coppie
+        (utente, lunedì): le scritture concorrenti sulla stessa settimana dello
+        stesso utente attendono il commit. La riga del lunedì viene creata se
+        manca, così il lock copre anche settimane ancora vuote.
+        Ritorna i totali giornalieri e settimanali.
+        """
+        db.execute(
+            dialect_insert(db, UserDailyHours).on_conflict_do_nothing(),
+            [{"user_id": user_id, "day": monday, "hours": 0} for user_id, monday in sorted(weeks)]
+        )
+        locked = db.query(UserDailyHours.user_id, UserDailyHours.day, UserDailyHours.hours)\
             .filter(
-                TimeEntry.user_id == user_id,
-                func.date(TimeEntry.date) == day
-            ).scalar()
-        return float(result or 0)
+                or_(*[
+                    and_(
+                        UserDailyHours.user_id == user_id,
+                        UserDailyHours.day >= monday,
+                        UserDailyHours.day < monday + timedelta(days=7)
+                    )
+                    for user_id, monday in weeks
+                ])
+            )\
+            .order_by(UserDailyHours.user_id, UserDailyHours.day)\
+            .with_for_update()
+
+        daily_hours: Dict[Tuple[int, date], float] = defaultdict(float)
+        weekly_hours: Dict[Tuple[int, date], float] = defaultdict(float)
+        for user_id, day, hours in locked:
+            daily_hours[(user_id, day)] += hours
+            weekly_hours[(user_id, week_start(day))] += hours
+        return daily_hours, weekly_hours
+
+    def _hours_errors(
+        self,
+        db: Session,
+        entries: List[Dict[str, Any]],
+        replaced: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[int, str]:
+        """
+        Verifica i limiti di ore giornaliere e settimanali (settimana ISO, lunedì-domenica)
+        sui totali bloccati da _lock_weeks e aggiorna il rollup con le entry accettate.
+        Le entry sono valutate nell'ordine dato: quelle accettate contano per le
+        successive. Per gli aggiornamenti `replaced` contiene, nella stessa
+        posizione, la versione salvata della entry, che viene sostituita solo
+        se la nuova è accettata.
+        Ritorna {posizione in entries: errore}.
+        """
+        weeks = {(entry["user_id"], week_start(entry["date"].date())) for entry in entries}
+        if not weeks:
+            return {}
+
+        daily_hours, weekly_hours = self._lock_weeks(db, weeks)
+
+        def add(entry: Dict[str, Any], sign: int) -> None:
+            day = entry["date"].date()
+            daily_hours[(entry["user_id"], day)] += sign * entry["hours"]
+            weekly_hours[(entry["user_id"], week_start(day))] += sign * entry["hours"]
+
+        errors = {}
+        added, removed = [], []
+        for position, entry in enumerate(entries):
+            previous = replaced[position] if replaced else None
+            if previous:
+                add(previous, -1)
+            day = entry["date"].date()
+            day_key = (entry["user_id"], day)
+            week_key = (entry["user_id"], week_start(day))
+            if daily_hours[day_key] + entry["hours"] > DAILY_HOURS_LIMIT:
+                errors[position] = (
+                    f"Il totale delle ore giornaliere non può superare {DAILY_HOURS_LIMIT}. "
+                    f"Ore già registrate il {day}: {daily_hours[day_key]}"
+                )
+            elif weekly_hours[week_key] + entry["hours"] > WEEKLY_HOURS_LIMIT:
+                errors[position] = (
+                    f"Il totale delle ore settimanali non può superare {WEEKLY_HOURS_LIMIT}. "
+                    f"Ore già registrate nella settimana del {week_key[1]}: {weekly_hours[week_key]}"
+                )
+            else:
+                add(entry, 1)
+                added.append(entry)
+                if previous:
+                    removed.append(previous)
+                continue
+            if previous:
+                add(previous, 1)
+
+        self._apply_daily_deltas(db, self._entry_deltas(added, removed))
+        return errors
 
     def create(self, db: Session, time_entry: TimeEntryCreate) -> TimeEntry:
-        # Verifica ore giornaliere
-        daily_hours = self.get_daily_hours(
-            db, 
-            time_entry.user_id,
-            time_entry.date.date()
+        errors = self._hours_errors(db, [time_entry.model_dump()])
+        if errors:
+            db.rollback()  # rilascia i lock sul rollup
+            raise HTTPException(status_code=400, detail=errors[0])
+        return super().create(db, time_entry)
+
+    def update(self, db: Session, id: int, obj_in: TimeEntryUpdate) -> Optional[TimeEntry]:
+        errors = self._bulk_update_errors(db, [{"id": id, **obj_in.model_dump(exclude_unset=True)}])
+        if errors:
+            db.rollback()  # rilascia i lock sul rollup
+            raise HTTPException(status_code=400, detail=errors[0])
+        return super().update(db, id, obj_in)
+
+    def delete(self, db: Session, id: int) -> bool:
+        if self._billed_ids(db, [id]):
+            raise HTTPException(status_code=400, detail="Time entry già fatturata")
+        stored = self._stored_entries(db, [id])
+        self._apply_daily_deltas(db, self._entry_deltas([], list(stored.values())))
+        return super().delete(db, id)
+
+    def _bulk_create_errors(self, db: Session, rows: List[Dict[str, Any]]) -> Dict[int, str]:
+        return self._hours_errors(db, rows)
+
+    def _billed_ids(self, db: Session, ids: List[int]) -> Set[int]:
+        """Entry collegate a un line item: data e ore non possono più cambiare"""
+        return set(db.scalars(
+            select(LineItemTimeEntry.time_entry_id)
+            .where(LineItemTimeEntry.time_entry_id.in_(ids))
+            .distinct()
+        ))
+
+    def _bulk_update_errors(self, db: Session, rows: List[Dict[str, Any]]) -> Dict[int, str]:
+        """
+        Per gli aggiornamenti che toccano data od ore: entry già fatturate e
+        limiti di ore sui valori risultanti
+        """
+        positions = [position for position, row in enumerate(rows) if row.keys() & {"date", "hours"}]
+        if not positions:
+            return {}
+        billed = self._billed_ids(db, [rows[position]["id"] for position in positions])
+        blocked = {position: "Time entry già fatturata" for position in positions if rows[position]["id"] in billed}
+        positions = [position for position in positions if position not in blocked]
+        stored = self._stored_entries(db, [rows[position]["id"] for position in positions])
+        checked = [
+            (position, {**stored[rows[position]["id"]], **rows[position]})
+            for position in positions
+            if rows[position]["id"] in stored
+        ]
+        errors = self._hours_errors(
+            db,
+            [entry for _, entry in checked],
+            replaced=[stored[entry["id"]] for _, entry in checked]
         )
-        if daily_hours + time_entry.hours > 8:
-            raise ValueError(
-                f"Il totale delle ore giornaliere non può superare 8. "
-                f"Ore già registrate oggi: {daily_hours}"
+        return {**blocked, **{checked[index][0]: error for index, error in errors.items()}}
+
+    def replace_week(
+        self,
+        db: Session,
+        user_id: int,
+        monday: date,
+        cells: List[WeekTimesheetCell]
+    ) -> Dict[str, Any]:
+        """
+        Sostituisce la settimana di un utente con la griglia progetto × giorno.
+
+        La griglia viene confrontata con le entry salvate: per ogni cella la prima
+        entry viene aggiornata e le altre eliminate, le celle nuove inserite e le
+        entry senza cella (o con 0 ore) eliminate. Inserimenti, aggiornamenti ed
+        eliminazioni sono tre statement set-based in un'unica transazione; i
+        limiti di ore sono verificati una volta sui totali della griglia.
+        Le entry già fatturate non possono essere modificate.
+        """
+        sunday = monday + timedelta(days=6)
+        grid: Dict[Tuple[int, date], WeekTimesheetCell] = {}
+        for cell in cells:
+            if not monday <= cell.date <= sunday:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Il giorno {cell.date} non appartiene alla settimana del {monday}"
+                )
+            if (cell.project_id, cell.date) in grid:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Cella duplicata: progetto {cell.project_id}, giorno {cell.date}"
+                )
+            grid[(cell.project_id, cell.date)] = cell
+
+        # Limiti sui totali finali: la griglia è l'intera settimana dell'utente
+        daily_totals: Dict[date, float] = defaultdict(float)
+        for cell in grid.values():
+            daily_totals[cell.date] += cell.hours
+        for day, hours in sorted(daily_totals.items()):
+            if hours > DAILY_HOURS_LIMIT:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Il totale delle ore giornaliere non può superare {DAILY_HOURS_LIMIT}. Ore il {day}: {hours}"
+                )
+        if sum(daily_totals.values()) > WEEKLY_HOURS_LIMIT:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Il totale delle ore settimanali non può superare {WEEKLY_HOURS_LIMIT}. Ore nella griglia: {sum(daily_totals.values())}"
             )
 
-        return super().create(db, time_entry)
\ No newline at end of file
+        locked_daily, _ = self._lock_weeks(db, {(user_id, monday)})
+
+        billed = select(LineItemTimeEntry.time_entry_id)\
+            .where(LineItemTimeEntry.time_entry_id == TimeEntry.id)\
+            .exists()
+        stored = db.query(
+            TimeEntry.id,
+            TimeEntry.project_id,
+            TimeEntry.entry_day,
+            TimeEntry.hours,
+            TimeEntry.description,
+            billed.label("billed")
+        ).filter(
+            TimeEntry.user_id == user_id,
+            TimeEntry.entry_day >= monday,
+            TimeEntry.entry_day <= sunday
+        ).order_by(TimeEntry.id).all()
+
+        existing: Dict[Tuple[int, date], List[Any]] = defaultdict(list)
+        for row in stored:
+            existing[(row.project_id, row.entry_day)].append(row)
+
+        to_insert, to_update, to_delete = [], [], []
+        for key in existing.keys() | grid.keys():
+            rows = existing.get(key, [])
+            cell = grid.get(key)
+            hours = cell.hours if cell else 0
+            description = cell.description if cell else None
+            current = sum(row.hours for row in rows)
+            if rows and current == hours and (description is None or all(row.description == description for row in rows)):
+                continue
+            if any(row.billed for row in rows):
+                db.rollback()  # rilascia i lock sul rollup
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Time entry già fatturata: progetto {key[0]}, giorno {key[1]}"
+                )
+            if not hours:
+                to_delete.extend(row.id for row in rows)
+            elif rows:
+                values = {"id": rows[0].id, "hours": hours}
+                if description is not None:
+                    values["description"] = description
+                to_update.append(values)
+                to_delete.extend(row.id for row in rows[1:])
+            else:
+                to_insert.append({
+                    "user_id": user_id,
+                    "project_id": key[0],
+                    "date": datetime.combine(key[1], time()),
+                    "hours": hours,
+                    "description": description
+                })
+
+        if to_insert:
+            db.execute(insert(TimeEntry), to_insert)
+        if to_update:
+            db.execute(update(TimeEntry), to_update)
+        if to_delete:
+            db.execute(delete(TimeEntry).where(TimeEntry.id.in_(to_delete)))
+
+        self._apply_daily_deltas(db, {
+            (user_id, day): daily_totals.get(day, 0) - locked_daily.get((user_id, day), 0)
+            for day in set(daily_totals) | {day for _, day in locked_daily}
+        })
+        db.commit()
+
+        entries = db.scalars(
+            select(TimeEntry)
+            .where(TimeEntry.user_id == user_id, TimeEntry.entry_day >= monday, TimeEntry.entry_day <= sunday)
+            .order_by(TimeEntry.entry_day, TimeEntry.project_id)
+            .execution_options(populate_existing=True)
+        ).all()
+        return {
+            "created": len(to_insert),
+            "updated": len(to_update),
+            "deleted": len(to_delete),
+            "entries": entries
+        }
+
+    def _bulk_delete_errors(self, db: Session, ids: List[int]) -> Dict[int, str]:
+        errors = {id: "Time entry già fatturata" for id in self._billed_ids(db, ids)}
+        removed = self._stored_entries(db, [id for id in set(ids) if id not in errors])
+        self._apply_daily_deltas(db, self._entry_deltas([], list(removed.values())))
+        return errors
+
+    def rebuild_daily_hours(
+        self,
+        db: Session,
+        user_ids: Optional[List[int]] = None,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None
+    ) -> int:
+        """
+        Ricalcola il rollup user_daily_hours da time_entries, per tutti gli
+        utenti o solo per quelli indicati, nei giorni [start_day, end_day).
+        Su PostgreSQL blocca le scritture sul rollup fino al commit.
+        Ritorna il numero di righe (utente, giorno) ricostruite.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("LOCK TABLE user_daily_hours IN SHARE ROW EXCLUSIVE MODE"))
+
+        def scope(user_column, day_column):
+            conditions = []
+            if user_ids:
+                conditions.append(user_column.in_(user_ids))
+            if start_day:
+                conditions.append(day_column >= start_day)
+            if end_day:
+                conditions.append(day_column < end_day)
+            return conditions
+
+        db.execute(delete(UserDailyHours).where(*scope(UserDailyHours.user_id, UserDailyHours.day)))
+        totals = select(TimeEntry.user_id, TimeEntry.entry_day, func.sum(TimeEntry.hours))\
+            .where(TimeEntry.user_id.is_not(None), *scope(TimeEntry.user_id, TimeEntry.entry_day))\
+            .group_by(TimeEntry.user_id, TimeEntry.entry_day)
+        result = db.execute(
+            insert(UserDailyHours).from_select(["user_id", "day", "hours"], totals)
+        )
+        db.commit()
+        return result.rowcount
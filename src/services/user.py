@@ -1,12 +1,16 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
+import logging
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session, selectinload
 from src.models.models import User, UserRole
 from src.schemas.user import UserCreate, UserUpdate
 from src.services.base import BaseService
-from src.auth.security import get_password_hash
+from src.auth.cache import principal_cache
+from src.services.capacity_index import capacity_index
 from fastapi.encoders import jsonable_encoder
 from fastapi import HTTPException
 
+logger = logging.getLogger(__name__)
+
 class UserService(BaseService[User, UserCreate, UserUpdate]):
     def __init__(self):
         super().__init__(User)
@@ -17,36 +21,42 @@ class UserService(BaseService[User, UserCreate, UserUpdate]):
     def get_user_with_projects(self, db: Session, user_id: int) -> Optional[User]:
         return db.query(self.model)\
             .filter(self.model.id == user_id)\
-            .options(joinedload(self.model.projects))\
+            .options(selectinload(self.model.projects))\
             .first()
             
-    def get_active_consultants(self, db: Session) -> List[User]:
-        return db.query(self.model)\
-            .filter(self.model.role == UserRole.CONSULTANT)\
-            .all()
+    def get_active_consultants(
+        self,
+        db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Tuple[List[User], Optional[str]]:
+        query = db.query(self.model)\
+            .filter(self.model.role == UserRole.CONSULTANT)
+        return self.paginate(query, cursor, limit)
     
-    def create(self, db: Session, user_in: UserCreate) -> User:
+    def create(self, db: Session, user_in: UserCreate, password_hash: str) -> User:
         """
-        Crea un nuovo utente con password hashata
+        Crea un nuovo utente con la password già hashata dal chiamante
+        (get_password_hash_async negli endpoint, per non bloccare l'event loop)
         """
         # Converti lo schema in dict ed elimina la password in chiaro
         user_data = user_in.model_dump(exclude={"password"})
-        
-        # Crea l'hash della password
-        user_data["password_hash"] = get_password_hash(user_in.password)
+        user_data["password_hash"] = password_hash
         
         # Crea l'utente con i dati modificati
         db_user = self.model(**user_data)
         db.add(db_user)
         db.commit()
         db.refresh(db_user)
+
+        capacity_index.add_user(db_user.id)
         return db_user
 
     def get(self, db: Session, id: int) -> Optional[User]:
         """Override del metodo get per aggiungere logging"""
         user = db.query(self.model).filter(self.model.id == id).first()
         if not user:
-            print(f"User {id} not found in database")  # Debug log
+            logger.debug("Utente %s non trovato", id)
         return user
 
     def update(self, db: Session, id: int, user_in: UserUpdate) -> Optional[User]:
@@ -82,5 +92,25 @@ class UserService(BaseService[User, UserCreate, UserUpdate]):
         db.add(db_obj)
         db.commit()
         db.refresh(db_obj)
+
+        # Il ruolo o l'email potrebbero essere cambiati: forza la rilettura del principal
+        principal_cache.invalidate(old_email)
+        principal_cache.invalidate(db_obj.email)
         
-        return db_obj
\ No newline at end of file
+        return db_obj
+
+    def delete(self, db: Session, id: int) -> bool:
+        """
+        Elimina un utente e lo rimuove dalla cache dei principal
+        """
+        db_obj = self.get(db, id)
+        if not db_obj:
+            return False
+
+        email = db_obj.email
+        db.delete(db_obj)
+        db.commit()
+
+        principal_cache.invalidate(email)
+        capacity_index.remove_user(id)
+        return True
\ No newline at end of file
@@ -0,0 +1,51 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+import src.database.database as database
+from src.api.api import app
+from src.auth.cache import principal_cache
+from src.models.models import Base
+from src.services.billing_rates import billing_rate_resolver
+from src.services.capacity_index import capacity_index
+
+@pytest.fixture
+def engine(tmp_path):
+    """Database SQLite su file, nuovo per ogni test, con un vero pool di connessioni"""
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'openpsa.db'}")
+    Base.metadata.create_all(test_engine)
+    original_engine = database.engine
+    database.engine = test_engine
+    database.SessionLocal.configure(bind=test_engine)
+    # Stesso file con aiosqlite per i router asincroni; NullPool perché le
+    # connessioni nascono nell'event loop di TestClient
+    database._async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'openpsa.db'}", poolclass=NullPool
+    )
+    database.AsyncSessionLocal.configure(bind=database._async_engine)
+    principal_cache.clear()
+    capacity_index.invalidate()
+    billing_rate_resolver.invalidate()
+    yield test_engine
+    database._async_engine = None
+    database.SessionLocal.configure(bind=original_engine)
+    database.engine = original_engine
+    test_engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    with database.SessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def client(engine):
+    return TestClient(app)
+
+@pytest.fixture
+def admin_headers(client):
+    user = {"email": "admin@example.com", "name": "Admin", "role": "ADMIN", "password": "password"}
+    assert client.post("/api/v1/auth/register", json=user).status_code == 200
+    response = client.post("/api/v1/auth/token", json={"email": user["email"], "password": user["password"]})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
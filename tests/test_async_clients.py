@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from sqlalchemy import event
+import src.auth.security as security
+import src.database.database as database
+from src.schemas.client import ClientUpdate
+from src.services.client import AsyncClientService
+
+def test_client_reads_use_async_session(client, admin_headers):
+    created = client.post("/api/v1/clients/", json={"name": "ACME"}, headers=admin_headers).json()
+
+    response = client.get(f"/api/v1/clients/{created['id']}", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["name"] == "ACME"
+
+    response = client.get("/api/v1/clients/", headers=admin_headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [created["id"]]
+
+    assert client.get("/api/v1/clients/999", headers=admin_headers).status_code == 404
+
+@pytest.mark.parametrize("auth_mode", ["database", "stateless"])
+def test_async_reads_do_not_hold_the_request_session(client, admin_headers, engine, monkeypatch, auth_mode):
+    monkeypatch.setattr(security, "AUTH_MODE", auth_mode)
+    created = client.post("/api/v1/clients/", json={"name": "ACME"}, headers=admin_headers).json()
+    get = AsyncClientService.get
+    checked_out = []
+
+    async def recording_get(self, db, id):
+        # Connessioni sincrone in uso durante la lettura asincrona
+        checked_out.append(engine.pool.checkedout())
+        return await get(self, db, id)
+
+    monkeypatch.setattr(AsyncClientService, "get", recording_get)
+    assert client.get(f"/api/v1/clients/{created['id']}", headers=admin_headers).status_code == 200
+    assert checked_out == [0]
+
+def test_async_update_is_a_single_returning_statement(client, admin_headers):
+    created = client.post("/api/v1/clients/", json={"name": "ACME"}, headers=admin_headers).json()
+    service = AsyncClientService()
+    statements = []
+
+    async def run():
+        sync_engine = database._async_engine.sync_engine
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(sync_engine, "before_cursor_execute", listener)
+        try:
+            async with database.AsyncSessionLocal() as db:
+                updated = await service.update(db, created["id"], ClientUpdate(contact_phone="123"))
+                missing = await service.update(db, 999, ClientUpdate(contact_phone="123"))
+                return updated, missing
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", listener)
+
+    updated, missing = asyncio.run(run())
+    assert updated.contact_phone == "123"
+    assert missing is None
+    assert len([s for s in statements if s.startswith("UPDATE")]) == 2
+    assert not [s for s in statements if s.startswith("SELECT")]
+
+def test_async_delete(client, admin_headers):
+    created = client.post("/api/v1/clients/", json={"name": "ACME"}, headers=admin_headers).json()
+    service = AsyncClientService()
+
+    async def run():
+        async with database.AsyncSessionLocal() as db:
+            return await service.delete(db, created["id"]), await service.delete(db, created["id"])
+
+    assert asyncio.run(run()) == (True, False)
+    assert client.get(f"/api/v1/clients/{created['id']}", headers=admin_headers).status_code == 404
@@ -0,0 +1,126 @@
+import base64
+import random
+from datetime import date, timedelta
+import numpy as np
+import pytest
+from src.models.models import (
+    BillingType, Project, ProjectStatus, ResourceAllocation, ResourceAllocationStatus, User, UserRole
+)
+from src.services.availability import (
+    allocation_curve, availability_curve, availability_matrix, peak_allocation
+)
+
+START = date(2024, 1, 1)
+
+def brute_force_curve(intervals, start_date: date, end_date: date) -> list:
+    """Allocazione giorno per giorno, riscandendo tutti gli intervalli"""
+    days = []
+    current_date = start_date
+    while current_date <= end_date:
+        days.append(sum(p for s, e, p in intervals if s <= current_date <= e))
+        current_date += timedelta(days=1)
+    return days
+
+def day(offset: int) -> date:
+    return START + timedelta(days=offset)
+
+@pytest.mark.parametrize("intervals", [
+    # sovrapposti
+    [(day(0), day(9), 0.5), (day(5), day(14), 0.3), (day(7), day(7), 0.2)],
+    # che si toccano: la fine di uno è il giorno prima dell'inizio dell'altro
+    [(day(0), day(4), 0.5), (day(5), day(9), 0.5)],
+    # stesso giorno di fine e di inizio
+    [(day(0), day(4), 0.5), (day(4), day(9), 0.5)],
+    # fuori dal periodo, prima, dopo e a cavallo degli estremi
+    [(day(-10), day(-1), 1.0), (day(30), day(40), 1.0), (day(-3), day(2), 0.1), (day(28), day(35), 0.2)],
+    # residui di floating point: 0.1 + 0.2 - 0.3
+    [(day(0), day(29), 0.1), (day(0), day(29), 0.2), (day(10), day(29), 0.7)],
+])
+def test_allocation_curve_matches_day_by_day_sum(intervals):
+    end_date = day(29)
+    expected = brute_force_curve(intervals, START, end_date)
+    curve = allocation_curve(intervals, START, end_date)
+    assert len(curve) == 30
+    assert np.allclose(curve, expected)
+
+    peak = max(expected)
+    peak_value, peak_day = peak_allocation(intervals, START, end_date)
+    assert peak_value == pytest.approx(peak)
+    if peak > 0:
+        assert peak_day == day(next(i for i, v in enumerate(expected) if v == pytest.approx(peak)))
+
+def test_allocation_curve_matches_day_by_day_sum_on_random_intervals():
+    rng = random.Random(7)
+    intervals = []
+    for _ in range(200):
+        start = day(rng.randrange(-30, 365))
+        intervals.append((start, start + timedelta(days=rng.randrange(0, 60)), rng.choice((0.1, 0.2, 0.25, 0.5))))
+    end_date = day(364)
+    assert np.allclose(allocation_curve(intervals, START, end_date), brute_force_curve(intervals, START, end_date))
+
+def test_empty_intervals_and_ranges():
+    assert allocation_curve([], START, day(2)).tolist() == [0, 0, 0]
+    assert availability_curve([], START, day(2)).tolist() == [1, 1, 1]
+    assert peak_allocation([], START, day(2)) == (0.0, START)
+    # un solo giorno
+    assert allocation_curve([(day(0), day(0), 0.4)], START, START).tolist() == [0.4]
+    with pytest.raises(ValueError):
+        allocation_curve([(day(0), day(0), 0.4)], START, day(-1))
+
+def test_availability_curve_is_never_negative():
+    intervals = [(day(0), day(3), 0.7), (day(2), day(5), 0.6)]
+    assert availability_curve(intervals, START, day(5)).tolist() == [0.3, 0.3, 0, 0, 0.4, 0.4]
+
+def test_availability_matrix_on_fixed_input():
+    rows = [
+        (0, day(0), day(1), 0.5),
+        (0, day(1), day(3), 0.5),
+        (2, day(-5), day(0), 1.0),
+        (2, day(3), day(10), 0.25),
+    ]
+    matrix = availability_matrix(rows, 3, START, day(3))
+    assert matrix.tolist() == [
+        [0.5, 0, 0.5, 0.5],
+        [1, 1, 1, 1],
+        [0, 1, 1, 0.75],
+    ]
+    # ogni riga coincide con la curva del singolo utente
+    for user in range(3):
+        intervals = [(s, e, p) for u, s, e, p in rows if u == user]
+        assert matrix[user].tolist() == availability_curve(intervals, START, day(3)).tolist()
+
+    assert availability_matrix([], 2, START, day(1)).tolist() == [[1, 1], [1, 1]]
+    with pytest.raises(ValueError):
+        availability_matrix(rows, 3, START, day(-1))
+
+def test_team_availability_endpoint(client, admin_headers, db):
+    db.add_all([
+        User(id=id, email=f"user{id}@example.com", name="User", password_hash="-", role=UserRole.CONSULTANT)
+        for id in (10, 11)
+    ])
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.flush()
+    db.add_all([
+        ResourceAllocation(user_id=10, project_id=1, start_date=day(0), end_date=day(1),
+                           allocation_percentage=0.5, status=ResourceAllocationStatus.ACTIVE),
+        ResourceAllocation(user_id=10, project_id=1, start_date=day(1), end_date=day(2),
+                           allocation_percentage=0.25, status=ResourceAllocationStatus.PLANNED),
+        # le allocazioni cancellate non contano
+        ResourceAllocation(user_id=11, project_id=1, start_date=day(0), end_date=day(2),
+                           allocation_percentage=1.0, status=ResourceAllocationStatus.CANCELLED),
+    ])
+    db.commit()
+
+    params = {"start_date": START.isoformat(), "end_date": day(2).isoformat(), "user_ids": [11, 10]}
+    response = client.get("/api/v1/allocations/availability", params=params, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["days"], body["user_ids"]) == (3, [10, 11])
+    assert body["values"] == [[50, 25, 75], [100, 100, 100]]
+
+    response = client.get("/api/v1/allocations/availability", params={**params, "encoding": "base64"},
+                          headers=admin_headers)
+    assert list(base64.b64decode(response.json()["values"])) == [50, 25, 75, 100, 100, 100]
+
+    params["end_date"] = day(-1).isoformat()
+    assert client.get("/api/v1/allocations/availability", params=params, headers=admin_headers).status_code == 400
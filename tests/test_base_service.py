@@ -0,0 +1,121 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import event
+import src.database.database as database
+from src.models.models import (
+    BillingRate, BillingType, Client, Project, ProjectStatus, ResourceAllocation,
+    ResourceAllocationStatus, User, UserRole
+)
+from src.schemas.client import ClientUpdate
+from src.schemas.resource_allocation import ResourceAllocationUpdate
+from src.services.async_base import AsyncBaseService
+from src.services.base import BaseService, requires_orm_delete, requires_orm_update
+
+class BillingRateUpdate(BaseModel):
+    rate: float
+
+@contextmanager
+def captured_statements(engine):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+def verbs(statements):
+    return [statement.split()[0] for statement in statements]
+
+@pytest.fixture
+def rows(db):
+    db.add(User(id=10, email="user@example.com", name="User", password_hash="-", role=UserRole.CONSULTANT))
+    db.add(Client(id=1, name="ACME"))
+    db.flush()
+    db.add(Project(id=1, client_id=1, name="Progetto", status=ProjectStatus.ACTIVE,
+                   billing_type=BillingType.TIME_AND_MATERIALS))
+    db.flush()
+    db.add(BillingRate(id=1, user_id=10, rate=100, start_date=date(2024, 1, 1)))
+    db.add(ResourceAllocation(id=1, user_id=10, project_id=1, start_date=date(2024, 1, 1), end_date=date(2024, 1, 31),
+                              allocation_percentage=0.5, status=ResourceAllocationStatus.ACTIVE))
+    db.commit()
+
+def test_orm_path_is_required_only_for_validators_and_managed_relationships():
+    assert requires_orm_update(ResourceAllocation, {"allocation_percentage", "role"})
+    assert not requires_orm_update(ResourceAllocation, {"role", "status"})
+    assert requires_orm_update(Project, {"end_date"})
+    assert not requires_orm_update(Project, {"name"})
+    # BillingRate ha solo relazioni many-to-one; Client e User hanno righe collegate
+    assert not requires_orm_delete(BillingRate)
+    assert requires_orm_delete(Client)
+    assert requires_orm_delete(User)
+
+def test_update_and_delete_use_a_single_returning_statement(engine, db, rows):
+    service = BaseService(BillingRate)
+    with captured_statements(engine) as statements:
+        updated = service.update(db, 1, BillingRateUpdate(rate=120))
+        missing = service.update(db, 999, BillingRateUpdate(rate=120))
+    assert (updated.id, updated.rate) == (1, 120)
+    assert missing is None
+    assert verbs(statements) == ["UPDATE", "UPDATE"]
+    assert all("RETURNING" in statement for statement in statements)
+
+    with captured_statements(engine) as statements:
+        assert service.delete(db, 1)
+        assert not service.delete(db, 1)
+    assert verbs(statements) == ["DELETE", "DELETE"]
+    db.expire_all()
+    assert db.get(BillingRate, 1) is None
+
+def test_update_runs_validators_on_the_orm_path(engine, db, rows):
+    service = BaseService(ResourceAllocation)
+    with captured_statements(engine) as statements:
+        assert service.update(db, 1, ResourceAllocationUpdate(role=None, status="PLANNED")).status.value == "PLANNED"
+    assert verbs(statements) == ["UPDATE"]
+
+    # Con un campo validato l'oggetto viene caricato e l'hook @validates gira
+    update = ResourceAllocationUpdate.model_construct(allocation_percentage=2)
+    with captured_statements(engine) as statements, pytest.raises(ValueError):
+        service.update(db, 1, update)
+    assert verbs(statements) == ["SELECT"]
+    db.rollback()
+    assert service.update(db, 1, ResourceAllocationUpdate(allocation_percentage=0.25)).allocation_percentage == 0.25
+    assert service.update(db, 999, ResourceAllocationUpdate(allocation_percentage=0.25)) is None
+
+def test_delete_goes_through_the_orm_for_managed_relationships(engine, db, rows):
+    with captured_statements(engine) as statements:
+        assert BaseService(Client).delete(db, 1)
+    # Cliente e progetti caricati, foreign key azzerate, poi il DELETE
+    assert verbs(statements)[:2] == ["SELECT", "SELECT"] and verbs(statements)[-1] == "DELETE"
+    db.expire_all()
+    assert db.get(Project, 1).client_id is None
+    assert not BaseService(Client).delete(db, 1)
+
+def test_dialects_without_returning_fall_back_to_the_orm(engine, db, rows, monkeypatch):
+    monkeypatch.setattr(engine.dialect, "update_returning", False)
+    monkeypatch.setattr(engine.dialect, "delete_returning", False)
+    service = BaseService(BillingRate)
+    with captured_statements(engine) as statements:
+        assert service.update(db, 1, BillingRateUpdate(rate=130)).rate == 130
+        assert service.delete(db, 1)
+    assert "RETURNING" not in " ".join(statements)
+    assert verbs(statements).count("SELECT") >= 2
+
+def test_async_service_takes_both_paths(engine, rows):
+    clients, rates = AsyncBaseService(Client), AsyncBaseService(BillingRate)
+
+    async def run():
+        async with database.AsyncSessionLocal() as db:
+            updated = await clients.update(db, 1, ClientUpdate(name="ACME S.p.A."))
+            client_deleted = await clients.delete(db, 1)
+            rate_deleted = await rates.delete(db, 1)
+            rate_missing = await rates.delete(db, 1)
+            return updated.name, client_deleted, rate_deleted, rate_missing
+
+    assert asyncio.run(run()) == ("ACME S.p.A.", True, True, False)
+    with database.SessionLocal() as db:
+        assert db.get(Project, 1).client_id is None
+        assert db.get(BillingRate, 1) is None
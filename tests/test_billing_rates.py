@@ -0,0 +1,41 @@
+from datetime import date
+from decimal import Decimal
+import src.database.database as database
+from src.models.models import BillingRate, BillingType, Project, ProjectStatus, User, UserRole
+from src.services.billing_rates import billing_rate_resolver
+
+DAY = date(2024, 5, 6)
+
+def current_rate() -> Decimal:
+    """Tariffa letta da un'altra sessione, come farebbe una richiesta concorrente"""
+    with database.SessionLocal() as other:
+        return billing_rate_resolver.rate(other, 1, 1, DAY)
+
+def setup(db):
+    db.add(User(id=1, email="user@example.com", name="User", password_hash="-",
+                role=UserRole.CONSULTANT, hourly_rate=100))
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.commit()
+
+def test_rate_cache_is_invalidated_after_commit(db):
+    setup(db)
+    assert current_rate() == Decimal("100.00")
+
+    db.add(BillingRate(user_id=1, project_id=1, rate=150, start_date=DAY))
+    db.flush()
+    # Rebuild concorrente prima del commit: vede ancora la tariffa committata
+    assert current_rate() == Decimal("100.00")
+    db.commit()
+    assert current_rate() == Decimal("150.00")
+
+def test_rollback_keeps_the_rate_cache(db):
+    setup(db)
+    assert current_rate() == Decimal("100.00")
+    tables, _ = billing_rate_resolver.ensure_built(db)
+
+    db.add(BillingRate(user_id=1, project_id=1, rate=150, start_date=DAY))
+    db.flush()
+    db.rollback()
+    assert billing_rate_resolver.ensure_built(db)[0] is tables
+    db.commit()
+    assert billing_rate_resolver.ensure_built(db)[0] is tables
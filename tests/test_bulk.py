@@ -0,0 +1,57 @@
+from datetime import date
+from src.models.models import (
+    BillingRate, BillingType, Client, Project, ProjectStatus, ProjectUser, User, UserRole
+)
+from src.services.base import BaseService
+
+def test_bulk_delete_reports_repeated_ids_once(client, admin_headers):
+    created = client.post("/api/v1/clients/", json={"name": "ACME"}, headers=admin_headers).json()
+
+    response = client.request(
+        "DELETE", "/api/v1/clients/bulk",
+        json={"ids": [created["id"], 999, created["id"]]}, headers=admin_headers
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (1, 1)
+    assert [(r["index"], r["id"], r["success"]) for r in body["results"]] == [
+        (0, created["id"], True),
+        (1, 999, False),
+    ]
+
+def test_bulk_delete_blocks_projects_with_dependents(client, admin_headers, db):
+    db.add(Client(id=1, name="ACME"))
+    db.add_all([
+        Project(id=id, client_id=1, name=f"Progetto {id}", status=ProjectStatus.ACTIVE,
+                billing_type=BillingType.TIME_AND_MATERIALS)
+        for id in (1, 2, 3)
+    ])
+    db.flush()
+    db.add(BillingRate(project_id=1, rate=100, start_date=date(2024, 1, 1)))
+    db.add(ProjectUser(project_id=2, user_id=1))
+    db.commit()
+
+    response = client.request("DELETE", "/api/v1/projects/bulk", json={"ids": [1, 2, 3]}, headers=admin_headers)
+    assert response.status_code == 200
+    results = {r["id"]: r for r in response.json()["results"]}
+    assert results[1]["error"] == "Impossibile eliminare il progetto: esistono tariffe associate"
+    assert results[2]["error"] == "Impossibile eliminare il progetto: esistono utenti assegnati"
+    assert results[3]["success"]
+
+    db.expire_all()
+    assert [project.id for project in db.query(Project).order_by(Project.id)] == [1, 2]
+    assert db.query(BillingRate.project_id).scalar() == 1
+    assert db.query(ProjectUser.project_id).scalar() == 2
+
+def test_default_bulk_delete_blocks_rows_with_dependents(db):
+    db.add_all([
+        User(id=id, email=f"user{id}@example.com", name="User", password_hash="-", role=UserRole.CONSULTANT)
+        for id in (1, 2)
+    ])
+    db.flush()
+    db.add(BillingRate(user_id=1, rate=100, start_date=date(2024, 1, 1)))
+    db.commit()
+
+    summary = BaseService(User).bulk_delete(db, [1, 2])
+    assert [(r["id"], r["success"]) for r in summary["results"]] == [(1, False), (2, True)]
+    assert summary["results"][0]["error"] == "Impossibile eliminare: esistono righe collegate in billing_rates"
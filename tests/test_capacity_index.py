@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+from src.models.models import (
+    BillingType, ConsultantRole, Project, ProjectStatus, ResourceAllocation,
+    ResourceAllocationStatus, User, UserRole
+)
+from src.services.capacity_index import CapacityIndex, UserTimeline
+
+START = date(2024, 1, 1)
+
+def day(offset: int) -> date:
+    return START + timedelta(days=offset)
+
+def ordinal(offset: int) -> int:
+    return day(offset).toordinal()
+
+def test_timeline_peak_at_interval_edges():
+    timeline = UserTimeline()
+    assert timeline.peak(ordinal(0), ordinal(10)) == 0.0
+    # [giorno 2, giorno 4] e [giorno 5, giorno 6]: si toccano senza sovrapporsi
+    timeline.set(1, ordinal(2), ordinal(5), 0.5)
+    timeline.set(2, ordinal(5), ordinal(7), 0.25)
+
+    assert timeline.peak(ordinal(0), ordinal(2)) == 0.0    # fino al giorno prima dell'inizio
+    assert timeline.peak(ordinal(0), ordinal(3)) == 0.5    # compreso il giorno di inizio
+    assert timeline.peak(ordinal(4), ordinal(5)) == 0.5    # ultimo giorno del primo
+    assert timeline.peak(ordinal(5), ordinal(6)) == 0.25   # primo giorno del secondo
+    assert timeline.peak(ordinal(7), ordinal(9)) == 0.0    # dal giorno dopo la fine
+    assert timeline.peak(ordinal(-5), ordinal(20)) == 0.5
+
+    timeline.set(3, ordinal(4), ordinal(6), 0.5)
+    assert timeline.peak(ordinal(4), ordinal(5)) == 1.0
+    assert timeline.peak(ordinal(5), ordinal(6)) == 0.75
+
+    timeline.discard(3)
+    timeline.discard(3)  # già rimossa
+    assert timeline.peak(ordinal(4), ordinal(6)) == 0.5
+    timeline.discard(1)
+    timeline.discard(2)
+    assert timeline.peak(ordinal(-5), ordinal(20)) == 0.0
+
+def allocation(id, user_id, start, end, percentage, status=ResourceAllocationStatus.ACTIVE, role=None):
+    return SimpleNamespace(id=id, user_id=user_id, start_date=start, end_date=end,
+                           allocation_percentage=percentage, status=status, role=role)
+
+def test_capacity_index_tracks_inserts_updates_and_removals(db):
+    db.add_all([
+        User(id=id, email=f"user{id}@example.com", name="User", password_hash="-", role=UserRole.CONSULTANT)
+        for id in (10, 11)
+    ])
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.flush()
+    db.add_all([
+        ResourceAllocation(id=1, user_id=10, project_id=1, start_date=day(0), end_date=day(4),
+                           allocation_percentage=0.5, status=ResourceAllocationStatus.ACTIVE,
+                           role=ConsultantRole.SENIOR),
+        ResourceAllocation(id=2, user_id=11, project_id=1, start_date=day(3), end_date=day(3),
+                           allocation_percentage=1.0, status=ResourceAllocationStatus.PLANNED),
+        ResourceAllocation(id=3, user_id=11, project_id=1, start_date=day(0), end_date=day(9),
+                           allocation_percentage=1.0, status=ResourceAllocationStatus.CANCELLED),
+    ])
+    db.commit()
+
+    index = CapacityIndex(ttl_seconds=300)
+    # prima della costruzione le scritture vengono ignorate: le legge il primo build
+    index.apply(allocation(9, 10, day(0), day(9), 1.0))
+
+    assert index.search(db, day(0), day(2), 0.5) == [(11, 1.0), (10, 0.5)]
+    assert index.search(db, day(3), day(3), 0.5) == [(10, 0.5)]
+    assert index.search(db, day(4), day(4), 0.6) == [(11, 1.0)]
+    assert index.search(db, day(5), day(9), 1.0) == [(10, 1.0), (11, 1.0)]
+    assert index.search(db, day(0), day(9), 0.0, role=ConsultantRole.SENIOR) == [(10, 0.5)]
+
+    # inserimento, spostamento su un altro utente, cancellazione, eliminazione
+    index.apply(allocation(4, 10, day(5), day(5), 0.3))
+    assert index.search(db, day(5), day(5), 0.0) == [(11, 1.0), (10, 0.7)]
+    index.apply(allocation(4, 11, day(5), day(5), 0.3))
+    assert index.search(db, day(5), day(5), 0.0) == [(10, 1.0), (11, 0.7)]
+    index.apply(allocation(4, 11, day(5), day(5), 0.3, status=ResourceAllocationStatus.CANCELLED))
+    assert index.search(db, day(5), day(5), 0.0) == [(10, 1.0), (11, 1.0)]
+    index.discard(2)
+    assert index.search(db, day(3), day(3), 1.0) == [(11, 1.0)]
+
+    index.add_user(12)
+    assert index.search(db, day(0), day(0), 1.0) == [(11, 1.0), (12, 1.0)]
+    index.remove_user(10)
+    assert index.search(db, day(0), day(9), 0.0, role=ConsultantRole.SENIOR) == []
+
+    # il rebuild rilegge il database
+    index.invalidate()
+    assert index.search(db, day(3), day(3), 0.0) == [(10, 0.5), (11, 0.0)]
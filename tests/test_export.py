@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+import pytest
+from src.models.models import BillingType, Project, ProjectStatus, TimeEntry, User, UserRole
+from src.services.export import ExportService
+
+URL = "/api/v1/time-entries/export"
+HEADER = ["id", "date", "user_id", "user_email", "project_id", "project_name", "hours", "description"]
+
+@pytest.fixture
+def entries(db):
+    db.add_all([
+        User(id=10, email="anna@example.com", name="Anna", password_hash="-", role=UserRole.CONSULTANT),
+        User(id=11, email="bruno@example.com", name="Bruno", password_hash="-", role=UserRole.CONSULTANT),
+    ])
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.flush()
+    # Inserite fuori ordine: l'export è ordinato per data e id
+    db.add_all([
+        TimeEntry(id=1, user_id=10, project_id=1, date=datetime(2024, 5, 7, 9), hours=2, description="revisione, bozza"),
+        TimeEntry(id=2, user_id=11, project_id=1, date=datetime(2024, 5, 6, 9), hours=4),
+        TimeEntry(id=3, user_id=10, project_id=1, date=datetime(2024, 5, 6, 9), hours=1.5, description="analisi"),
+        TimeEntry(id=4, user_id=10, project_id=1, date=datetime(2024, 5, 31, 23, 30), hours=1),
+        TimeEntry(id=5, user_id=10, project_id=1, date=datetime(2024, 6, 1, 9), hours=3),
+    ])
+    db.commit()
+
+def test_csv_export_streams_header_and_rows(client, admin_headers, entries):
+    response = client.get(URL, params={"format": "csv"}, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="time_entries.csv"'
+
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == HEADER
+    assert rows[1:] == [
+        ["2", "2024-05-06 09:00:00", "11", "bruno@example.com", "1", "Progetto", "4.0", ""],
+        ["3", "2024-05-06 09:00:00", "10", "anna@example.com", "1", "Progetto", "1.5", "analisi"],
+        ["1", "2024-05-07 09:00:00", "10", "anna@example.com", "1", "Progetto", "2.0", "revisione, bozza"],
+        ["4", "2024-05-31 23:30:00", "10", "anna@example.com", "1", "Progetto", "1.0", ""],
+        ["5", "2024-06-01 09:00:00", "10", "anna@example.com", "1", "Progetto", "3.0", ""],
+    ]
+
+    # Filtri per utente e per giorno (estremi inclusi), intestazione anche senza righe
+    response = client.get(URL, params={"user_id": 10, "start_date": "2024-05-07", "end_date": "2024-05-31"},
+                          headers=admin_headers)
+    assert [row[0] for row in csv.reader(io.StringIO(response.text))] == ["id", "1", "4"]
+    response = client.get(URL, params={"start_date": "2025-01-01"}, headers=admin_headers)
+    assert list(csv.reader(io.StringIO(response.text))) == [HEADER]
+
+def test_ndjson_export_has_one_object_per_row(client, admin_headers, entries):
+    response = client.get(URL, params={"format": "ndjson", "user_id": 11}, headers=admin_headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == [{
+        "id": 2, "date": "2024-05-06T09:00:00", "user_id": 11, "user_email": "bruno@example.com",
+        "project_id": 1, "project_name": "Progetto", "hours": 4.0, "description": None
+    }]
+
+def test_export_reads_in_batches(entries):
+    service = ExportService()
+    batches = list(service.time_entry_batches(batch_size=2))
+    assert [[row.id for row in batch] for batch in batches] == [[2, 3], [1, 4], [5]]
+    # Un blocco di CSV per blocco di righe, intestazione nel primo
+    chunks = list(service.encode("csv", iter(batches)))
+    assert len(chunks) == 3
+    assert chunks[0].decode().splitlines()[0] == ",".join(HEADER)
+
+def test_parquet_export_round_trips(client, admin_headers, entries):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get(URL, params={"format": "parquet", "project_id": 1}, headers=admin_headers)
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column_names == HEADER
+    assert table.column("id").to_pylist() == [2, 3, 1, 4, 5]
+    assert table.column("hours").to_pylist() == [4.0, 1.5, 2.0, 1.0, 3.0]
@@ -0,0 +1,60 @@
+import csv
+import io
+from datetime import date
+import pytest
+from src.models.models import BillingType, Project, ProjectStatus, TimeEntry, User, UserDailyHours, UserRole
+from src.services.importer import ImportService
+
+CSV = (
+    "user_email,project_name,date,hours,description\n"
+    "user@example.com,Progetto,2024-05-06T09:00:00,4,ok\n"
+    "user@example.com,Progetto,2024-05-06T14:00:00,abc,ore non numeriche\n"
+    "user@example.com,Progetto,2024-05-07T09:00:00,3,troppe,colonne\n"
+    "user@example.com,Progetto\n"
+    "nobody@example.com,Progetto,2024-05-07T09:00:00,1,\n"
+    "user@example.com,Progetto,2024-05-08T09:00:00,2,\"descrizione, con virgola\"\n"
+)
+
+REJECTS = [
+    (3, "hours: Input should be a valid number, unable to parse string as a number"),
+    (4, "CSV non valido: 6 colonne invece di 5"),
+    (5, "CSV non valido: 2 colonne invece di 5"),
+    (6, "user_email: 'nobody@example.com' non trovato"),
+]
+
+@pytest.fixture
+def consultant(db):
+    db.add(User(id=10, email="user@example.com", name="User", password_hash="-", role=UserRole.CONSULTANT))
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.commit()
+    return 10
+
+def test_import_skips_malformed_rows(client, admin_headers, db, consultant):
+    response = client.post(
+        "/api/v1/import/time_entries",
+        files={"file": ("entries.csv", CSV.encode(), "text/csv")},
+        headers=admin_headers
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["processed"], body["imported"], body["rejected"]) == (6, 2, 4)
+    assert [(r["line"], r["error"]) for r in body["rejects"]] == REJECTS
+
+    assert db.query(TimeEntry.entry_day, TimeEntry.hours, TimeEntry.description).order_by(TimeEntry.id).all() == [
+        (date(2024, 5, 6), 4, "ok"),
+        (date(2024, 5, 8), 2, "descrizione, con virgola"),
+    ]
+    # Il rollup delle ore viene ricostruito per il periodo importato
+    assert db.query(UserDailyHours.day, UserDailyHours.hours).order_by(UserDailyHours.day).all() == [
+        (date(2024, 5, 6), 4),
+        (date(2024, 5, 8), 2),
+    ]
+
+def test_import_writes_rejected_rows_with_line_and_error(db, consultant):
+    rejects = io.StringIO()
+    ImportService().import_stream(db, "time_entries", io.StringIO(CSV), "csv", reject_stream=rejects)
+
+    rows = list(csv.DictReader(io.StringIO(rejects.getvalue())))
+    assert [(int(row["line"]), row["error"]) for row in rows] == REJECTS
+    assert rows[1]["description"] == "troppe"
+    assert rows[2]["date"] == ""
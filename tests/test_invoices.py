@@ -0,0 +1,224 @@
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+import src.api.endpoints.invoices as invoice_endpoints
+from fastapi import HTTPException
+from sqlalchemy import event
+from src.models.models import (
+    BillingType, Client, Invoice, InvoiceLineItem, LineItemTimeEntry, Project,
+    ProjectStatus, TimeEntry, User, UserRole
+)
+from src.schemas.invoice import InvoiceCreate, InvoiceLineItemBase
+from src.services.invoice import InvoiceService
+from src.services.invoice_batch import InvoiceBatchService
+from src.services.line_item import LineItemService
+
+@pytest.fixture
+def project(db):
+    db.add(Client(id=1, name="ACME"))
+    db.add(Project(id=1, client_id=1, name="Progetto", status=ProjectStatus.ACTIVE,
+                   billing_type=BillingType.TIME_AND_MATERIALS))
+    db.commit()
+    return 1
+
+def test_invoice_line_items_are_inserted_with_one_statement(engine, db, project):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        invoice = InvoiceService().create(db, InvoiceCreate(
+            project_id=project, invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30),
+            line_items=[
+                InvoiceLineItemBase(description=f"Riga {index}", quantity=index, rate=Decimal("12.50"))
+                for index in range(1, 6)
+            ]
+        ))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    inserts = [statement for statement in statements if statement.startswith("INSERT INTO invoice_line_items")]
+    # Un solo INSERT multi-riga dove il dialetto restituisce le righe nell'ordine
+    # dei parametri (PostgreSQL); su SQLite SQLAlchemy ripiega su un INSERT per riga
+    batched = engine.dialect.name == "postgresql"
+    assert len(inserts) == (1 if batched else 5) and all("RETURNING" in statement for statement in inserts)
+    assert not any(statement.startswith("SELECT") for statement in statements)
+    # Righe restituite nell'ordine della richiesta, con amount = quantity × rate
+    assert [(item.description, item.amount) for item in invoice.line_items] == [
+        (f"Riga {index}", Decimal("12.50") * index) for index in range(1, 6)
+    ]
+    assert (invoice.amount, invoice.line_count, invoice.hours) == (Decimal("187.50"), 5, Decimal("15.00"))
+
+    with pytest.raises(HTTPException) as error:
+        InvoiceService().create(db, InvoiceCreate(
+            project_id=project, invoice_number=invoice.invoice_number,
+            invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30), line_items=[]
+        ))
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        for _ in range(2):
+            InvoiceService().create(db, InvoiceCreate(
+                project_id=project, invoice_number="EXT-1",
+                invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30), line_items=[]
+            ))
+    assert error.value.detail == "Numero fattura 'EXT-1' già utilizzato"
+
+def test_batch_line_items_update_the_invoice_or_return_404(client, admin_headers, db, project):
+    invoice = InvoiceService().create(db, InvoiceCreate(
+        project_id=project, invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30),
+        line_items=[InvoiceLineItemBase(description="Consulenza", quantity=8, rate=100)]
+    ))
+
+    response = client.post(f"/api/v1/line-items/invoice/{invoice.id}/items", json=[
+        {"description": "Analisi", "quantity": 2, "rate": 50},
+        {"description": "Trasferta", "quantity": 1, "rate": 120.5},
+    ], headers=admin_headers)
+    assert response.status_code == 200
+    assert [item["description"] for item in response.json()] == ["Analisi", "Trasferta"]
+    db.expire_all()
+    stored = db.get(Invoice, invoice.id)
+    assert (stored.amount, stored.line_count, stored.hours) == (Decimal("1020.50"), 3, Decimal("11.00"))
+
+    response = client.post("/api/v1/line-items/invoice/999/items", json=[
+        {"description": "Analisi", "quantity": 2, "rate": 50},
+    ], headers=admin_headers)
+    assert response.status_code == 404
+    assert db.query(InvoiceLineItem).count() == 3
+
+def test_line_item_update_rounds_quantity_and_rate_to_cents(db, project):
+    invoice = InvoiceService().create(db, InvoiceCreate(
+        project_id=project, invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30),
+        line_items=[InvoiceLineItemBase(description="Consulenza", quantity=8, rate=100)]
+    ))
+    line_item = invoice.line_items[0]
+
+    updated = LineItemService().update(db, line_item.id, InvoiceLineItemBase(
+        description="Consulenza", quantity=Decimal("2.345"), rate=Decimal("10.555")
+    ))
+    assert (updated.quantity, updated.rate, updated.amount) == (Decimal("2.34"), Decimal("10.56"), Decimal("24.71"))
+
+    db.expire_all()
+    stored = db.get(Invoice, invoice.id)
+    assert (stored.amount, stored.hours) == (Decimal("24.71"), Decimal("2.34"))
+
+def test_deleting_a_generated_invoice_makes_its_entries_billable_again(client, admin_headers, db, project):
+    db.add(User(id=10, email="consultant@example.com", name="Consultant", password_hash="-",
+                role=UserRole.CONSULTANT, hourly_rate=100))
+    db.flush()
+    db.add_all([
+        TimeEntry(user_id=10, project_id=project, date=datetime(2024, 5, day, 9), hours=4)
+        for day in (6, 7)
+    ])
+    db.commit()
+    request = {
+        "project_id": project, "period_start": "2024-05-01", "period_end": "2024-05-31",
+        "invoice_date": "2024-05-31", "due_date": "2024-06-30"
+    }
+
+    first = client.post("/api/v1/invoices/generate", json=request, headers=admin_headers)
+    assert first.status_code == 200, first.text
+    assert client.delete(f"/api/v1/invoices/{first.json()['id']}", headers=admin_headers).status_code == 200
+    assert db.query(InvoiceLineItem).count() == 0
+    assert db.query(LineItemTimeEntry).count() == 0
+
+    second = client.post("/api/v1/invoices/generate", json=request, headers=admin_headers)
+    assert second.status_code == 200, second.text
+    assert Decimal(str(second.json()["amount"])) == Decimal("800.00")
+
+def test_batch_skips_projects_with_nothing_to_invoice(db, project):
+    db.add(Project(id=2, client_id=1, name="Senza ore", status=ProjectStatus.ACTIVE,
+                   billing_type=BillingType.TIME_AND_MATERIALS))
+    db.add(User(id=10, email="consultant@example.com", name="Consultant", password_hash="-",
+                role=UserRole.CONSULTANT, hourly_rate=100))
+    db.flush()
+    db.add(TimeEntry(user_id=10, project_id=project, date=datetime(2024, 5, 6, 9), hours=4))
+    db.commit()
+    service = InvoiceBatchService()
+    job = service.create_job(db, period_start=date(2024, 5, 1), period_end=date(2024, 5, 31),
+                             invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30))
+
+    summary = service.run_job(job.id, workers=1)
+    assert (summary["invoiced"], summary["skipped"], summary["failed"]) == (1, 1, 0)
+
+def create_invoice(db, project, invoice_number=None):
+    return InvoiceService().create(db, InvoiceCreate(
+        project_id=project, invoice_number=invoice_number,
+        invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30),
+        line_items=[InvoiceLineItemBase(description="Consulenza", quantity=1, rate=100)]
+    ))
+
+def test_manual_invoice_number_must_be_the_next_one(db, project):
+    assert [create_invoice(db, project).invoice_number for _ in range(2)] == ["2024/001", "2024/002"]
+
+    with pytest.raises(HTTPException) as error:
+        create_invoice(db, project, "2024/010")
+    assert error.value.status_code == 400
+    assert "2024/003" in error.value.detail
+
+    assert create_invoice(db, project, "2024/003").invoice_number == "2024/003"
+    assert create_invoice(db, project, "IMPORT-7").invoice_number == "IMPORT-7"
+    assert create_invoice(db, project).invoice_number == "2024/004"
+
+def test_only_the_last_numbered_invoice_can_be_deleted(db, project):
+    first, second = create_invoice(db, project), create_invoice(db, project)
+    service = InvoiceService()
+
+    with pytest.raises(HTTPException) as error:
+        service.delete(db, first.id)
+    assert error.value.status_code == 400
+    assert db.get(Invoice, first.id) is not None
+
+    assert service.delete(db, second.id)
+    # Il numero eliminato torna al contatore: la sequenza resta senza buchi
+    assert create_invoice(db, project).invoice_number == second.invoice_number
+
+def test_generated_line_items_cannot_be_edited_or_deleted(client, admin_headers, db, project):
+    db.add(User(id=10, email="consultant@example.com", name="Consultant", password_hash="-",
+                role=UserRole.CONSULTANT, hourly_rate=100))
+    db.flush()
+    db.add(TimeEntry(user_id=10, project_id=project, date=datetime(2024, 5, 6, 9), hours=4))
+    db.commit()
+    invoice = client.post("/api/v1/invoices/generate", headers=admin_headers, json={
+        "project_id": project, "period_start": "2024-05-01", "period_end": "2024-05-31",
+        "invoice_date": "2024-05-31", "due_date": "2024-06-30"
+    }).json()
+    line_item_id = db.query(InvoiceLineItem.id).filter(InvoiceLineItem.invoice_id == invoice["id"]).scalar()
+
+    response = client.put(f"/api/v1/line-items/items/{line_item_id}", headers=admin_headers,
+                          json={"description": "Consulenza", "quantity": "1", "rate": "100"})
+    assert response.status_code == 400
+    assert client.delete(f"/api/v1/line-items/items/{line_item_id}", headers=admin_headers).status_code == 400
+
+    db.expire_all()
+    assert db.query(LineItemTimeEntry).count() == 1
+    assert (db.get(Invoice, invoice["id"]).amount, db.get(Invoice, invoice["id"]).hours) == (Decimal("400.00"), Decimal("4.00"))
+
+@pytest.mark.parametrize("resume", [False, True])
+def test_batch_endpoints_release_the_request_session_before_the_job(
+    client, admin_headers, db, engine, project, monkeypatch, resume
+):
+    run_job = invoice_endpoints.batch_service.run_job
+    checked_out = []
+
+    def recording_run_job(job_id, *args, **kwargs):
+        # Connessioni in uso all'avvio del job: la sessione della richiesta è chiusa
+        checked_out.append(engine.pool.checkedout())
+        return run_job(job_id, *args, **kwargs)
+
+    monkeypatch.setattr(invoice_endpoints.batch_service, "run_job", recording_run_job)
+    period = {"period_start": "2024-05-01", "period_end": "2024-05-31",
+              "invoice_date": "2024-05-31", "due_date": "2024-06-30"}
+    if resume:
+        job = invoice_endpoints.batch_service.create_job(
+            db, **{key: date.fromisoformat(value) for key, value in period.items()}
+        )
+        db.close()  # la connessione del test non conta tra quelle della richiesta
+        response = client.post(f"/api/v1/invoices/batch/{job.id}/resume", headers=admin_headers)
+    else:
+        response = client.post("/api/v1/invoices/batch", json=period, headers=admin_headers)
+
+    assert response.status_code == 202, response.text
+    assert response.json()["status"] == "PENDING"
+    assert [item["project_id"] for item in response.json()["items"]] == [project]
+    assert checked_out == [0]
+    job = client.get(f"/api/v1/invoices/batch/{response.json()['id']}", headers=admin_headers).json()
+    assert job["status"] == "COMPLETED"
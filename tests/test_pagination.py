@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from src.models.models import BillingType, Project, ProjectStatus, TimeEntry, User, UserRole
+from src.services.pagination import decode_cursor, encode_cursor
+from src.services.time_entry import TimeEntryService
+
+@pytest.fixture
+def entries(db):
+    db.add(User(id=10, email="user@example.com", name="User", password_hash="-", role=UserRole.CONSULTANT))
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.flush()
+    # Tre coppie di entry con la stessa data: l'id risolve i pari merito
+    dates = [datetime(2024, 5, 6, 9), datetime(2024, 5, 7, 9), datetime(2024, 5, 6, 9),
+             datetime(2024, 5, 8, 9), datetime(2024, 5, 7, 9), datetime(2024, 5, 8, 9), datetime(2024, 5, 9, 9)]
+    db.add_all([
+        TimeEntry(id=id, user_id=10, project_id=1, date=when, hours=1)
+        for id, when in enumerate(dates, start=1)
+    ])
+    db.commit()
+    return [id for _, id in sorted((when, id) for id, when in enumerate(dates, start=1))]
+
+def tampered(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def test_cursor_round_trips_typed_values():
+    columns = [TimeEntry.date, TimeEntry.id]
+    values = [datetime(2024, 5, 6, 9, 30), 42]
+    assert decode_cursor(encode_cursor(values), columns) == values
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 10])
+def test_pages_cover_every_row_once_in_key_order(client, admin_headers, entries, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/v1/time-entries/user/10", params=params, headers=admin_headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert 0 < len(page["items"]) <= limit
+        ids.extend(item["id"] for item in page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == entries
+    # L'ultima pagina non ha cursore, anche quando è piena
+    assert pages == -(-len(entries) // limit)
+
+def test_last_page_and_empty_results(db, entries):
+    service = TimeEntryService()
+    items, cursor = service.paginate(db.query(TimeEntry), limit=len(entries))
+    assert [item.id for item in items] == entries and cursor is None
+
+    # Cursore sull'ultima riga: pagina vuota
+    last = db.get(TimeEntry, entries[-1])
+    items, cursor = service.paginate(db.query(TimeEntry), cursor=encode_cursor([last.date, last.id]))
+    assert (items, cursor) == ([], None)
+
+@pytest.mark.parametrize("cursor", [
+    "non-base64!",
+    tampered({"date": "2024-05-06T09:00:00", "id": 1}),   # non è una lista
+    tampered(["2024-05-06T09:00:00"]),                     # valori mancanti
+    tampered(["2024-05-06T09:00:00", 1, 2]),               # valori in più
+    tampered(["ieri", 1]),                                 # data non valida
+    tampered(["2024-05-06T09:00:00", "uno"]),              # id non numerico
+    tampered([[2024, 5, 6], 1]),                           # tipo errato
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),        # non UTF-8
+])
+def test_tampered_cursor_is_rejected(client, admin_headers, entries, cursor):
+    response = client.get("/api/v1/time-entries/user/10", params={"cursor": cursor}, headers=admin_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursore di paginazione non valido"
+
+def test_tampered_cursor_raises_in_the_service(db, entries):
+    with pytest.raises(HTTPException) as error:
+        TimeEntryService().paginate(db.query(TimeEntry), cursor=tampered([None, 1]))
+    assert error.value.status_code == 400
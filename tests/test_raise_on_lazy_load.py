@@ -0,0 +1,41 @@
+from datetime import date
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+import src.database.database as database
+from src.models.models import BillingType, Client, Invoice, InvoiceLineItem, Project, ProjectStatus
+from src.schemas.invoice import InvoiceCreate, InvoiceLineItemBase
+from src.services.client import ClientService
+from src.services.invoice import InvoiceService
+from src.services.project import ProjectService
+
+@pytest.fixture
+def raise_on_lazy_load(engine):
+    database.enable_raise_on_lazy_load(database.SessionLocal)
+    yield
+    event.remove(database.SessionLocal, "do_orm_execute", database._raise_on_lazy_load)
+
+def test_delete_paths_with_raise_on_lazy_load(db, raise_on_lazy_load):
+    db.add(Client(id=1, name="ACME"))
+    db.add(Project(id=1, client_id=1, name="Progetto", status=ProjectStatus.ACTIVE,
+                   billing_type=BillingType.TIME_AND_MATERIALS))
+    db.commit()
+    invoice = InvoiceService().create(db, InvoiceCreate(
+        project_id=1, invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30),
+        line_items=[InvoiceLineItemBase(description="Consulenza", quantity=8, rate=100)]
+    ))
+
+    with database.SessionLocal() as session:
+        # Il flag è attivo: una relazione non caricata non si legge in modo lazy
+        with pytest.raises(InvalidRequestError):
+            session.get(Project, 1).invoices
+
+    with database.SessionLocal() as session:
+        assert InvoiceService().delete(session, invoice.id)
+        assert session.get(Invoice, invoice.id) is None
+    with database.SessionLocal() as session:
+        assert ProjectService().delete(session, 1)
+        assert session.get(Project, 1) is None
+    with database.SessionLocal() as session:
+        assert ClientService().delete(session, 1)
+        assert session.get(Client, 1) is None
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import event
+import src.auth.security as security
+
+@pytest.fixture
+def checkouts(engine):
+    """Numero di connessioni prese dal pool"""
+    counter = {"count": 0}
+
+    def on_checkout(*args):
+        counter["count"] += 1
+
+    event.listen(engine, "checkout", on_checkout)
+    yield counter
+    event.remove(engine, "checkout", on_checkout)
+
+@pytest.mark.parametrize("auth_mode", ["database", "stateless"])
+def test_authenticated_request_checks_out_one_connection(client, admin_headers, checkouts, monkeypatch, auth_mode):
+    # Middleware (principal) ed endpoint (get_db) condividono la sessione della richiesta
+    monkeypatch.setattr(security, "AUTH_MODE", auth_mode)
+    for _ in range(3):
+        checkouts["count"] = 0
+        response = client.get("/api/v1/users/consultants", headers=admin_headers)
+        assert response.status_code == 200
+        assert checkouts["count"] == 1
+
+def test_stateless_request_without_db_does_not_check_out(client, admin_headers, checkouts, monkeypatch):
+    # Senza accessi al database la sessione non viene nemmeno creata
+    monkeypatch.setattr(security, "AUTH_MODE", "stateless")
+    response = client.get("/", headers=admin_headers)
+    assert response.status_code == 200
+    assert checkouts["count"] == 0
+
+def test_connections_are_returned_to_the_pool(client, admin_headers, engine):
+    for _ in range(20):
+        assert client.get("/api/v1/users/consultants", headers=admin_headers).status_code == 200
+    assert engine.pool.checkedout() == 0
@@ -0,0 +1,109 @@
+import threading
+from datetime import date
+import pytest
+from fastapi import HTTPException
+import src.database.database as database
+import src.services.resource_allocation as resource_allocation
+from src.models.models import BillingType, Project, ProjectStatus, ResourceAllocation, User, UserRole
+from src.schemas.resource_allocation import ResourceAllocationCreate
+from src.services.resource_allocation import ResourceAllocationService
+
+URL = "/api/v1/allocations"
+
+@pytest.fixture
+def consultant(db):
+    db.add(User(id=10, email="consultant@example.com", name="Consultant",
+                password_hash="-", role=UserRole.CONSULTANT))
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE,
+                   billing_type=BillingType.TIME_AND_MATERIALS))
+    db.commit()
+    return 10
+
+def allocation(start: str, end: str, percentage: float, **fields) -> dict:
+    return {"user_id": 10, "project_id": 1, "start_date": start, "end_date": end,
+            "allocation_percentage": percentage, "status": "ACTIVE", **fields}
+
+def test_allocations_up_to_the_limit_are_accepted(client, admin_headers, consultant):
+    assert client.post(f"{URL}/", json=allocation("2024-01-01", "2024-01-10", 0.6), headers=admin_headers).status_code == 200
+    # esattamente il 100% nei giorni sovrapposti
+    assert client.post(f"{URL}/", json=allocation("2024-01-10", "2024-01-20", 0.4), headers=admin_headers).status_code == 200
+    # le allocazioni cancellate non occupano capacità
+    assert client.post(f"{URL}/", json=allocation("2024-01-05", "2024-01-05", 1.0, status="CANCELLED"),
+                       headers=admin_headers).status_code == 200
+
+def test_allocations_over_the_limit_are_rejected(client, admin_headers, consultant, db):
+    first = client.post(f"{URL}/", json=allocation("2024-01-01", "2024-01-10", 0.6), headers=admin_headers).json()
+
+    response = client.post(f"{URL}/", json=allocation("2024-01-10", "2024-01-20", 0.5), headers=admin_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == (
+        "L'allocazione totale non può superare il 100%: l'utente 10 sarebbe al 110% il 2024-01-10"
+    )
+
+    second = client.post(f"{URL}/", json=allocation("2024-01-15", "2024-01-15", 0.4), headers=admin_headers).json()
+    # la seconda spostata sulla prima supera il limite finché la prima resta com'è:
+    # se la modifica della prima viene rifiutata, la versione salvata continua a contare
+    response = client.put(f"{URL}/bulk", json=[
+        {"id": second["id"], "data": {"start_date": "2024-01-10", "end_date": "2024-01-10", "allocation_percentage": 0.5}},
+        {"id": first["id"], "data": {"start_date": "2024-01-09"}},
+    ], headers=admin_headers)
+    assert [(r["success"], r["error"]) for r in response.json()["results"]] == [
+        (False, "L'allocazione totale non può superare il 100%: l'utente 10 sarebbe al 110% il 2024-01-10"),
+        (True, None),
+    ]
+    # accorciata la prima, la seconda ci sta
+    response = client.put(f"{URL}/bulk", json=[
+        {"id": first["id"], "data": {"end_date": "2024-01-09"}},
+        {"id": second["id"], "data": {"start_date": "2024-01-10", "end_date": "2024-01-10", "allocation_percentage": 1.0}},
+    ], headers=admin_headers)
+    assert [r["success"] for r in response.json()["results"]] == [True, True]
+
+    # nella stessa richiesta le allocazioni accettate contano per le successive
+    response = client.post(f"{URL}/bulk", json=[
+        allocation("2024-02-01", "2024-02-10", 0.5),
+        allocation("2024-02-05", "2024-02-05", 0.5),
+        allocation("2024-02-05", "2024-02-12", 0.25),
+    ], headers=admin_headers)
+    assert [(r["success"], r["error"]) for r in response.json()["results"]] == [
+        (True, None),
+        (True, None),
+        (False, "L'allocazione totale non può superare il 100%: l'utente 10 sarebbe al 125% il 2024-02-05"),
+    ]
+    db.expire_all()
+    assert db.query(ResourceAllocation).count() == 4
+
+def test_concurrent_allocations_cannot_cross_the_limit(consultant, monkeypatch):
+    # Entrambe le transazioni arrivano al controllo prima che l'altra scriva,
+    # a meno che il lock non le serializzi
+    barrier = threading.Barrier(2)
+    peak_allocation = resource_allocation.peak_allocation
+
+    def peak_after_both_checked(*args):
+        peak = peak_allocation(*args)
+        try:
+            barrier.wait(timeout=1)
+        except threading.BrokenBarrierError:
+            pass
+        return peak
+    monkeypatch.setattr(resource_allocation, "peak_allocation", peak_after_both_checked)
+
+    results = []
+    def create():
+        item = ResourceAllocationCreate(user_id=10, project_id=1, start_date=date(2024, 1, 1),
+                                        end_date=date(2024, 1, 5), allocation_percentage=0.6)
+        with database.SessionLocal() as db:
+            try:
+                ResourceAllocationService().create(db, item)
+                results.append(None)
+            except HTTPException as error:
+                results.append(error.status_code)
+
+    threads = [threading.Thread(target=create) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results, key=str) == [400, None]
+    with database.SessionLocal() as db:
+        assert db.query(ResourceAllocation).count() == 1
@@ -0,0 +1,179 @@
+from datetime import date, datetime
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from src.models.models import BillingType, Project, ProjectStatus, TimeEntry, User, UserDailyHours, UserRole
+from src.schemas.invoice import InvoiceGenerate
+from src.schemas.bulk import BulkUpdateItem
+from src.schemas.time_entry import TimeEntryCreate, TimeEntryUpdate
+from src.services.invoicing import InvoicingService
+from src.services.time_entry import TimeEntryService
+
+@pytest.fixture
+def consultant(db):
+    db.add(User(id=10, email="user@example.com", name="User", password_hash="-",
+                role=UserRole.CONSULTANT, hourly_rate=100))
+    db.add(Project(id=1, name="Progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.commit()
+    return 10
+
+def assert_rollup_matches_entries(db):
+    """Il rollup (senza i giorni rimasti a 0) coincide con i totali ricalcolati da time_entries"""
+    db.expire_all()
+    rollup = {(row.user_id, row.day): row.hours for row in db.query(UserDailyHours) if row.hours}
+    totals = db.query(TimeEntry.user_id, TimeEntry.entry_day, func.sum(TimeEntry.hours))\
+        .group_by(TimeEntry.user_id, TimeEntry.entry_day)
+    assert rollup == {(user_id, day): hours for user_id, day, hours in totals}
+
+def test_bulk_create_releases_locks_when_every_row_is_rejected(db, consultant):
+    service = TimeEntryService()
+    entry = lambda hours: TimeEntryCreate(user_id=consultant, project_id=1, date=datetime(2024, 5, 6, 9), hours=hours)
+
+    assert service.bulk_create(db, [entry(8)])["succeeded"] == 1
+
+    summary = service.bulk_create(db, [entry(1), entry(2)])
+    assert (summary["succeeded"], summary["failed"]) == (0, 2)
+    # Il rollup della settimana era bloccato con FOR UPDATE dai controlli
+    assert not db.in_transaction()
+    assert service.get_daily_hours(db, consultant, datetime(2024, 5, 6).date()) == 8
+
+def test_billed_entries_cannot_be_edited_or_deleted(client, admin_headers, db, consultant):
+    entry = TimeEntryService().create(db, TimeEntryCreate(
+        user_id=consultant, project_id=1, date=datetime(2024, 5, 6, 9), hours=4
+    ))
+    InvoicingService().generate(db, InvoiceGenerate(
+        project_id=1, period_start=date(2024, 5, 1), period_end=date(2024, 5, 31),
+        invoice_date=date(2024, 5, 31), due_date=date(2024, 6, 30)
+    ))
+
+    response = client.put(f"/api/v1/time-entries/{entry.id}", json={"hours": 2}, headers=admin_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Time entry già fatturata"
+    response = client.delete(f"/api/v1/time-entries/{entry.id}", headers=admin_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Time entry già fatturata"
+    # La descrizione non incide sulla fattura
+    response = client.put(f"/api/v1/time-entries/{entry.id}", json={"description": "Analisi"}, headers=admin_headers)
+    assert response.status_code == 200
+
+    db.expire_all()
+    assert db.get(TimeEntry, entry.id).hours == 4
+    assert TimeEntryService().get_daily_hours(db, consultant, date(2024, 5, 6)) == 4
+
+def test_hours_are_counted_on_the_calendar_day_of_the_entry(db, consultant):
+    service = TimeEntryService()
+    # Domenica sera e lunedì subito dopo mezzanotte: settimane ISO diverse
+    for when, hours in ((datetime(2024, 5, 12, 23, 30), 2), (datetime(2024, 5, 13, 0, 15), 3),
+                        (datetime(2024, 5, 13, 18), 1)):
+        service.create(db, TimeEntryCreate(user_id=consultant, project_id=1, date=when, hours=hours))
+
+    assert sorted(db.scalars(select(TimeEntry.entry_day))) == [date(2024, 5, 12), date(2024, 5, 13), date(2024, 5, 13)]
+    assert service.get_daily_hours(db, consultant, date(2024, 5, 12)) == 2
+    assert service.get_daily_hours(db, consultant, date(2024, 5, 13)) == 4
+    assert service.get_daily_hours(db, consultant, date(2024, 5, 14)) == 0
+    assert service.get_weekly_hours(db, consultant, date(2024, 5, 6), date(2024, 5, 12)) == 2
+    assert service.get_weekly_hours(db, consultant, date(2024, 5, 13), date(2024, 5, 19)) == 4
+    assert service.get_hours_between(db, consultant, date(2024, 5, 12), date(2024, 5, 13)) == 2
+
+def test_weekly_cap_counts_entries_late_on_sunday(db, consultant):
+    service = TimeEntryService()
+    for day in (6, 7, 8, 9):
+        service.create(db, TimeEntryCreate(user_id=consultant, project_id=1, date=datetime(2024, 5, day, 9), hours=8))
+    service.create(db, TimeEntryCreate(user_id=consultant, project_id=1, date=datetime(2024, 5, 12, 22), hours=7))
+
+    with pytest.raises(HTTPException) as error:
+        service.create(db, TimeEntryCreate(user_id=consultant, project_id=1, date=datetime(2024, 5, 10, 9), hours=2))
+    assert error.value.status_code == 400
+    assert error.value.detail == (
+        "Il totale delle ore settimanali non può superare 40. Ore già registrate nella settimana del 2024-05-06: 39.0"
+    )
+    # La settimana successiva è libera
+    service.create(db, TimeEntryCreate(user_id=consultant, project_id=1, date=datetime(2024, 5, 13, 0, 30), hours=8))
+
+def test_rollup_follows_every_write(db, consultant):
+    service = TimeEntryService()
+    entry = lambda day, hours: TimeEntryCreate(user_id=consultant, project_id=1, date=datetime(2024, 5, day, 9), hours=hours)
+
+    first = service.create(db, entry(10, 4))
+    second = service.create(db, entry(10, 3))
+    assert_rollup_matches_entries(db)
+
+    service.update(db, first.id, TimeEntryUpdate(hours=5))
+    assert_rollup_matches_entries(db)
+    # Spostata dal venerdì al martedì della settimana successiva
+    service.update(db, second.id, TimeEntryUpdate(date=datetime(2024, 5, 14, 9)))
+    assert_rollup_matches_entries(db)
+    assert service.get_daily_hours(db, consultant, date(2024, 5, 10)) == 5
+    assert service.get_weekly_hours(db, consultant, date(2024, 5, 13), date(2024, 5, 19)) == 3
+
+    # Un aggiornamento rifiutato non tocca il rollup
+    service.create(db, entry(14, 5))
+    with pytest.raises(HTTPException):
+        service.update(db, first.id, TimeEntryUpdate(date=datetime(2024, 5, 14, 9)))
+    assert_rollup_matches_entries(db)
+
+    summary = service.bulk_create(db, [entry(15, 8), entry(15, 1), entry(16, 2)])
+    assert [r["success"] for r in summary["results"]] == [True, False, True]
+    third = summary["results"][2]["id"]
+    service.bulk_update(db, [
+        BulkUpdateItem[TimeEntryUpdate](id=third, data=TimeEntryUpdate(date=datetime(2024, 5, 6, 9), hours=6)),
+        BulkUpdateItem[TimeEntryUpdate](id=first.id, data=TimeEntryUpdate(hours=1)),
+    ])
+    assert_rollup_matches_entries(db)
+
+    service.delete(db, second.id)
+    service.bulk_delete(db, [first.id, third])
+    assert_rollup_matches_entries(db)
+    assert service.get_hours_between(db, consultant, date(2024, 5, 1), date(2024, 6, 1)) == 13
+
+def test_replace_week_keeps_the_rollup_and_enforces_the_daily_cap(client, admin_headers, db, consultant):
+    db.add(Project(id=2, name="Altro progetto", status=ProjectStatus.ACTIVE, billing_type=BillingType.TIME_AND_MATERIALS))
+    db.commit()
+    service = TimeEntryService()
+    for project_id, when, hours in (
+        (1, datetime(2024, 5, 12, 23), 1),  # domenica della settimana precedente
+        (1, datetime(2024, 5, 13, 9), 4),
+        (1, datetime(2024, 5, 14, 9), 2),
+        (1, datetime(2024, 5, 14, 14), 1),
+        (2, datetime(2024, 5, 15, 9), 3),
+    ):
+        service.create(db, TimeEntryCreate(user_id=consultant, project_id=project_id, date=when, hours=hours))
+
+    url = f"/api/v1/time-entries/week/{consultant}/2024-W20"
+    response = client.put(url, json={"entries": [
+        {"project_id": 1, "date": "2024-05-13", "hours": 4},  # invariata
+        {"project_id": 1, "date": "2024-05-14", "hours": 5},  # due entry diventano una
+        {"project_id": 2, "date": "2024-05-15", "hours": 0},  # eliminata
+        {"project_id": 2, "date": "2024-05-16", "hours": 6},  # nuova
+    ]}, headers=admin_headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["week_start"], body["created"], body["updated"], body["deleted"]) == ("2024-05-13", 1, 1, 2)
+    assert [(e["project_id"], e["date"][:10], e["hours"]) for e in body["entries"]] == [
+        (1, "2024-05-13", 4), (1, "2024-05-14", 5), (2, "2024-05-16", 6)
+    ]
+    assert_rollup_matches_entries(db)
+    assert service.get_daily_hours(db, consultant, date(2024, 5, 12)) == 1
+
+    # 3 + 6 ore il giovedì: la griglia viene rifiutata per intero
+    response = client.put(url, json={"entries": [
+        {"project_id": 1, "date": "2024-05-13", "hours": 1},
+        {"project_id": 1, "date": "2024-05-16", "hours": 3},
+        {"project_id": 2, "date": "2024-05-16", "hours": 6},
+    ]}, headers=admin_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Il totale delle ore giornaliere non può superare 8. Ore il 2024-05-16: 9.0"
+    assert_rollup_matches_entries(db)
+    assert service.get_weekly_hours(db, consultant, date(2024, 5, 13), date(2024, 5, 19)) == 15
+
+    response = client.put(url, json={"entries": [{"project_id": 1, "date": "2024-05-20", "hours": 1}]},
+                          headers=admin_headers)
+    assert response.status_code == 400
+    response = client.put(f"/api/v1/time-entries/week/{consultant}/2024-W54", json={"entries": []},
+                          headers=admin_headers)
+    assert response.status_code == 400
+
+    # Una griglia vuota svuota la settimana
+    response = client.put(url, json={"entries": []}, headers=admin_headers)
+    assert response.json()["deleted"] == 3
+    assert_rollup_matches_entries(db)
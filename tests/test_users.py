@@ -0,0 +1,21 @@
+import threading
+import src.auth.security as security
+
+def test_create_user_hashes_password_off_the_event_loop(client, admin_headers, monkeypatch):
+    threads = []
+    original_hash = security.pwd_context.hash
+
+    def recording_hash(password, **kwargs):
+        threads.append(threading.current_thread().name)
+        return original_hash(password, **kwargs)
+
+    monkeypatch.setattr(security.pwd_context, "hash", recording_hash)
+    user = {"email": "mario@example.com", "name": "Mario", "role": "CONSULTANT", "password": "segreta"}
+    response = client.post("/api/v1/users/", json=user, headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    assert len(threads) == 1
+    assert threads[0].startswith("password-hash")
+
+    login = client.post("/api/v1/auth/token", json={"email": user["email"], "password": user["password"]})
+    assert login.status_code == 200